@@ -0,0 +1,213 @@
+"""
+Admission control middleware
+Per-client token buckets weighted by route cost, plus a global limit on
+requests in flight, enforced before a request reaches any route
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+import jwt
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from .config import (
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_SCAN_BURST,
+    ADMISSION_SCAN_PER_SECOND,
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    MAX_CONCURRENT_REQUESTS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MAX_CLIENTS,
+    RATE_LIMIT_PER_SECOND,
+)
+
+# Tokens a request takes from its client's bucket, by cost class
+COST_CLASSES = {
+    "light": 1,
+    "standard": 2,
+    "heavy": 5,    # CPU-bound (password hashing) or several reads
+    "scan": 15,    # full or filtered table scans
+}
+
+# Classes that also share one bucket across all clients, so many clients
+# together can't exhaust the tables' read capacity: (tokens/second, burst).
+# Size them to the read capacity the tables can spare, well above what
+# normal page loads need.
+CLASS_LIMITS = {
+    "scan": (ADMISSION_SCAN_PER_SECOND, ADMISSION_SCAN_BURST),
+}
+
+# "METHOD /route/path" -> cost class; unlisted routes are "standard"
+ROUTE_COSTS = {
+    "GET /": "light",
+    "GET /stocks/lists": "light",
+    "GET /stocks/search": "light",
+    "GET /stocks/quote/{symbol}": "light",
+    "POST /auth/signup": "heavy",
+    "POST /auth/login": "heavy",
+    "GET /groups/{group_id}/performance": "heavy",
+    "GET /stocks/{symbol}/bars": "heavy",
+    "POST /invites/batch": "heavy",
+    "POST /transactions/votes": "heavy",
+    "GET /transactions/batch": "heavy",
+    "GET /users/all": "scan",
+    "GET /users/me": "scan",
+    "GET /users/me/investments": "scan",
+    "GET /transactions": "scan",
+    "GET /transactions/history/me": "scan",
+    "GET /admin/valuations": "scan",
+}
+
+_ROUTE_PATTERNS = [
+    (route.split(" ", 1)[0], compile_path(route.split(" ", 1)[1])[0], cost_class)
+    for route, cost_class in ROUTE_COSTS.items()
+]
+
+# Never limited: health checks and API docs
+EXEMPT_PATHS = {"/health", "/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect"}
+
+
+class TokenBucket:
+    """Refills at rate tokens/second up to capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until cost tokens are available (0 if they are now)"""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= min(cost, self.capacity)
+
+
+class AdmissionControl:
+    """
+    ASGI middleware admitting or rejecting HTTP requests up front
+
+    Each client (JWT sub, or IP address without a valid token) has a token
+    bucket; a request costs the tokens of its route's cost class. Requests
+    that pass then wait for one of MAX_CONCURRENT_REQUESTS slots, queueing
+    for at most ADMISSION_QUEUE_TIMEOUT_SECONDS. Anything turned away gets
+    429 with Retry-After. WebSockets are long-lived and limited by their
+    own routes, so they pass straight through.
+
+    State is per process; with several workers the effective limits are
+    multiplied by the worker count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._classes = {name: TokenBucket(rate, burst) for name, (rate, burst) in CLASS_LIMITS.items()}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        cost_class = self._cost_class(scope)
+        cost = COST_CLASSES[cost_class]
+        now = time.monotonic()
+        client = self._bucket(self._client_key(scope))
+        wait = client.wait_time(cost, now)
+        if wait > 0:
+            await self._reject(scope, receive, send, wait, "Rate limit exceeded")
+            return
+        shared = self._classes.get(cost_class)
+        if shared:
+            wait = shared.wait_time(cost, now)
+            if wait > 0:
+                await self._reject(scope, receive, send, wait, "Server busy, try again shortly")
+                return
+            shared.take(cost)
+        client.take(cost)
+
+        if not await self._acquire_slot():
+            await self._reject(scope, receive, send, 1, "Server busy, try again shortly")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _acquire_slot(self) -> bool:
+        if self._slots is None:
+            # Created on first use so it binds to the server's event loop
+            self._slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self._queued >= ADMISSION_MAX_QUEUE:
+            return False
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), ADMISSION_QUEUE_TIMEOUT_SECONDS)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._queued -= 1
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._clients.get(key)
+        if bucket is None:
+            bucket = self._clients[key] = TokenBucket(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+            if len(self._clients) > RATE_LIMIT_MAX_CLIENTS:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _client_key(scope) -> str:
+        """JWT subject if the request carries a valid token, else the client IP"""
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                if authorization.startswith("Bearer "):
+                    try:
+                        payload = jwt.decode(
+                            authorization[7:], JWT_SECRET,
+                            algorithms=[JWT_ALGORITHM], options={"verify_iat": False}
+                        )
+                        return f"user:{payload['sub']}"
+                    except (jwt.InvalidTokenError, KeyError):
+                        pass
+                break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    @staticmethod
+    def _cost_class(scope) -> str:
+        """Cost class of the route the request path matches"""
+        for method, pattern, cost_class in _ROUTE_PATTERNS:
+            if method == scope["method"] and pattern.match(scope["path"]):
+                return cost_class
+        return "standard"
+
+    @staticmethod
+    async def _reject(scope, receive, send, retry_after: float, detail: str):
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
+
@@ -3,9 +3,10 @@ Authentication middleware and token verification
 Handles JWT token validation and user authorization
 """
 import jwt
-from fastapi import HTTPException, Header
+from fastapi import HTTPException, Header, Depends
 from typing import Optional
 from .config import JWT_SECRET, JWT_ALGORITHM
+from .db import groups, users
 
 
 def verify_token(authorization: Optional[str] = Header(None)) -> dict:
@@ -25,7 +26,18 @@ def verify_token(authorization: Optional[str] = Header(None)) -> dict:
         raise HTTPException(401, "Missing or invalid authorization header")
     
     token = authorization.replace("Bearer ", "")
+    return decode_token(token)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Decode and validate a raw JWT
     
+    Used directly by WebSocket routes, which pass the token as a query parameter
+    
+    Raises:
+        HTTPException: 401 if the token is invalid
+    """
     try:
         payload = jwt.decode(
             token, 
@@ -50,3 +62,94 @@ def get_user_id_from_token(authorization: Optional[str] = Header(None)) -> str:
     """
     payload = verify_token(authorization)
     return payload["sub"]
+
+
+def require_member(group_id: str, token: dict = Depends(verify_token)) -> dict:
+    """
+    Dependency for routes with a {group_id} path parameter
+
+    Membership is checked against the cached member set, so no full
+    group read is needed just to authorize the request.
+
+    Returns:
+        dict: Decoded token payload
+
+    Raises:
+        HTTPException: 404 if the group doesn't exist, 403 if not a member,
+            409 if the group is being deleted
+    """
+    check_member(group_id, token["sub"])
+    return token
+
+
+def check_member(group_id: str, user_id: str):
+    """
+    Membership check behind require_member, for routes that take the
+    group from the request body
+
+    Raises:
+        HTTPException: 404 if the group doesn't exist, 403 if not a member,
+            409 if the group is being deleted
+    """
+    membership = groups.get_membership(group_id)
+    if not membership:
+        raise HTTPException(404, "Group not found")
+    if user_id not in membership.members:
+        raise HTTPException(403, "You are not a member of this group")
+    if membership.deleting:
+        raise HTTPException(409, "Group is being deleted")
+
+
+def require_owner(group_id: str, token: dict = Depends(verify_token)) -> dict:
+    """
+    Dependency for owner-only routes with a {group_id} path parameter
+
+    Returns:
+        dict: Decoded token payload
+
+    Raises:
+        HTTPException: 404 if the group doesn't exist, 403 if not the owner,
+            409 if the group is being deleted
+    """
+    if _owned_membership(group_id, token).deleting:
+        raise HTTPException(409, "Group is being deleted")
+    return token
+
+
+def require_deleting_owner(group_id: str, token: dict = Depends(verify_token)) -> dict:
+    """
+    Dependency for owner-only routes that still apply while the group is
+    being deleted (deleting it again, deletion progress)
+
+    Raises:
+        HTTPException: 404 if the group doesn't exist, 403 if not the owner
+    """
+    _owned_membership(group_id, token)
+    return token
+
+
+def _owned_membership(group_id: str, token: dict):
+    membership = groups.get_membership(group_id)
+    if not membership:
+        raise HTTPException(404, "Group not found")
+    if membership.owner != token["sub"]:
+        raise HTTPException(403, "Only the owner can perform this action")
+    return membership
+
+
+def require_admin(token: dict = Depends(verify_token)) -> dict:
+    """
+    Dependency for admin-only routes
+
+    The role isn't in the token, so it is read from the user record.
+
+    Returns:
+        dict: Decoded token payload
+
+    Raises:
+        HTTPException: 403 if the user is not an admin
+    """
+    user = users.get_user_by_id(token["sub"])
+    if not user or user.get("role") != "admin":
+        raise HTTPException(403, "Admin access required")
+    return token
@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Database Configuration
-DYNAMODB_ENDPOINT = os.getenv("DYNAMODB_ENDPOINT", None)  # None = use real AWS
+DYNAMODB_ENDPOINT = os.getenv("DYNAMODB_ENDPOINT") or None  # None (or empty) = use real AWS
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
 # Table Names
@@ -16,6 +16,9 @@ USERS_TABLE = os.getenv("USERS_TABLE", "Users")
 GROUPS_TABLE = os.getenv("GROUPS_TABLE", "Groups")
 TRANSACTIONS_TABLE = os.getenv("TRANSACTIONS_TABLE", "Transactions")
 INVITES_TABLE = os.getenv("INVITES_TABLE", "Invites")
+SNAPSHOTS_TABLE = os.getenv("SNAPSHOTS_TABLE", "GroupSnapshots")
+LEDGER_TABLE = os.getenv("LEDGER_TABLE", "GroupLedger")
+LEASES_TABLE = os.getenv("LEASES_TABLE", "Leases")
 
 # User Table Attributes
 USER_PK_ATTR = os.getenv("USER_PK_ATTR", "userID")
@@ -30,3 +33,121 @@ MIN_GROUP_MEMBERS = 2
 MAX_GROUP_MEMBERS = 50
 MIN_TRANSACTION_AMOUNT = 1.0
 VOTING_THRESHOLD = 0.5  # 50% majority
+
+# Bulk Endpoints (items per request)
+MAX_BATCH_INVITES = int(os.getenv("MAX_BATCH_INVITES", "50"))
+MAX_BATCH_VOTES = int(os.getenv("MAX_BATCH_VOTES", "100"))
+MAX_BATCH_GET = int(os.getenv("MAX_BATCH_GET", "100"))
+
+# Caching
+MEMBERSHIP_CACHE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "60"))
+MEMBERSHIP_CACHE_MAX_GROUPS = int(os.getenv("MEMBERSHIP_CACHE_MAX_GROUPS", "10000"))
+
+# Market Data
+QUOTE_CACHE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "5"))
+QUOTE_STALE_GRACE_SECONDS = float(os.getenv("QUOTE_STALE_GRACE_SECONDS", "60"))
+QUOTE_FETCH_TIMEOUT_SECONDS = float(os.getenv("QUOTE_FETCH_TIMEOUT_SECONDS", "10"))
+QUOTE_BATCH_WINDOW_SECONDS = float(os.getenv("QUOTE_BATCH_WINDOW_SECONDS", "0.005"))
+MARKET_DATA_REFRESH_SECONDS = float(os.getenv("MARKET_DATA_REFRESH_SECONDS", "5"))
+
+# Market Simulator
+MARKET_SIM_SEED = int(os.getenv("MARKET_SIM_SEED", "42"))
+MARKET_SIM_TICK_SECONDS = float(os.getenv("MARKET_SIM_TICK_SECONDS", "1"))
+MARKET_SIM_HISTORY_DAYS = int(os.getenv("MARKET_SIM_HISTORY_DAYS", "252"))
+
+# Symbol Catalog
+SYMBOL_CATALOG_PATH = os.getenv(
+    "SYMBOL_CATALOG_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "symbols.csv")
+)
+
+# Historical Bars
+BAR_CACHE_DIR = os.getenv(
+    "BAR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "bars")
+)
+
+# Streaming
+MAX_STREAM_SYMBOLS = int(os.getenv("MAX_STREAM_SYMBOLS", "100"))
+
+# Group Events
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+EVENT_STREAM_MAX_PENDING = int(os.getenv("EVENT_STREAM_MAX_PENDING", "256"))
+
+# Order Execution
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", "4"))
+ORDER_MAX_ATTEMPTS = int(os.getenv("ORDER_MAX_ATTEMPTS", "8"))
+ORDER_RETRY_BASE_SECONDS = float(os.getenv("ORDER_RETRY_BASE_SECONDS", "1"))
+ORDER_RETRY_MAX_SECONDS = float(os.getenv("ORDER_RETRY_MAX_SECONDS", "60"))
+
+# Group Deletion (background cascade)
+GROUP_DELETE_CHUNK_SIZE = int(os.getenv("GROUP_DELETE_CHUNK_SIZE", "25"))  # one BatchWriteItem
+GROUP_DELETE_CHUNK_PAUSE_SECONDS = float(os.getenv("GROUP_DELETE_CHUNK_PAUSE_SECONDS", "0.2"))
+GROUP_DELETE_RETRY_SECONDS = float(os.getenv("GROUP_DELETE_RETRY_SECONDS", "30"))
+
+# Nightly Jobs (NAV snapshots, savings forecasts)
+NIGHTLY_JOB_HOUR_UTC = int(os.getenv("NIGHTLY_JOB_HOUR_UTC", "21"))  # after the US close
+NIGHTLY_JOB_CHECK_SECONDS = float(os.getenv("NIGHTLY_JOB_CHECK_SECONDS", "300"))
+# A job whose process died is taken over once its lease runs out
+NIGHTLY_JOB_LEASE_SECONDS = float(os.getenv("NIGHTLY_JOB_LEASE_SECONDS", "600"))
+PERFORMANCE_MAX_POINTS = int(os.getenv("PERFORMANCE_MAX_POINTS", "120"))
+FORECAST_SCAN_SEGMENTS = int(os.getenv("FORECAST_SCAN_SEGMENTS", "8"))
+FORECAST_WRITE_WORKERS = int(os.getenv("FORECAST_WRITE_WORKERS", "8"))
+
+# Group Ledger (append-only event log per group)
+LEDGER_SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "100"))  # events between state snapshots
+LEDGER_HEAD_CACHE_SIZE = int(os.getenv("LEDGER_HEAD_CACHE_SIZE", "10000"))
+LEDGER_APPEND_MAX_ATTEMPTS = int(os.getenv("LEDGER_APPEND_MAX_ATTEMPTS", "10"))
+
+# Change Feed (applies ledger events to projections: user group lists,
+# member counts, member deposits, holdings)
+# "stream" reads the ledger table's DynamoDB Stream; "local" is the
+# offline stand-in, fed by this process's own appends
+CHANGE_FEED_SOURCE = os.getenv("CHANGE_FEED_SOURCE", "stream")
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0.25"))  # idle wait between stream reads
+CHANGE_FEED_RETRY_SECONDS = float(os.getenv("CHANGE_FEED_RETRY_SECONDS", "5"))
+# A stream shard whose reader stopped renewing its lease is taken over after this
+CHANGE_FEED_LEASE_SECONDS = float(os.getenv("CHANGE_FEED_LEASE_SECONDS", "30"))
+
+# Ledger Audit (nightly reconciliation of group balances)
+LEDGER_AUDIT_SEGMENTS = int(os.getenv("LEDGER_AUDIT_SEGMENTS", "8"))
+LEDGER_AUDIT_WRITE_WORKERS = int(os.getenv("LEDGER_AUDIT_WRITE_WORKERS", "8"))
+
+# Maintenance Scripts (parallel segmented scans, see app/db/maintenance.py)
+MAINTENANCE_SCAN_SEGMENTS = int(os.getenv("MAINTENANCE_SCAN_SEGMENTS", "4"))
+MAINTENANCE_READ_UNITS_PER_SECOND = float(os.getenv("MAINTENANCE_READ_UNITS_PER_SECOND", "100"))
+MAINTENANCE_WRITE_UNITS_PER_SECOND = float(os.getenv("MAINTENANCE_WRITE_UNITS_PER_SECOND", "50"))
+MAINTENANCE_WRITE_BATCH = int(os.getenv("MAINTENANCE_WRITE_BATCH", "25"))  # items per transaction (max 100)
+MAINTENANCE_CHECKPOINT_DIR = os.getenv(
+    "MAINTENANCE_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "maintenance")
+)
+
+# Password Hashing (scrypt, run in a dedicated process pool)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+
+# Admission Control (per-process token buckets and concurrency limit)
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "10"))  # cost units per client
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "60"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "50000"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+# Cost units of "scan" routes all clients together may use (100 scans/second by default)
+ADMISSION_SCAN_PER_SECOND = float(os.getenv("ADMISSION_SCAN_PER_SECOND", "1500"))
+ADMISSION_SCAN_BURST = float(os.getenv("ADMISSION_SCAN_BURST", "4500"))
+
+# Database Retries (throttling and transient errors on every DynamoDB call)
+DB_RETRY_MAX_ATTEMPTS = int(os.getenv("DB_RETRY_MAX_ATTEMPTS", "6"))
+DB_RETRY_BASE_SECONDS = float(os.getenv("DB_RETRY_BASE_SECONDS", "0.025"))
+DB_RETRY_MAX_SECONDS = float(os.getenv("DB_RETRY_MAX_SECONDS", "1"))
+DB_RETRY_BUDGET_RATIO = float(os.getenv("DB_RETRY_BUDGET_RATIO", "0.1"))  # retries per request
+DB_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("DB_RETRY_BUDGET_MIN_PER_SECOND", "10"))
+DB_CONFLICT_MAX_ATTEMPTS = int(os.getenv("DB_CONFLICT_MAX_ATTEMPTS", "5"))
+
+# Responses
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
@@ -3,15 +3,29 @@ Database connection setup
 Initializes DynamoDB resource for the application
 """
 import boto3
-from ..config import AWS_REGION, DYNAMODB_ENDPOINT, USERS_TABLE, GROUPS_TABLE, TRANSACTIONS_TABLE
+from botocore.config import Config
+from ..config import AWS_REGION, DYNAMODB_ENDPOINT, USERS_TABLE, GROUPS_TABLE, TRANSACTIONS_TABLE, SNAPSHOTS_TABLE, LEDGER_TABLE, LEASES_TABLE
+from .retry import retry_policy
 
 
-# Initialize DynamoDB resource
+# Initialize DynamoDB resource. botocore's own retries are turned off so
+# the shared retry policy is the only layer retrying.
 ddb = boto3.resource(
     "dynamodb",
     region_name=AWS_REGION,
-    endpoint_url=DYNAMODB_ENDPOINT
+    endpoint_url=DYNAMODB_ENDPOINT,
+    config=Config(retries={"mode": "standard", "total_max_attempts": 1})
 )
+ddb.meta.client.meta.events.register("needs-retry.dynamodb", retry_policy.needs_retry)
+
+# Streams of tables that have one (the ledger's feeds the projections)
+streams = boto3.client(
+    "dynamodbstreams",
+    region_name=AWS_REGION,
+    endpoint_url=DYNAMODB_ENDPOINT,
+    config=Config(retries={"mode": "standard", "total_max_attempts": 1})
+)
+streams.meta.events.register("needs-retry.dynamodbstreams", retry_policy.needs_retry)
 
 # Also expose the resource for other uses
 dynamodb = ddb
@@ -21,3 +35,6 @@ users_table = ddb.Table(USERS_TABLE)
 groups_table = ddb.Table(GROUPS_TABLE)
 transactions_table = ddb.Table(TRANSACTIONS_TABLE)
 invites_table = ddb.Table("Invites")
+snapshots_table = ddb.Table(SNAPSHOTS_TABLE)
+ledger_table = ddb.Table(LEDGER_TABLE)
+leases_table = ddb.Table(LEASES_TABLE)
@@ -6,8 +6,11 @@ import datetime
 import uuid
 from decimal import Decimal
 from botocore.exceptions import ClientError
-from .connection import groups_table
-from .users import add_group_to_user, get_user_groups, remove_group_from_user
+from . import ledger
+from .connection import ddb, groups_table
+from .membership_cache import Membership, membership_cache
+from .projection import projection
+from .retry import is_conditional_failure, retry_policy
 
 
 def create_group(owner_id: str, name: str) -> dict:
@@ -33,106 +36,205 @@ def create_group(owner_id: str, name: str) -> dict:
         "investedAmount": Decimal('0'),
         "status": "active",
         # store as Decimal to stay compatible with DynamoDB number types
-        "memberCount": Decimal(1)
+        "memberCount": Decimal(1),
+        # symbol -> shares held / total cost paid, and user -> deposited,
+        # projected from the ledger by the change feed
+        "holdings": {},
+        "costBasis": {},
+        "memberDeposits": {}
     }
     
-    groups_table.put_item(Item=item)
+    ledger.append(
+        group_id, "group.created", {"name": name, "createdBy": owner_id}, actor=owner_id,
+        writes=[{"Put": {"TableName": groups_table.name, "Item": item}}]
+    )
+    membership_cache.put(group_id, Membership(frozenset(item["members"]), owner_id))
     return item
 
 
-def get_group(group_id: str) -> dict:
-    """Get group by group ID"""
-    response = groups_table.get_item(Key={"groupID": group_id})
-    return response.get("Item")
+def get_group(group_id: str, fields: list = None) -> dict:
+    """Get group by group ID, reading only the given attributes if fields is set"""
+    generation = membership_cache.generation
+    response = groups_table.get_item(Key={"groupID": group_id}, **projection(fields, ["groupID"]))
+    group = response.get("Item")
+    if group and not fields:
+        # We already paid for the full read, so refresh the auth cache too
+        membership_cache.put(group_id, _membership_from_item(group), generation)
+    return group
+
+
+def get_groups(group_ids: list, fields: list = None) -> list:
+    """
+    Get many groups with batched reads
+    
+    Args:
+        group_ids: IDs of the groups, in the order to return them
+        fields: Attributes to read (None for whole items)
+        
+    Returns:
+        list: Group items in group_ids order; groups that don't exist are skipped
+    """
+    group_ids = list(dict.fromkeys(group_ids))
+    found = {}
+    generation = membership_cache.generation
+    for i in range(0, len(group_ids), 100):
+        request = {
+            groups_table.name: {
+                "Keys": [{"groupID": g} for g in group_ids[i:i + 100]],
+                **projection(fields, ["groupID"]),
+            }
+        }
+        while request:
+            response = ddb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(groups_table.name, []):
+                found[item["groupID"]] = item
+            request = response.get("UnprocessedKeys") or None
+    if not fields:
+        for group_id, group in found.items():
+            membership_cache.put(group_id, _membership_from_item(group), generation)
+    return [found[g] for g in group_ids if g in found]
+
+
+def get_all_groups() -> list:
+    """
+    Get the summary fields of every group (for reports)
+    
+    Returns:
+        list: Items with groupID, name, status, createdAt, balance,
+            investedAmount, holdings and costBasis
+    """
+    items = []
+    scan_kwargs = {
+        "ProjectionExpression": "groupID, #name, #status, createdAt, balance, investedAmount, holdings, costBasis",
+        "ExpressionAttributeNames": {"#name": "name", "#status": "status"}
+    }
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _membership_from_item(item: dict) -> Membership:
+    return Membership(
+        frozenset(item.get("members", []) or []),
+        item.get("createdBy"),
+        item.get("status") == "deleting"
+    )
+
+
+def _load_membership(group_id: str):
+    """Read only the attributes needed for authorization"""
+    response = groups_table.get_item(
+        Key={"groupID": group_id},
+        ProjectionExpression="members, createdBy, #status",
+        ExpressionAttributeNames={"#status": "status"}
+    )
+    item = response.get("Item")
+    return _membership_from_item(item) if item else None
+
+
+def get_membership(group_id: str):
+    """
+    Get a group's member set and owner, served from the authorization cache
+
+    Returns:
+        Membership or None if the group doesn't exist
+    """
+    return membership_cache.get(group_id, _load_membership)
 
 
 def add_member(group_id: str, user_id: str):
-    """Add a member to the group"""
-    max_retries = 3
-    for attempt in range(max_retries):
+    """
+    Add a member to the group
+    
+    Only the member list is written here; memberCount and the user's
+    groups list follow from the member.joined event (see
+    services/change_feed.py). Nobody is added to a group being deleted,
+    even if the deletion starts while the member is being added.
+    """
+    def attempt():
         group = get_group(group_id)
         if not group:
             print(f"Group {group_id} not found")
             return False
+        if group.get("status") == "deleting":
+            print(f"Group {group_id} is being deleted")
+            return False
 
         members = group.get("members", [])
         if user_id in members:
             return True
 
-        new_members = members + [user_id]
-        new_count = Decimal(len(new_members))
-
-        try:
-            groups_table.update_item(
-                Key={"groupID": group_id},
-                UpdateExpression="SET members = :members, memberCount = :count",
-                ConditionExpression="attribute_not_exists(members) OR NOT contains(members, :user_id)",
-                ExpressionAttributeValues={
-                    ":members": new_members,
-                    ":count": new_count,
-                    ":user_id": user_id
-                }
-            )
-
-            # Update user record
-            try:
-                user_groups = get_user_groups(user_id)
-                if group_id not in user_groups:
-                    add_group_to_user(user_id, group_id)
-            except Exception as ue:
-                # rollback group change
-                try:
-                    groups_table.update_item(
-                        Key={"groupID": group_id},
-                        UpdateExpression="SET members = :members, memberCount = :count",
-                        ExpressionAttributeValues={
-                            ":members": members,
-                            ":count": Decimal(len(members))
-                        }
-                    )
-                except Exception:
-                    print("Failed to rollback member addition after user update failure")
-                print(f"Error updating user record when adding group: {ue}")
-                return False
+        # The member list read above is the optimistic lock: a concurrent
+        # add or remove fails the condition and the whole read is retried
+        if "members" in group:
+            condition, values = "members = :previous", {":previous": members}
+        else:
+            condition, values = "attribute_not_exists(members)", {}
+        ledger.append(group_id, "member.joined", {"userId": user_id}, writes=[{
+            "Update": {
+                "TableName": groups_table.name,
+                "Key": {"groupID": group_id},
+                "UpdateExpression": "SET members = :members",
+                "ConditionExpression": f"{condition} AND #status <> :deleting",
+                "ExpressionAttributeNames": {"#status": "status"},
+                "ExpressionAttributeValues": {":members": members + [user_id], ":deleting": "deleting", **values}
+            }
+        }])
+        membership_cache.invalidate(group_id)
+        return True
 
-            return True
-        except ClientError as ce:
-            code = ce.response.get("Error", {}).get("Code")
-            if code == "ConditionalCheckFailedException":
-                # retry on concurrent modification
-                if attempt < max_retries - 1:
-                    continue
-                print("Failed to add member due to concurrent updates")
-                return False
+    try:
+        return retry_policy.retry_on_conflict(attempt)
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            print("Failed to add member due to concurrent updates")
+        else:
             print(f"Error adding member: {ce}")
-            return False
-    return False
+        return False
 
 
 def remove_member(group_id: str, user_id: str):
-    """Remove a member from the group"""
-    group = get_group(group_id)
-    if not group:
-        return
+    """
+    Remove a member from the group (the user's groups list follows from member.left)
     
-    members = group.get("members", [])
-    if user_id in members:
-        members.remove(user_id)
-        # Update members list and set memberCount to the new length
-        groups_table.update_item(
-            Key={"groupID": group_id},
-            UpdateExpression="SET members = :members, memberCount = :count",
-            ExpressionAttributeValues={
-                ":members": members,
-                # ensure count is stored as a Decimal for DynamoDB
-                ":count": Decimal(len(members))
+    Like add_member, the member list read is the optimistic lock, so a
+    concurrent add or remove is never overwritten.
+    """
+    def attempt():
+        group = get_group(group_id)
+        if not group:
+            return False
+
+        members = group.get("members", [])
+        if user_id not in members:
+            return True
+
+        ledger.append(group_id, "member.left", {"userId": user_id}, writes=[{
+            "Update": {
+                "TableName": groups_table.name,
+                "Key": {"groupID": group_id},
+                "UpdateExpression": "SET members = :members",
+                "ConditionExpression": "members = :previous",
+                "ExpressionAttributeValues": {
+                    ":members": [m for m in members if m != user_id],
+                    ":previous": members
+                }
             }
-        )
-        # Also remove the group from the user's record
-        try:
-            remove_group_from_user(user_id, group_id)
-        except Exception as e:
-            print(f"Error removing group from user record: {e}")
+        }])
+        membership_cache.invalidate(group_id)
+        return True
+
+    try:
+        return retry_policy.retry_on_conflict(attempt)
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            print("Failed to remove member due to concurrent updates")
+        else:
+            print(f"Error removing member: {ce}")
+        return False
 
 
 def get_group_members(group_id: str) -> list:
@@ -143,40 +245,97 @@ def get_group_members(group_id: str) -> list:
 
 def is_member(group_id: str, user_id: str) -> bool:
     """Check if user is a member of the group"""
-    members = get_group_members(group_id)
-    return user_id in members
+    membership = get_membership(group_id)
+    return user_id in membership.members if membership else False
 
 
 def is_owner(group_id: str, user_id: str) -> bool:
     """Check if user is the owner of the group"""
-    group = get_group(group_id)
-    return group.get("createdBy") == user_id if group else False
+    membership = get_membership(group_id)
+    return membership.owner == user_id if membership else False
 
 
-def update_balance(group_id: str, amount: float):
-    """Update group liquid balance (cash available for withdrawal)"""
+def set_savings_goal(group_id: str, amount: float, target_date: str = None):
+    """Set the group's savings goal (total deposits to reach, optional target date)"""
+    goal = {"amount": Decimal(str(amount))}
+    if target_date:
+        goal["targetDate"] = target_date
     groups_table.update_item(
         Key={"groupID": group_id},
-        UpdateExpression="SET balance = if_not_exists(balance, :zero) + :amount",
-        ExpressionAttributeValues={
-            ":amount": Decimal(str(amount)),
-            ":zero": Decimal('0')
-        }
+        UpdateExpression="SET savingsGoal = :goal",
+        ExpressionAttributeValues={":goal": goal}
     )
 
 
-def update_invested_amount(group_id: str, amount: float):
-    """Update group invested amount (assets locked in investments)"""
+def get_savings_goals() -> dict:
+    """Get the savings goal of every group that has one, keyed by group ID"""
+    goals = {}
+    scan_kwargs = {
+        "FilterExpression": "attribute_exists(savingsGoal)",
+        "ProjectionExpression": "groupID, savingsGoal"
+    }
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            goals[item["groupID"]] = item["savingsGoal"]
+        if "LastEvaluatedKey" not in response:
+            return goals
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def set_savings_forecast(group_id: str, forecast: dict):
+    """Store the batch job's forecast on a group"""
     groups_table.update_item(
         Key={"groupID": group_id},
-        UpdateExpression="SET investedAmount = if_not_exists(investedAmount, :zero) + :amount",
-        ExpressionAttributeValues={
-            ":amount": Decimal(str(amount)),
-            ":zero": Decimal('0')
-        }
+        UpdateExpression="SET savingsForecast = :forecast",
+        ConditionExpression="attribute_exists(groupID)",
+        ExpressionAttributeValues={":forecast": forecast}
     )
 
 
+def update_savings_stats(group_id: str, apply) -> dict:
+    """
+    Replace the group's savingsStats map with apply(current_stats)
+    
+    Uses the observation count as an optimistic lock so concurrent
+    deposits don't overwrite each other.
+    
+    Args:
+        group_id: ID of the group
+        apply: Function from the current stats (None if none yet) to the new stats
+        
+    Returns:
+        dict: The stats written, or None if the group doesn't exist
+    """
+    def attempt():
+        response = groups_table.get_item(
+            Key={"groupID": group_id},
+            ProjectionExpression="groupID, savingsStats"
+        )
+        item = response.get("Item")
+        if not item:
+            return None
+
+        current = item.get("savingsStats")
+        stats = apply(current)
+        if current:
+            condition = "savingsStats.n = :n"
+            values = {":stats": stats, ":n": current["n"]}
+        else:
+            condition = "attribute_not_exists(savingsStats)"
+            values = {":stats": stats}
+
+        groups_table.update_item(
+            Key={"groupID": group_id},
+            UpdateExpression="SET savingsStats = :stats",
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+        return stats
+
+    return retry_policy.retry_on_conflict(attempt)
+
+
 def get_balance(group_id: str) -> float:
     """Get current group liquid balance"""
     group = get_group(group_id)
@@ -199,8 +358,252 @@ def get_total_assets(group_id: str) -> float:
     return liquid + invested
 
 
+def scan_ledger_pages(segment: int, total_segments: int):
+    """
+    Yield pages of groups' balances from one segment of a parallel scan
+    
+    Yields:
+        list: Items with groupID, status, balance, investedAmount and ledgerAudit
+    """
+    scan_kwargs = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "ProjectionExpression": "groupID, #status, balance, investedAmount, ledgerAudit",
+        "ExpressionAttributeNames": {"#status": "status"}
+    }
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        yield response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def set_ledger_audit(group_id: str, audit: dict, previous_watermark=None, repair: tuple = None) -> bool:
+    """
+    Store a group's ledger audit, optionally correcting its balances
+    
+    Args:
+        group_id: Group ID
+        audit: ledgerAudit record (watermark, folded totals, discrepancy)
+        previous_watermark: Watermark the audit started from (None if the
+            group had no audit yet); another audit that moved it since wins
+        repair: (balance, investedAmount, observed balance, observed
+            investedAmount) to set the balances, only if they still hold
+            the observed values
+        
+    Returns:
+        bool: False if the group changed since it was read and nothing was written
+    """
+    names = {"#audit": "ledgerAudit"}
+    values = {":audit": audit}
+    update = "SET #audit = :audit"
+    if previous_watermark is None:
+        condition = "attribute_exists(groupID) AND attribute_not_exists(#audit)"
+    else:
+        condition = "#audit.watermark = :previous"
+        values[":previous"] = previous_watermark
+    if repair:
+        balance, invested, observed_balance, observed_invested = repair
+        update += ", balance = :balance, investedAmount = :invested"
+        condition += " AND balance = :observed_balance AND investedAmount = :observed_invested"
+        values.update({
+            ":balance": balance,
+            ":invested": invested,
+            ":observed_balance": observed_balance,
+            ":observed_invested": observed_invested
+        })
+    try:
+        groups_table.update_item(
+            Key={"groupID": group_id},
+            UpdateExpression=update,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def get_projection_checkpoint(group_id: str):
+    """
+    Sequence number of the last ledger event projected onto the group
+    
+    Returns:
+        int: 0 if nothing was projected yet, or None if the group doesn't
+            exist or is being deleted
+    """
+    response = groups_table.get_item(
+        Key={"groupID": group_id},
+        ProjectionExpression="groupID, projectedSeq, #status",
+        ExpressionAttributeNames={"#status": "status"},
+        ConsistentRead=True
+    )
+    group = response.get("Item")
+    if not group or group.get("status") == "deleting":
+        return None
+    return int(group.get("projectedSeq", 0))
+
+
+def get_projections(group_id: str):
+    """
+    The projected holdings, costBasis and memberDeposits with projectedSeq,
+    read strongly consistent
+    
+    Returns:
+        dict: The item's attributes, or None if the group doesn't exist or
+            is being deleted
+    """
+    response = groups_table.get_item(
+        Key={"groupID": group_id},
+        ProjectionExpression="groupID, projectedSeq, #status, holdings, costBasis, memberDeposits",
+        ExpressionAttributeNames={"#status": "status"},
+        ConsistentRead=True
+    )
+    group = response.get("Item")
+    if not group or group.get("status") == "deleting":
+        return None
+    return group
+
+
+def get_current_members(group_id: str) -> list:
+    """Member list with a strongly consistent read (bypassing the membership cache)"""
+    response = groups_table.get_item(
+        Key={"groupID": group_id},
+        ProjectionExpression="members",
+        ConsistentRead=True
+    )
+    return response.get("Item", {}).get("members", [])
+
+
+def scan_projection_checkpoints():
+    """Yield (groupID, projectedSeq) of every group not being deleted"""
+    scan_kwargs = {
+        "ProjectionExpression": "groupID, projectedSeq, #status",
+        "ExpressionAttributeNames": {"#status": "status"},
+    }
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        for group in response.get("Items", []):
+            if group.get("status") != "deleting":
+                yield group["groupID"], int(group.get("projectedSeq", 0))
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def set_projections(
+    group_id: str, seq: int, values: dict, replay: bool = False, previous_seq: int = None
+) -> bool:
+    """
+    Store attributes projected from the group's ledger as of event seq
+    
+    Args:
+        values: Attributes to set (memberCount, holdings, ...)
+        replay: Also rewrite them when seq was already projected
+        previous_seq: Only write if this is still the projected event (for
+            values computed as changes to the stored ones)
+    
+    Returns:
+        bool: False if a newer event was already projected, or the group
+            is gone or being deleted
+    """
+    names = {"#status": "status"}
+    assignments = ["projectedSeq = :seq"]
+    attribute_values = {":seq": Decimal(seq), ":deleting": "deleting"}
+    for i, (name, value) in enumerate(values.items()):
+        names[f"#p{i}"] = name
+        attribute_values[f":p{i}"] = value
+        assignments.append(f"#p{i} = :p{i}")
+    if previous_seq is not None:
+        attribute_values[":previous"] = Decimal(previous_seq)
+        newer = "projectedSeq = :previous"
+    else:
+        newer = "projectedSeq <= :seq" if replay else "projectedSeq < :seq"
+    try:
+        groups_table.update_item(
+            Key={"groupID": group_id},
+            UpdateExpression="SET " + ", ".join(assignments),
+            ConditionExpression=(
+                "attribute_exists(groupID) AND (attribute_not_exists(#status) OR #status <> :deleting) "
+                f"AND (attribute_not_exists(projectedSeq) OR {newer})"
+            ),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=attribute_values
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def mark_deleting(group_id: str, progress: dict) -> bool:
+    """
+    Mark a group as being deleted and store the cascade's initial progress
+    
+    Returns:
+        bool: False if the group doesn't exist or is already being deleted
+    """
+    try:
+        groups_table.update_item(
+            Key={"groupID": group_id},
+            UpdateExpression="SET #status = :deleting, deletion = :progress",
+            ConditionExpression="attribute_exists(groupID) AND (attribute_not_exists(#status) OR #status <> :deleting)",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":deleting": "deleting", ":progress": progress}
+        )
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+    finally:
+        membership_cache.invalidate(group_id)
+    return True
+
+
+def set_deletion_progress(group_id: str, progress: dict):
+    """Store a deletion cascade's progress on the group"""
+    groups_table.update_item(
+        Key={"groupID": group_id},
+        UpdateExpression="SET deletion = :progress",
+        ExpressionAttributeValues={":progress": progress}
+    )
+
+
+def clear_members(group_id: str):
+    """Empty a group's member list, so no member can act on it any more"""
+    groups_table.update_item(
+        Key={"groupID": group_id},
+        UpdateExpression="SET members = :empty, memberCount = :zero",
+        ExpressionAttributeValues={":empty": [], ":zero": Decimal(0)}
+    )
+    membership_cache.invalidate(group_id)
+
+
+def get_deleting_groups() -> list:
+    """Get the IDs of groups whose deletion cascade hasn't finished"""
+    group_ids = []
+    scan_kwargs = {
+        "FilterExpression": "#status = :deleting",
+        "ProjectionExpression": "groupID",
+        "ExpressionAttributeNames": {"#status": "status"},
+        "ExpressionAttributeValues": {":deleting": "deleting"},
+    }
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        group_ids.extend(item["groupID"] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return group_ids
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
 def delete_group(group_id: str):
     """Delete a group from the database"""
     groups_table.delete_item(
         Key={"groupID": group_id}
     )
+    membership_cache.invalidate(group_id)
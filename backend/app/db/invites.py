@@ -6,6 +6,7 @@ import datetime
 import uuid
 from boto3.dynamodb.conditions import Key
 from .connection import invites_table
+from .retry import is_throttled
 
 
 def create_invite(group_id: str, inviter_id: str, invitee_email: str) -> dict:
@@ -35,6 +36,36 @@ def create_invite(group_id: str, inviter_id: str, invitee_email: str) -> dict:
     return item
 
 
+def create_invites(group_id: str, inviter_id: str, invitee_emails: list) -> list:
+    """
+    Create invites for many emails with batched writes
+    
+    Args:
+        group_id: ID of the group
+        inviter_id: ID of user sending the invites
+        invitee_emails: Emails of users being invited
+        
+    Returns:
+        list: Created invite items
+    """
+    now = datetime.datetime.utcnow().isoformat()
+    items = [
+        {
+            "inviteID": str(uuid.uuid4()),
+            "groupID": group_id,
+            "inviterID": inviter_id,
+            "inviteeEmail": email.lower(),
+            "status": "pending",
+            "createdAt": now
+        }
+        for email in invitee_emails
+    ]
+    with invites_table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    return items
+
+
 def get_invite(invite_id: str) -> dict:
     """Get invite by ID"""
     response = invites_table.get_item(Key={"inviteID": invite_id})
@@ -60,6 +91,8 @@ def get_user_invites(email: str) -> list:
         invites = response.get("Items", [])
         return [inv for inv in invites if inv.get("status") == "pending"]
     except Exception as e:
+        if is_throttled(e):
+            raise
         print(f"Error getting invites: {e}")
         return []
 
@@ -81,6 +114,8 @@ def get_group_invites(group_id: str) -> list:
         )
         return response.get("Items", [])
     except Exception as e:
+        if is_throttled(e):
+            raise
         print(f"Error getting group invites: {e}")
         return []
 
@@ -121,3 +156,26 @@ def check_existing_invite(group_id: str, email: str) -> dict:
         if invite.get("groupID") == group_id and invite.get("status") == "pending":
             return invite
     return None
+
+
+def get_group_invite_ids(group_id: str) -> list:
+    """Get the IDs of all of a group's invites, whatever their status"""
+    invite_ids = []
+    query_kwargs = {
+        "IndexName": "groupID-index",
+        "KeyConditionExpression": Key("groupID").eq(group_id),
+        "ProjectionExpression": "inviteID",
+    }
+    while True:
+        response = invites_table.query(**query_kwargs)
+        invite_ids.extend(item["inviteID"] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return invite_ids
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def delete_invites(invite_ids: list):
+    """Delete many invites with batched writes"""
+    with invites_table.batch_writer() as batch:
+        for invite_id in invite_ids:
+            batch.delete_item(Key={"inviteID": invite_id})
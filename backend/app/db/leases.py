@@ -0,0 +1,124 @@
+"""
+Lease database operations
+Time-limited ownership of background work shared by every API process
+(nightly jobs, change feed shards), plus the progress each one stores
+"""
+import os
+import socket
+import time
+import uuid
+from decimal import Decimal
+from typing import Optional
+from botocore.exceptions import ClientError
+from .connection import leases_table
+from .retry import is_conditional_failure
+
+
+def new_owner() -> str:
+    """A lease owner id unique to this process (and this start of it)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> Decimal:
+    return Decimal(str(round(time.time(), 3)))
+
+
+def get_lease(lease_id: str) -> Optional[dict]:
+    """Get a lease item with a consistent read (None if it was never taken)"""
+    return leases_table.get_item(Key={"leaseID": lease_id}, ConsistentRead=True).get("Item")
+
+
+def acquire(lease_id: str, owner: str, ttl_seconds: float, skip_run: Optional[str] = None) -> bool:
+    """
+    Take a lease that is free, expired or already ours
+
+    Args:
+        lease_id: Lease name
+        owner: Unique id of the taking process
+        ttl_seconds: How long the lease holds without being renewed
+        skip_run: Don't take it if the work already completed this run
+            (e.g. today's date, see complete())
+
+    Returns:
+        bool: True if owner now holds the lease
+    """
+    now = _now()
+    condition = "(attribute_not_exists(expiresAt) OR expiresAt < :now OR #owner = :owner)"
+    values = {":owner": owner, ":now": now, ":expires": now + Decimal(str(ttl_seconds))}
+    if skip_run is not None:
+        condition += " AND (attribute_not_exists(lastRun) OR lastRun <> :run)"
+        values[":run"] = skip_run
+    try:
+        leases_table.update_item(
+            Key={"leaseID": lease_id},
+            UpdateExpression="SET #owner = :owner, expiresAt = :expires",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={"#owner": "owner"},
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_failure(e):
+            return False
+        raise
+
+
+def renew(lease_id: str, owner: str, ttl_seconds: float, progress: Optional[dict] = None) -> bool:
+    """
+    Extend a lease we hold, storing progress attributes with it
+
+    Returns:
+        bool: False if the lease expired and was taken by someone else
+    """
+    now = _now()
+    update = "SET expiresAt = :expires"
+    values = {":owner": owner, ":expires": now + Decimal(str(ttl_seconds))}
+    names = {"#owner": "owner"}
+    for i, (name, value) in enumerate((progress or {}).items()):
+        update += f", #p{i} = :p{i}"
+        names[f"#p{i}"] = name
+        values[f":p{i}"] = value
+    try:
+        leases_table.update_item(
+            Key={"leaseID": lease_id},
+            UpdateExpression=update,
+            ConditionExpression="#owner = :owner",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_failure(e):
+            return False
+        raise
+
+
+def release(lease_id: str, owner: str, completed_run: Optional[str] = None) -> bool:
+    """
+    Give up a lease we hold, so another process can take it at once
+
+    Args:
+        completed_run: Record that this run's work is done, so acquire()
+            with the same skip_run doesn't take the lease again
+
+    Returns:
+        bool: False if the lease wasn't ours anymore
+    """
+    update = "REMOVE #owner, expiresAt"
+    values = {":owner": owner}
+    if completed_run is not None:
+        update = "SET lastRun = :run " + update
+        values[":run"] = completed_run
+    try:
+        leases_table.update_item(
+            Key={"leaseID": lease_id},
+            UpdateExpression=update,
+            ConditionExpression="#owner = :owner",
+            ExpressionAttributeNames={"#owner": "owner"},
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_failure(e):
+            return False
+        raise
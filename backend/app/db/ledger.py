@@ -0,0 +1,265 @@
+"""
+Group ledger database operations
+Append-only log of each group's events, numbered 1, 2, 3... per group,
+with the latest state snapshot kept at sequence 0
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Iterator, List, Optional
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from .connection import ddb, ledger_table
+from .retry import CONDITIONAL_CODES, _next_delay, is_conditional_failure
+from ..config import DB_RETRY_BASE_SECONDS, LEDGER_APPEND_MAX_ATTEMPTS, LEDGER_HEAD_CACHE_SIZE
+
+SNAPSHOT_SEQ = 0
+
+
+class SequenceConflict(Exception):
+    """No free sequence number after LEDGER_APPEND_MAX_ATTEMPTS tries"""
+
+
+class _Heads:
+    """Last sequence number this process saw per group, so appends rarely query first"""
+
+    def __init__(self, max_groups: int):
+        self._lock = threading.Lock()
+        self._heads: "OrderedDict[str, int]" = OrderedDict()
+        self._max_groups = max_groups
+
+    def get(self, group_id: str) -> Optional[int]:
+        with self._lock:
+            return self._heads.get(group_id)
+
+    def advance(self, group_id: str, seq: int):
+        with self._lock:
+            if seq > self._heads.get(group_id, -1):
+                self._heads[group_id] = seq
+            self._heads.move_to_end(group_id)
+            if len(self._heads) > self._max_groups:
+                self._heads.popitem(last=False)
+
+    def forget(self, group_id: str):
+        with self._lock:
+            self._heads.pop(group_id, None)
+
+
+_heads = _Heads(LEDGER_HEAD_CACHE_SIZE)
+_listeners: List[Callable[[str, int], None]] = []
+
+
+def on_append(listener: Callable[[str, int], None]):
+    """Call listener(group_id, seq) after each event this process appends"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def get_head(group_id: str) -> int:
+    """Sequence number of the group's newest event (0 if it has none)"""
+    response = ledger_table.query(
+        KeyConditionExpression=Key("groupID").eq(group_id) & Key("seq").gt(SNAPSHOT_SEQ),
+        ProjectionExpression="seq",
+        ScanIndexForward=False,
+        Limit=1,
+        ConsistentRead=True
+    )
+    items = response.get("Items", [])
+    head = int(items[0]["seq"]) if items else 0
+    _heads.advance(group_id, head)
+    return head
+
+
+def _sequence_taken(error: ClientError) -> bool:
+    """The event put (always the first item of the transaction) lost its sequence number"""
+    reasons = error.response.get("CancellationReasons", [])
+    return bool(reasons) and reasons[0].get("Code") in CONDITIONAL_CODES
+
+
+def append(
+    group_id: str,
+    event_type: str,
+    data: dict = None,
+    actor: str = None,
+    writes: List[dict] = None,
+    first: bool = False,
+) -> dict:
+    """
+    Append an event to a group's ledger, committed together with the
+    writes it describes
+
+    The event takes the next sequence number with a conditional put; when
+    another writer took that number first, the head is re-read and the
+    next one tried after a jittered pause. Any other failed condition in writes cancels the
+    whole transaction and is raised to the caller as usual.
+
+    Args:
+        group_id: Group the event belongs to
+        event_type: e.g. "deposit.made", "member.joined"
+        data: Event payload
+        actor: User who caused the event
+        writes: TransactWriteItems entries (Put/Update/Delete/ConditionCheck
+            with TableName) to commit atomically with the event
+        first: Only append as event 1 (for importing a group's existing state)
+
+    Returns:
+        dict: The stored event
+
+    Raises:
+        SequenceConflict: No sequence number could be taken (or, with
+            first, the group's ledger already has events)
+        ClientError: A condition in writes failed, or DynamoDB errors
+    """
+    event = {
+        "groupID": group_id,
+        "type": event_type,
+        "at": datetime.datetime.utcnow().isoformat(),
+        "data": data or {},
+    }
+    if actor:
+        event["actor"] = actor
+
+    attempts = 1 if first else LEDGER_APPEND_MAX_ATTEMPTS
+    delay = DB_RETRY_BASE_SECONDS
+    for attempt in range(attempts):
+        if attempt:
+            delay = _next_delay(delay)
+            time.sleep(delay)
+        head = 0 if first else _heads.get(group_id)
+        if head is None:
+            head = get_head(group_id)
+        event["seq"] = Decimal(head + 1)
+        put = {
+            "TableName": ledger_table.name,
+            "Item": event,
+            "ConditionExpression": "attribute_not_exists(seq)",
+        }
+        try:
+            if writes:
+                ddb.meta.client.transact_write_items(TransactItems=[{"Put": put}, *writes])
+            else:
+                ledger_table.put_item(Item=event, ConditionExpression=put["ConditionExpression"])
+        except ClientError as ce:
+            taken = _sequence_taken(ce) if writes else is_conditional_failure(ce)
+            if not taken:
+                raise
+            _heads.forget(group_id)
+            continue
+        _heads.advance(group_id, head + 1)
+        for listener in _listeners:
+            listener(group_id, head + 1)
+        return event
+    raise SequenceConflict(f"Could not append {event_type} to the ledger of group {group_id}")
+
+
+def read_events(group_id: str, after: int = SNAPSHOT_SEQ, limit: int = None) -> Iterator[dict]:
+    """
+    Yield a group's events in sequence order
+
+    Args:
+        group_id: Group ID
+        after: Only events with a higher sequence number
+        limit: Stop after this many events (None for all)
+    """
+    query_kwargs = {
+        "KeyConditionExpression": Key("groupID").eq(group_id) & Key("seq").gt(after),
+        "ConsistentRead": True,
+    }
+    if limit:
+        query_kwargs["Limit"] = limit
+    returned = 0
+    while True:
+        response = ledger_table.query(**query_kwargs)
+        for event in response.get("Items", []):
+            yield event
+            returned += 1
+            if limit and returned >= limit:
+                return
+        if "LastEvaluatedKey" not in response:
+            return
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_origin(group_id: str) -> Optional[dict]:
+    """
+    The event a group's state starts from: group.created as its first
+    event, or else its group.imported event
+
+    Groups created before the ledger existed can have events from before
+    their import; None until they are imported (see
+    scripts/import_group_ledgers.py).
+    """
+    first = next(read_events(group_id, limit=1), None)
+    if first is None or first["type"] in ("group.created", "group.imported"):
+        return first
+    query_kwargs = {
+        "KeyConditionExpression": Key("groupID").eq(group_id) & Key("seq").gt(SNAPSHOT_SEQ),
+        "FilterExpression": Attr("type").eq("group.imported"),
+        "ConsistentRead": True,
+    }
+    while True:
+        response = ledger_table.query(**query_kwargs)
+        for event in response.get("Items", []):
+            return event
+        if "LastEvaluatedKey" not in response:
+            return None
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_snapshot(group_id: str) -> Optional[dict]:
+    """The group's latest state snapshot: {"snapshotSeq", "state", "takenAt"}, or None"""
+    response = ledger_table.get_item(Key={"groupID": group_id, "seq": SNAPSHOT_SEQ}, ConsistentRead=True)
+    return response.get("Item")
+
+
+def put_snapshot(group_id: str, snapshot_seq: int, state: dict) -> bool:
+    """
+    Store a state snapshot as of event snapshot_seq
+
+    Returns:
+        bool: False if a snapshot at least as new is already stored
+    """
+    try:
+        ledger_table.put_item(
+            Item={
+                "groupID": group_id,
+                "seq": SNAPSHOT_SEQ,
+                "snapshotSeq": Decimal(snapshot_seq),
+                "state": state,
+                "takenAt": datetime.datetime.utcnow().isoformat(),
+            },
+            ConditionExpression="attribute_not_exists(snapshotSeq) OR snapshotSeq < :seq",
+            ExpressionAttributeValues={":seq": Decimal(snapshot_seq)}
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def delete_ledger(group_id: str, limit: int = None) -> int:
+    """
+    Delete a group's events and snapshot
+
+    Args:
+        limit: Delete at most this many items (None for all)
+
+    Returns:
+        int: Number of items deleted
+    """
+    query_kwargs = {
+        "KeyConditionExpression": Key("groupID").eq(group_id),
+        "ProjectionExpression": "seq",
+    }
+    if limit:
+        query_kwargs["Limit"] = limit
+    response = ledger_table.query(**query_kwargs)
+    items = response.get("Items", [])
+    with ledger_table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key={"groupID": group_id, "seq": item["seq"]})
+    _heads.forget(group_id)
+    return len(items)
@@ -0,0 +1,337 @@
+"""
+Maintenance scans
+Backfills over a whole table: a parallel segmented scan with checkpoints,
+capacity pacing, batched conditional updates, dry runs and diffs
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from .connection import ddb
+from .projection import projection
+from .retry import is_conditional_failure
+from ..config import (
+    MAINTENANCE_CHECKPOINT_DIR,
+    MAINTENANCE_READ_UNITS_PER_SECOND,
+    MAINTENANCE_SCAN_SEGMENTS,
+    MAINTENANCE_WRITE_BATCH,
+    MAINTENANCE_WRITE_UNITS_PER_SECOND,
+)
+
+# A backfill's update function: the changed attributes for an item (None
+# as a value removes the attribute), or None/{} to leave the item alone
+UpdateFunction = Callable[[dict], Optional[Dict]]
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class CapacityLimiter:
+    """
+    Paces a scan by the capacity units DynamoDB reports it consumed
+
+    Callers consume after each request; once the units used run ahead of
+    units_per_second, consume() sleeps until they are back in line. Shared
+    by all segments so the limit holds for the whole run.
+    """
+
+    def __init__(self, units_per_second: float):
+        self._lock = threading.Lock()
+        self._rate = units_per_second
+        self._balance = units_per_second
+        self._updated = time.monotonic()
+        self.consumed = 0.0
+
+    def consume(self, units: float):
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(self._rate, self._balance + (now - self._updated) * self._rate)
+            self._updated = now
+            self._balance -= units
+            self.consumed += units
+            wait = -self._balance / self._rate if self._balance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def _consumed_units(response: dict) -> float:
+    consumed = response.get("ConsumedCapacity") or []
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(c.get("CapacityUnits", 0)) for c in consumed)
+
+
+class Checkpoint:
+    """
+    Per-segment scan positions saved to a JSON file after every page
+
+    Positions are stored in DynamoDB's typed JSON so numeric and binary
+    keys survive the round trip. Dry runs and applied runs keep separate
+    files, so a dry run never makes an applied run skip items.
+    """
+
+    def __init__(self, name: str, total_segments: int, apply: bool):
+        mode = "apply" if apply else "dry-run"
+        self.path = os.path.join(MAINTENANCE_CHECKPOINT_DIR, f"{name}.{mode}.json")
+        self.total_segments = total_segments
+        self._lock = threading.Lock()
+        self.segments: Dict[str, dict] = {}
+
+    def load(self) -> bool:
+        """Load saved positions; False if there are none for this segment count"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("totalSegments") != self.total_segments:
+            print(f"⚠️ Ignoring checkpoint {self.path}: it was saved with {saved.get('totalSegments')} segments")
+            return False
+        self.segments = saved.get("segments", {})
+        return True
+
+    def position(self, segment: int) -> dict:
+        """Saved state of a segment: lastKey (deserialized), done and its counters"""
+        state = dict(self.segments.get(str(segment), {}))
+        if state.get("lastKey"):
+            state["lastKey"] = {k: _deserializer.deserialize(v) for k, v in state["lastKey"].items()}
+        return state
+
+    def save(self, segment: int, last_key: Optional[dict], counts: dict):
+        state = {
+            "lastKey": {k: _serializer.serialize(v) for k, v in last_key.items()} if last_key else None,
+            "done": last_key is None,
+            **counts,
+        }
+        with self._lock:
+            self.segments[str(segment)] = state
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as f:
+                json.dump({"totalSegments": self.total_segments, "segments": self.segments}, f)
+            os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Backfill:
+    """
+    One run of an update function over every item of a table
+
+    The table is split into total_segments and each segment is scanned by
+    its own worker. For every page, the update function is applied to
+    each item; changed items are written in transactions of
+    MAINTENANCE_WRITE_BATCH conditional updates, then the page's
+    LastEvaluatedKey is checkpointed. Each update is conditioned on the
+    attributes it was computed from (fields) still holding the values
+    read, so nothing a live request wrote in between is overwritten;
+    such items are counted as conflicts and left for the next run.
+
+    BatchWriteItem would be cheaper per item but only puts whole items,
+    which would need full reads and could undo concurrent changes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        table,
+        fields: Sequence[str],
+        update: UpdateFunction,
+        apply: bool = False,
+        total_segments: int = MAINTENANCE_SCAN_SEGMENTS,
+        resume: bool = True,
+        diff_path: Optional[str] = None,
+        read_units_per_second: float = MAINTENANCE_READ_UNITS_PER_SECOND,
+        write_units_per_second: float = MAINTENANCE_WRITE_UNITS_PER_SECOND,
+    ):
+        self.name = name
+        self.table = table
+        self.key_attrs = [k["AttributeName"] for k in table.key_schema]
+        self.fields = [f for f in fields if f not in self.key_attrs]
+        self.update = update
+        self.apply = apply
+        self.total_segments = total_segments
+        self.resume = resume
+        self.diff_path = diff_path
+        self.reads = CapacityLimiter(read_units_per_second)
+        self.writes = CapacityLimiter(write_units_per_second)
+        self.checkpoint = Checkpoint(name, total_segments, apply)
+        self._output_lock = threading.Lock()
+        self._diff_file = None
+
+    def run(self) -> dict:
+        """
+        Scan every segment (resuming from the checkpoint if there is one)
+
+        Returns:
+            dict: Counts of items scanned, changed, written and in conflict,
+                and the capacity units consumed
+        """
+        resumed = self.resume and self.checkpoint.load()
+        if resumed:
+            print(f"↩️ Resuming {self.name} from {self.checkpoint.path}")
+        mode = "applying" if self.apply else "dry run"
+        print(f"🔧 {self.name} on {self.table.name}: {self.total_segments} segments, {mode}")
+
+        if self.diff_path:
+            self._diff_file = open(self.diff_path, "a" if resumed else "w")
+        try:
+            with ThreadPoolExecutor(max_workers=self.total_segments) as pool:
+                results = list(pool.map(self._scan_segment, range(self.total_segments)))
+        finally:
+            if self._diff_file:
+                self._diff_file.close()
+                self._diff_file = None
+
+        report = {k: sum(r[k] for r in results) for k in ("scanned", "changed", "written", "conflicts")}
+        report.update(
+            readUnits=round(self.reads.consumed, 1),
+            writeUnits=round(self.writes.consumed, 1),
+            applied=self.apply,
+        )
+        self.checkpoint.clear()
+        verb = "updated" if self.apply else "would update"
+        print(
+            f"✅ {self.name}: scanned {report['scanned']} items, {verb} {report['changed']}"
+            + (f" ({report['written']} written, {report['conflicts']} changed concurrently)" if self.apply else "")
+            + f", {report['readUnits']} RCU / {report['writeUnits']} WCU"
+        )
+        return report
+
+    def _scan_segment(self, segment: int) -> dict:
+        state = self.checkpoint.position(segment) if self.resume else {}
+        counts = {k: state.get(k, 0) for k in ("scanned", "changed", "written", "conflicts")}
+        if state.get("done"):
+            return counts
+
+        scan_kwargs = {
+            "Segment": segment,
+            "TotalSegments": self.total_segments,
+            "ReturnConsumedCapacity": "TOTAL",
+            **projection(self.fields, self.key_attrs),
+        }
+        if state.get("lastKey"):
+            scan_kwargs["ExclusiveStartKey"] = state["lastKey"]
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            self.reads.consume(_consumed_units(response))
+            items = response.get("Items", [])
+            counts["scanned"] += len(items)
+
+            changes = []
+            for item in items:
+                changed = self.update(item)
+                if changed:
+                    changes.append((item, changed))
+                    self._report(item, changed)
+            counts["changed"] += len(changes)
+            if self.apply:
+                for i in range(0, len(changes), MAINTENANCE_WRITE_BATCH):
+                    written = self._write(changes[i:i + MAINTENANCE_WRITE_BATCH])
+                    counts["written"] += written
+                    counts["conflicts"] += len(changes[i:i + MAINTENANCE_WRITE_BATCH]) - written
+
+            last_key = response.get("LastEvaluatedKey")
+            self.checkpoint.save(segment, last_key, counts)
+            if not last_key:
+                return counts
+            scan_kwargs["ExclusiveStartKey"] = last_key
+
+    def _update_arguments(self, item: dict, changed: dict) -> dict:
+        names, values, sets, removes, conditions = {}, {}, [], [], []
+        for i, (attribute, value) in enumerate(changed.items()):
+            names[f"#u{i}"] = attribute
+            if value is None:
+                removes.append(f"#u{i}")
+            else:
+                values[f":u{i}"] = value
+                sets.append(f"#u{i} = :u{i}")
+        for i, attribute in enumerate(self.fields):
+            names[f"#c{i}"] = attribute
+            if attribute in item:
+                values[f":c{i}"] = item[attribute]
+                conditions.append(f"#c{i} = :c{i}")
+            else:
+                conditions.append(f"attribute_not_exists(#c{i})")
+
+        expression = " ".join(
+            part for part in (
+                f"SET {', '.join(sets)}" if sets else "",
+                f"REMOVE {', '.join(removes)}" if removes else "",
+            ) if part
+        )
+        arguments = {
+            "Key": {k: item[k] for k in self.key_attrs},
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": names,
+        }
+        if conditions:
+            arguments["ConditionExpression"] = " AND ".join(conditions)
+        if values:
+            arguments["ExpressionAttributeValues"] = values
+        return arguments
+
+    def _write(self, changes: List[tuple]) -> int:
+        """Write a batch in one transaction; item by item if any condition fails"""
+        updates = [self._update_arguments(item, changed) for item, changed in changes]
+        try:
+            response = ddb.meta.client.transact_write_items(
+                TransactItems=[{"Update": {"TableName": self.table.name, **u}} for u in updates],
+                ReturnConsumedCapacity="TOTAL"
+            )
+            self.writes.consume(_consumed_units(response))
+            return len(updates)
+        except ClientError as ce:
+            if not is_conditional_failure(ce):
+                raise
+
+        written = 0
+        for arguments in updates:
+            try:
+                response = self.table.update_item(**arguments, ReturnConsumedCapacity="TOTAL")
+                self.writes.consume(_consumed_units(response))
+                written += 1
+            except ClientError as ce:
+                if not is_conditional_failure(ce):
+                    raise
+                print(f"⚠️ {self.name}: {arguments['Key']} changed while running, skipped")
+        return written
+
+    def _report(self, item: dict, changed: dict):
+        key = {k: item[k] for k in self.key_attrs}
+        diff = {attribute: [item.get(attribute), value] for attribute, value in changed.items()}
+        with self._output_lock:
+            print(f"  {key}: " + ", ".join(f"{a} {old} -> {new}" for a, (old, new) in diff.items()))
+            if self._diff_file:
+                self._diff_file.write(json.dumps({"key": key, "diff": diff}, default=str) + "\n")
+
+
+def run_cli(name: str, table, fields: Sequence[str], update: UpdateFunction, description: str = None) -> dict:
+    """
+    Command line entry point shared by backfill scripts
+
+    Dry run unless --apply; resumes from a checkpoint unless --restart.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--apply", action="store_true", help="Apply changes instead of dry-run")
+    parser.add_argument("--segments", type=int, default=MAINTENANCE_SCAN_SEGMENTS, help="Parallel scan segments")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and scan from the start")
+    parser.add_argument("--diff", metavar="PATH", help="Also write each change as a JSON line to PATH")
+    args = parser.parse_args()
+
+    return Backfill(
+        name, table, fields, update,
+        apply=args.apply,
+        total_segments=args.segments,
+        resume=not args.restart,
+        diff_path=args.diff,
+    ).run()
@@ -0,0 +1,97 @@
+"""
+Group membership authorization cache
+Keeps a compact member set and owner per group so is_member / is_owner
+checks don't re-read the full group item from DynamoDB
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, FrozenSet, NamedTuple, Optional
+from ..config import MEMBERSHIP_CACHE_TTL_SECONDS, MEMBERSHIP_CACHE_MAX_GROUPS
+
+
+class Membership(NamedTuple):
+    members: FrozenSet[str]
+    owner: Optional[str]
+    deleting: bool = False
+
+
+class MembershipCache:
+    """
+    Process-local LRU cache of group membership with a TTL
+
+    Entries are dropped explicitly whenever this process changes membership.
+    The TTL bounds how long another worker's changes can go unnoticed.
+    Every invalidation bumps a generation counter; a read that started
+    before one is returned but not stored, so a slow load can't put
+    membership from before the change back into the cache.
+    """
+
+    def __init__(self, ttl_seconds: float, max_groups: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_groups = max_groups
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Take before reading membership from the database, to pass to put()"""
+        with self._lock:
+            return self._generation
+
+    def get(self, group_id: str, loader: Callable[[str], Optional[Membership]]) -> Optional[Membership]:
+        """
+        Get membership for a group, calling loader on a miss
+
+        Args:
+            group_id: ID of the group
+            loader: Function that reads membership from the database
+
+        Returns:
+            Membership or None if the group doesn't exist (not cached)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(group_id)
+                return entry[0]
+            generation = self._generation
+
+        membership = loader(group_id)
+        if membership is not None:
+            self.put(group_id, membership, generation)
+        return membership
+
+    def put(self, group_id: str, membership: Membership, generation: Optional[int] = None):
+        """
+        Store membership for a group
+
+        Args:
+            generation: The generation when the membership was read; if
+                anything was invalidated since, it isn't stored
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[group_id] = (membership, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_groups:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, group_id: str):
+        """Drop a group's entry after its membership changed"""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(group_id, None)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# Singleton instance
+membership_cache = MembershipCache(MEMBERSHIP_CACHE_TTL_SECONDS, MEMBERSHIP_CACHE_MAX_GROUPS)
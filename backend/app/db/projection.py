@@ -0,0 +1,27 @@
+"""
+Projection expressions
+Read only the attributes a caller asked for
+"""
+from typing import Iterable, Optional
+
+
+def projection(fields: Optional[Iterable[str]], key_attrs: Iterable[str] = ()) -> dict:
+    """
+    ProjectionExpression arguments for a set of top-level attributes
+
+    Every name goes through a placeholder, so reserved words (name, status)
+    need no special handling. Key attributes are always included.
+
+    Args:
+        fields: Attributes to read, or None/empty for the whole item
+        key_attrs: Attributes always read along with them
+
+    Returns:
+        dict: ProjectionExpression and ExpressionAttributeNames to pass to
+            get_item, query, scan or batch_get_item ({} for the whole item)
+    """
+    if not fields:
+        return {}
+    attributes = list(dict.fromkeys([*key_attrs, *fields]))
+    names = {f"#p{i}": attribute for i, attribute in enumerate(attributes)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
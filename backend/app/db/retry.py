@@ -0,0 +1,216 @@
+"""
+Database retry policy
+Retries throttled and transient DynamoDB failures with decorrelated-jitter
+backoff under a process-wide retry budget, and counts them for metrics
+"""
+import random
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from ..config import (
+    DB_CONFLICT_MAX_ATTEMPTS,
+    DB_RETRY_BASE_SECONDS,
+    DB_RETRY_BUDGET_MIN_PER_SECOND,
+    DB_RETRY_BUDGET_RATIO,
+    DB_RETRY_MAX_ATTEMPTS,
+    DB_RETRY_MAX_SECONDS,
+)
+
+THROTTLE_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    # Cancellation reasons inside TransactionCanceledException
+    "ProvisionedThroughputExceeded",
+    "ThrottlingError",
+}
+TRANSIENT_CODES = {
+    "InternalServerError",
+    "ServiceUnavailable",
+    "TransactionConflictException",
+    "TransactionConflict",
+}
+CONDITIONAL_CODES = {"ConditionalCheckFailedException", "ConditionalCheckFailed"}
+
+THROTTLE = "throttle"
+TRANSIENT = "transient"
+CONDITIONAL = "conditional"
+
+
+def _classify_error(error: dict, cancellation_reasons: list) -> Optional[str]:
+    code = error.get("Code")
+    if code == "TransactionCanceledException":
+        codes = {r.get("Code") for r in cancellation_reasons}
+        if codes & CONDITIONAL_CODES:
+            return CONDITIONAL
+        if codes & THROTTLE_CODES:
+            return THROTTLE
+        if codes & TRANSIENT_CODES:
+            return TRANSIENT
+        return None
+    if code in THROTTLE_CODES:
+        return THROTTLE
+    if code in TRANSIENT_CODES:
+        return TRANSIENT
+    if code in CONDITIONAL_CODES:
+        return CONDITIONAL
+    return None
+
+
+def classify(error: Exception) -> Optional[str]:
+    """THROTTLE, TRANSIENT, CONDITIONAL or None (not retryable) for a raised error"""
+    if isinstance(error, ClientError):
+        return _classify_error(error.response.get("Error", {}), error.response.get("CancellationReasons", []))
+    if isinstance(error, (ConnectionError, HTTPClientError)):
+        return TRANSIENT
+    return None
+
+
+def is_throttled(error: Exception) -> bool:
+    """The call was still throttled after the retry policy gave up"""
+    return classify(error) == THROTTLE
+
+
+def is_conditional_failure(error: Exception) -> bool:
+    """A condition expression (or a transaction's condition) didn't hold"""
+    return classify(error) == CONDITIONAL
+
+
+def _next_delay(previous: float) -> float:
+    """Decorrelated jitter: random between the base and three times the last delay"""
+    return min(DB_RETRY_MAX_SECONDS, random.uniform(DB_RETRY_BASE_SECONDS, previous * 3))
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests
+
+    Every first attempt deposits ratio tokens and every retry withdraws
+    one, plus a small reserve refilling at min_per_second so a quiet
+    process can still retry. When DynamoDB is overloaded the budget runs
+    dry and calls fail fast instead of multiplying the load.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, capacity: float = 100.0):
+        self._lock = threading.Lock()
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._capacity = max(capacity, min_per_second)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._capacity, self._tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._min_per_second)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RetryPolicy:
+    """
+    Retry policy shared by every DynamoDB call in the process
+
+    Installed on the boto3 client's needs-retry event (see connection.py)
+    in place of botocore's own retries, so table calls, batch writers,
+    batch gets and transactions all go through it:
+    - throttling and transient errors (5xx, transaction conflicts, network
+      failures) are retried up to DB_RETRY_MAX_ATTEMPTS with decorrelated
+      jitter, while the retry budget allows
+    - conditional failures are never retried here; read-modify-write
+      callers use retry_on_conflict, which re-reads before trying again
+    """
+
+    def __init__(self):
+        self.budget = RetryBudget(DB_RETRY_BUDGET_RATIO, DB_RETRY_BUDGET_MIN_PER_SECOND)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._throttled_operations = Counter()
+
+    def _count(self, name: str, operation: Optional[str] = None):
+        with self._lock:
+            self._counts[name] += 1
+            if operation:
+                self._throttled_operations[operation] += 1
+
+    def needs_retry(self, response=None, attempts=1, caught_exception=None,
+                    request_dict=None, operation=None, **kwargs):
+        """botocore needs-retry handler: seconds to sleep before retrying, or None"""
+        if attempts == 1:
+            self.budget.deposit()
+
+        if caught_exception is not None:
+            kind = classify(caught_exception)
+        elif response is not None and response[1].get("Error"):
+            parsed = response[1]
+            kind = _classify_error(parsed["Error"], parsed.get("CancellationReasons", []))
+        else:
+            return None
+        if kind is None:
+            return None
+
+        self._count(kind, operation.name if kind == THROTTLE and operation else None)
+        if kind == CONDITIONAL:
+            return None
+        if attempts >= DB_RETRY_MAX_ATTEMPTS:
+            self._count("exhausted")
+            return None
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            return None
+
+        self._count("retries")
+        context = request_dict.setdefault("context", {})
+        delay = _next_delay(context.get("retry_delay", DB_RETRY_BASE_SECONDS))
+        context["retry_delay"] = delay
+        return delay
+
+    def retry_on_conflict(self, operation: Callable, attempts: int = DB_CONFLICT_MAX_ATTEMPTS):
+        """
+        Run a read-modify-write operation, re-running it when its condition fails
+
+        The operation must re-read what it depends on each time it runs.
+        After the last attempt the conditional failure is raised.
+        """
+        delay = DB_RETRY_BASE_SECONDS
+        for attempt in range(1, attempts + 1):
+            try:
+                return operation()
+            except ClientError as ce:
+                if not is_conditional_failure(ce) or attempt == attempts:
+                    raise
+                self._count("conflict_retries")
+                delay = _next_delay(delay)
+                time.sleep(delay)
+
+    def metrics(self) -> dict:
+        """Counters since startup and the retry budget's current balance"""
+        with self._lock:
+            return {
+                "throttled": self._counts[THROTTLE],
+                "throttledByOperation": dict(self._throttled_operations),
+                "transient": self._counts[TRANSIENT],
+                "conditionalFailures": self._counts[CONDITIONAL],
+                "retries": self._counts["retries"],
+                "conflictRetries": self._counts["conflict_retries"],
+                "gaveUpAfterMaxAttempts": self._counts["exhausted"],
+                "gaveUpOnBudget": self._counts["budget_exhausted"],
+                "budgetTokens": round(self.budget.tokens, 2),
+            }
+
+
+# Singleton instance
+retry_policy = RetryPolicy()
@@ -0,0 +1,125 @@
+"""
+Snapshot database operations
+Daily net asset value (NAV) records per group for performance charts
+"""
+from decimal import Decimal
+from typing import Dict, List
+from boto3.dynamodb.conditions import Key
+from .connection import ddb, snapshots_table
+
+# Sort key of the per-group item holding the newest snapshot with positions.
+# "LATEST" sorts after every YYYY-MM-DD date.
+LATEST = "LATEST"
+
+
+def _money(value: float) -> Decimal:
+    return Decimal(str(round(value, 2)))
+
+
+def put_snapshots(snapshots: List[dict]):
+    """
+    Write snapshots for many groups
+
+    Each snapshot is stored twice: a compact daily record (balance,
+    invested, total) and the group's LATEST item, which also keeps the
+    positions and the time taken so the next run can continue from it.
+
+    Args:
+        snapshots: Dicts with groupID, date, takenAt, balance, invested,
+            costBasis and positions ({symbol: (quantity, cost)})
+    """
+    with snapshots_table.batch_writer(overwrite_by_pkeys=["groupID", "date"]) as batch:
+        for snapshot in snapshots:
+            daily = {
+                "groupID": snapshot["groupID"],
+                "date": snapshot["date"],
+                "balance": _money(snapshot["balance"]),
+                "invested": _money(snapshot["invested"]),
+                "total": _money(snapshot["balance"] + snapshot["invested"]),
+            }
+            batch.put_item(Item=daily)
+            batch.put_item(Item={
+                **daily,
+                "date": LATEST,
+                "day": snapshot["date"],
+                "takenAt": snapshot["takenAt"],
+                "costBasis": _money(snapshot["costBasis"]),
+                "positions": {
+                    symbol: {"q": Decimal(str(quantity)), "c": Decimal(str(cost))}
+                    for symbol, (quantity, cost) in snapshot["positions"].items()
+                },
+            })
+
+
+def get_latest_snapshots(group_ids: List[str]) -> Dict[str, dict]:
+    """
+    Get the LATEST snapshot item of many groups with batched reads
+
+    Returns:
+        dict: groupID -> {"takenAt", "positions": {symbol: (quantity, cost)}}
+            for groups that have a snapshot
+    """
+    latest = {}
+    for i in range(0, len(group_ids), 100):
+        request = {
+            snapshots_table.name: {
+                "Keys": [{"groupID": g, "date": LATEST} for g in group_ids[i:i + 100]],
+                "ProjectionExpression": "groupID, takenAt, positions",
+            }
+        }
+        while request:
+            response = ddb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(snapshots_table.name, []):
+                latest[item["groupID"]] = {
+                    "takenAt": item["takenAt"],
+                    "positions": {
+                        symbol: (float(p["q"]), float(p["c"]))
+                        for symbol, p in item.get("positions", {}).items()
+                    },
+                }
+            request = response.get("UnprocessedKeys") or None
+    return latest
+
+
+def get_daily_snapshots(group_id: str, start_date: str, end_date: str) -> List[dict]:
+    """
+    Get a group's daily snapshots between two dates (YYYY-MM-DD, inclusive)
+
+    Returns:
+        list: Items with date, balance, invested and total, oldest first
+    """
+    items = []
+    query_kwargs = {
+        "KeyConditionExpression": Key("groupID").eq(group_id) & Key("date").between(start_date, end_date),
+        "ProjectionExpression": "#date, balance, invested, #total",
+        "ExpressionAttributeNames": {"#date": "date", "#total": "total"},
+    }
+    while True:
+        response = snapshots_table.query(**query_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_snapshot_dates(group_id: str) -> List[str]:
+    """Get the sort keys of all of a group's snapshot items (dates and LATEST)"""
+    dates = []
+    query_kwargs = {
+        "KeyConditionExpression": Key("groupID").eq(group_id),
+        "ProjectionExpression": "#date",
+        "ExpressionAttributeNames": {"#date": "date"},
+    }
+    while True:
+        response = snapshots_table.query(**query_kwargs)
+        dates.extend(item["date"] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return dates
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def delete_snapshots(group_id: str, dates: List[str]):
+    """Delete snapshot items of a group with batched writes"""
+    with snapshots_table.batch_writer() as batch:
+        for date in dates:
+            batch.delete_item(Key={"groupID": group_id, "date": date})
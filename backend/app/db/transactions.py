@@ -6,7 +6,12 @@ import datetime
 import uuid
 from decimal import Decimal
 from boto3.dynamodb.conditions import Key, Attr
-from .connection import transactions_table
+from botocore.exceptions import ClientError
+from . import ledger
+from .connection import ddb, transactions_table, groups_table, users_table
+from .projection import projection
+from .retry import is_conditional_failure, is_throttled
+from ..config import USER_PK_ATTR
 
 
 def create_transaction(group_id: str, user_id: str, amount: float, description: str, transaction_type: str = "investment", metadata: dict = None) -> dict:
@@ -42,22 +47,153 @@ def create_transaction(group_id: str, user_id: str, amount: float, description:
     if metadata:
         item["metadata"] = metadata
     
-    transactions_table.put_item(Item=item)
+    ledger.append(
+        group_id, "transaction.proposed",
+        {"transactionId": transaction_id, "transactionType": transaction_type, "amount": item["amount"]},
+        actor=user_id,
+        writes=[{"Put": {"TableName": transactions_table.name, "Item": item}}]
+    )
+    return item
+
+
+def record_deposit(group_id: str, user_id: str, amount: float) -> dict:
+    """
+    Move a deposit from the user's balance to the group's and record it
+    
+    The user debit (only if their balance covers it), the group credit,
+    the deposit record and its ledger event are one transaction.
+    Deposits don't need a vote, so they are stored as executed right away.
+    
+    Returns:
+        dict: Created transaction item
+        
+    Raises:
+        ClientError: conditional failure if the user's balance is too low
+    """
+    now = datetime.datetime.utcnow().isoformat()
+    item = {
+        "transactionID": str(uuid.uuid4()),
+        "groupID": group_id,
+        "amount": Decimal(str(amount)),
+        "description": "Deposit",
+        "proposedBy": user_id,
+        "transactionType": "deposit",
+        "status": "executed",
+        "votes": {},
+        "createdAt": now,
+        "executedAt": now
+    }
+    amount = item["amount"]
+    ledger.append(
+        group_id, "deposit.made", {"transactionId": item["transactionID"], "amount": amount}, actor=user_id,
+        writes=[
+            {
+                "Update": {
+                    "TableName": users_table.name,
+                    "Key": {USER_PK_ATTR: user_id},
+                    "UpdateExpression": "SET balance = balance - :amount",
+                    "ConditionExpression": "balance >= :amount",
+                    "ExpressionAttributeValues": {":amount": amount}
+                }
+            },
+            {
+                "Update": {
+                    "TableName": groups_table.name,
+                    "Key": {"groupID": group_id},
+                    "UpdateExpression": "SET balance = if_not_exists(balance, :zero) + :amount",
+                    "ConditionExpression": "attribute_exists(groupID)",
+                    "ExpressionAttributeValues": {":amount": amount, ":zero": Decimal("0")}
+                }
+            },
+            {"Put": {"TableName": transactions_table.name, "Item": item}}
+        ]
+    )
     return item
 
 
-def get_transaction(transaction_id: str) -> dict:
-    """Get transaction by transaction ID"""
-    response = transactions_table.get_item(Key={"transactionID": transaction_id})
+def get_deposits(group_id: str) -> list:
+    """Get every deposit recorded for a group"""
+    items = []
+    scan_kwargs = {
+        "FilterExpression": Attr("groupID").eq(group_id) & Attr("transactionType").eq("deposit"),
+        "ProjectionExpression": "amount, createdAt"
+    }
+    while True:
+        response = transactions_table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def scan_deposit_pages(segment: int, total_segments: int):
+    """
+    Yield pages of executed deposits from one segment of a parallel scan
+    
+    Args:
+        segment: This worker's segment (0 to total_segments - 1)
+        total_segments: Number of segments the table is split into
+        
+    Yields:
+        list: Items with groupID, amount and createdAt
+    """
+    scan_kwargs = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "FilterExpression": Attr("transactionType").eq("deposit") & Attr("status").eq("executed"),
+        "ProjectionExpression": "groupID, amount, createdAt"
+    }
+    while True:
+        response = transactions_table.scan(**scan_kwargs)
+        yield response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_transaction(transaction_id: str, fields: list = None) -> dict:
+    """Get transaction by transaction ID, reading only the given attributes if fields is set"""
+    response = transactions_table.get_item(
+        Key={"transactionID": transaction_id}, **projection(fields, ["transactionID"])
+    )
     return response.get("Item")
 
 
-def get_group_transactions(group_id: str):
+def get_transactions(transaction_ids: list, fields: list = None) -> list:
+    """
+    Get many transactions with batched reads
+    
+    Args:
+        transaction_ids: IDs of the transactions, in the order to return them
+        fields: Attributes to read (None for whole items)
+        
+    Returns:
+        list: Transaction items in transaction_ids order; missing ones are skipped
+    """
+    transaction_ids = list(dict.fromkeys(transaction_ids))
+    found = {}
+    for i in range(0, len(transaction_ids), 100):
+        request = {
+            transactions_table.name: {
+                "Keys": [{"transactionID": t} for t in transaction_ids[i:i + 100]],
+                **projection(fields, ["transactionID"]),
+            }
+        }
+        while request:
+            response = ddb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(transactions_table.name, []):
+                found[item["transactionID"]] = item
+            request = response.get("UnprocessedKeys") or None
+    return [found[t] for t in transaction_ids if t in found]
+
+
+def get_group_transactions(group_id: str, fields: list = None):
     """
     Get all transactions for a group using scan (fallback if no GSI)
     
     Args:
         group_id: ID of the group
+        fields: Attributes to read (None for whole items)
         
     Returns:
         list: List of transaction items
@@ -65,14 +201,50 @@ def get_group_transactions(group_id: str):
     try:
         # Use scan with filter instead of query (less efficient but works without GSI)
         response = transactions_table.scan(
-            FilterExpression=Attr("groupID").eq(group_id)
+            FilterExpression=Attr("groupID").eq(group_id),
+            **projection(fields, ["transactionID"])
         )
         return response.get("Items", [])
     except Exception as e:
+        if is_throttled(e):
+            raise
         print(f"Error scanning transactions: {e}")
         return []
 
 
+def scan_group_transaction_ids(group_id: str, start_key: dict = None):
+    """
+    Scan for the IDs of a group's transactions, one page at a time
+    
+    Args:
+        group_id: ID of the group
+        start_key: Scan position to continue from (a page's next key)
+        
+    Yields:
+        tuple: (transaction IDs in the page, key to continue after it or None)
+    """
+    scan_kwargs = {
+        "FilterExpression": Attr("groupID").eq(group_id),
+        "ProjectionExpression": "transactionID",
+    }
+    if start_key:
+        scan_kwargs["ExclusiveStartKey"] = start_key
+    while True:
+        response = transactions_table.scan(**scan_kwargs)
+        next_key = response.get("LastEvaluatedKey")
+        yield [item["transactionID"] for item in response.get("Items", [])], next_key
+        if not next_key:
+            return
+        scan_kwargs["ExclusiveStartKey"] = next_key
+
+
+def delete_transactions(transaction_ids: list):
+    """Delete many transactions with batched writes"""
+    with transactions_table.batch_writer() as batch:
+        for transaction_id in transaction_ids:
+            batch.delete_item(Key={"transactionID": transaction_id})
+
+
 def record_vote(transaction_id: str, user_id: str, vote: str):
     """
     Record a user's vote on a transaction
@@ -96,14 +268,316 @@ def record_vote(transaction_id: str, user_id: str, vote: str):
     )
 
 
-def update_status(transaction_id: str, status: str):
-    """Update transaction status"""
-    transactions_table.update_item(
-        Key={"transactionID": transaction_id},
-        UpdateExpression="SET #status = :status",
-        ExpressionAttributeNames={"#status": "status"},
-        ExpressionAttributeValues={":status": status}
+def cast_vote(transaction_id: str, group_id: str, user_id: str, vote: str) -> dict:
+    """
+    Record a user's vote unless they have already voted
+    
+    Writes only the user's entry of the votes map, so concurrent voters
+    don't overwrite each other, together with the vote's ledger event.
+    
+    Args:
+        transaction_id: ID of the transaction
+        group_id: ID of the transaction's group
+        user_id: ID of voting user
+        vote: "approve" or "reject"
+        
+    Returns:
+        dict: All votes after this one, or None if the user had already
+            voted or the transaction doesn't exist
+    """
+    try:
+        ledger.append(
+            group_id, "vote.cast", {"transactionId": transaction_id, "vote": vote}, actor=user_id,
+            writes=[{
+                "Update": {
+                    "TableName": transactions_table.name,
+                    "Key": {"transactionID": transaction_id},
+                    "UpdateExpression": "SET votes.#user = :vote",
+                    "ConditionExpression": "attribute_exists(transactionID) AND attribute_not_exists(votes.#user)",
+                    "ExpressionAttributeNames": {"#user": user_id},
+                    "ExpressionAttributeValues": {":vote": vote}
+                }
+            }]
+        )
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return None
+        raise
+    response = transactions_table.get_item(
+        Key={"transactionID": transaction_id}, ProjectionExpression="votes", ConsistentRead=True
     )
+    return response.get("Item", {}).get("votes", {})
+
+
+def set_vote_outcome(transaction_id: str, group_id: str, status: str) -> bool:
+    """
+    Mark a pending transaction "approved" or "rejected"
+    
+    Returns:
+        bool: False if the transaction was no longer pending
+    """
+    try:
+        ledger.append(group_id, f"transaction.{status}", {"transactionId": transaction_id}, writes=[{
+            "Update": {
+                "TableName": transactions_table.name,
+                "Key": {"transactionID": transaction_id},
+                "UpdateExpression": "SET #status = :status",
+                "ConditionExpression": "#status = :pending",
+                "ExpressionAttributeNames": {"#status": "status"},
+                "ExpressionAttributeValues": {":status": status, ":pending": "pending"}
+            }
+        }])
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def execute(transaction: dict, user_id: str) -> bool:
+    """
+    Execute an approved transaction in one write with its ledger event
+    
+    An investment moves its amount from the group's balance to
+    investedAmount, a withdrawal takes it from the balance. Stock trades
+    are left in orderStatus "pending_fill" for the order queue.
+    
+    Args:
+        transaction: Transaction item (groupID, amount, transactionType, metadata)
+        user_id: User executing it
+        
+    Returns:
+        bool: False if the transaction was no longer approved (or already
+            executed) or the group's balance no longer covers it
+    """
+    amount = Decimal(str(transaction["amount"]))
+    transaction_type = transaction.get("transactionType", "investment")
+    pending_fill = bool(transaction.get("metadata", {}).get("stock_symbol"))
+    
+    if transaction_type == "investment":
+        group_update = "SET balance = balance - :amount, investedAmount = if_not_exists(investedAmount, :zero) + :amount"
+    else:
+        group_update = "SET balance = balance - :amount"
+    transaction_update = "SET #status = :executed, executedAt = :now"
+    transaction_values = {
+        ":executed": "executed",
+        ":approved": "approved",
+        ":now": datetime.datetime.utcnow().isoformat()
+    }
+    if pending_fill:
+        transaction_update += ", orderStatus = :pending_fill"
+        transaction_values[":pending_fill"] = "pending_fill"
+    
+    try:
+        ledger.append(
+            transaction["groupID"], "transaction.executed",
+            {
+                "transactionId": transaction["transactionID"],
+                "transactionType": transaction_type,
+                "amount": amount,
+                "pendingFill": pending_fill
+            },
+            actor=user_id,
+            writes=[
+                {
+                    "Update": {
+                        "TableName": transactions_table.name,
+                        "Key": {"transactionID": transaction["transactionID"]},
+                        "UpdateExpression": transaction_update,
+                        "ConditionExpression": "#status = :approved AND attribute_not_exists(executedAt)",
+                        "ExpressionAttributeNames": {"#status": "status"},
+                        "ExpressionAttributeValues": transaction_values
+                    }
+                },
+                {
+                    "Update": {
+                        "TableName": groups_table.name,
+                        "Key": {"groupID": transaction["groupID"]},
+                        "UpdateExpression": group_update,
+                        "ConditionExpression": "balance >= :amount",
+                        "ExpressionAttributeValues": {
+                            ":amount": amount,
+                            **({":zero": Decimal("0")} if transaction_type == "investment" else {})
+                        }
+                    }
+                }
+            ]
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def get_pending_fills() -> list:
+    """Get IDs of executed trades still waiting for a broker fill"""
+    ids = []
+    scan_kwargs = {
+        "FilterExpression": Attr("orderStatus").eq("pending_fill"),
+        "ProjectionExpression": "transactionID"
+    }
+    while True:
+        response = transactions_table.scan(**scan_kwargs)
+        ids.extend(item["transactionID"] for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return ids
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_executed_trades(group_id: str = None, settled_after: str = None) -> list:
+    """
+    Get executed stock trades, for one group or every group
+    
+    Only the attributes needed to rebuild positions are read.
+    
+    Args:
+        group_id: Restrict to one group (None for all groups)
+        settled_after: Only trades executed or filled after this ISO time,
+            plus those still waiting for their fill
+        
+    Returns:
+        list: Trade items with groupID, amount, createdAt, executedAt,
+            filledAt, orderStatus and metadata
+    """
+    condition = Attr("status").eq("executed") & Attr("metadata.stock_symbol").exists()
+    if group_id:
+        condition = condition & Attr("groupID").eq(group_id)
+    if settled_after:
+        condition = condition & (
+            Attr("executedAt").gt(settled_after)
+            | Attr("filledAt").gt(settled_after)
+            | Attr("orderStatus").eq("pending_fill")
+        )
+    items = []
+    scan_kwargs = {
+        "FilterExpression": condition,
+        "ProjectionExpression": "groupID, amount, createdAt, executedAt, filledAt, orderStatus, metadata"
+    }
+    while True:
+        response = transactions_table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def record_fill(transaction: dict, fill: dict) -> bool:
+    """
+    Record a broker fill on a trade and its group's balances in one write
+    
+    The proposal already moved its estimated cost from the group's balance
+    to investedAmount, so only the difference to the actual fill is applied.
+    Holdings and costBasis follow from the order.filled event.
+    
+    Args:
+        transaction: Transaction item (must be in pending_fill order status)
+        fill: {"orderId", "price", "quantity", "filledAt"}
+        
+    Returns:
+        bool: False if the fill was already recorded
+    """
+    metadata = transaction.get("metadata", {})
+    symbol = metadata["stock_symbol"]
+    quantity = Decimal(str(fill["quantity"]))
+    total = (Decimal(str(fill["price"])) * quantity).quantize(Decimal("0.01"))
+    adjustment = total - Decimal(str(transaction["amount"]))
+    
+    try:
+        ledger.append(
+            transaction["groupID"], "order.filled",
+            {
+                "transactionId": transaction["transactionID"],
+                "symbol": symbol,
+                "quantity": quantity,
+                "total": total,
+                "adjustment": adjustment
+            },
+            writes=[
+                {
+                    "Update": {
+                        "TableName": transactions_table.name,
+                        "Key": {"transactionID": transaction["transactionID"]},
+                        "UpdateExpression": "SET orderStatus = :filled, metadata.fill = :fill, filledAt = :now",
+                        "ConditionExpression": "orderStatus = :pending",
+                        "ExpressionAttributeValues": {
+                            ":filled": "filled",
+                            ":pending": "pending_fill",
+                            # when we recorded it; filled_at is the broker's time
+                            ":now": datetime.datetime.utcnow().isoformat(),
+                            # stored as strings like the rest of the trade metadata
+                            ":fill": {
+                                "order_id": str(fill["orderId"]),
+                                "price": str(fill["price"]),
+                                "quantity": str(fill["quantity"]),
+                                "total": str(total),
+                                "filled_at": fill["filledAt"]
+                            }
+                        }
+                    }
+                },
+                {
+                    "Update": {
+                        "TableName": groups_table.name,
+                        "Key": {"groupID": transaction["groupID"]},
+                        "UpdateExpression": (
+                            "SET balance = balance - :adjustment, "
+                            "investedAmount = investedAmount + :adjustment"
+                        ),
+                        "ExpressionAttributeValues": {":adjustment": adjustment}
+                    }
+                }
+            ]
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def record_fill_failure(transaction: dict) -> bool:
+    """
+    Mark a trade whose order could not be placed as failed and refund the group
+    
+    Returns:
+        bool: False if the trade was no longer pending a fill
+    """
+    amount = Decimal(str(transaction["amount"]))
+    try:
+        ledger.append(
+            transaction["groupID"], "order.failed",
+            {"transactionId": transaction["transactionID"], "amount": amount},
+            writes=[
+                {
+                    "Update": {
+                        "TableName": transactions_table.name,
+                        "Key": {"transactionID": transaction["transactionID"]},
+                        "UpdateExpression": "SET orderStatus = :failed, #status = :failed, failedAt = :now",
+                        "ConditionExpression": "orderStatus = :pending",
+                        "ExpressionAttributeNames": {"#status": "status"},
+                        "ExpressionAttributeValues": {
+                            ":failed": "failed",
+                            ":pending": "pending_fill",
+                            ":now": datetime.datetime.utcnow().isoformat()
+                        }
+                    }
+                },
+                {
+                    "Update": {
+                        "TableName": groups_table.name,
+                        "Key": {"groupID": transaction["groupID"]},
+                        "UpdateExpression": "SET balance = balance + :amount, investedAmount = investedAmount - :amount",
+                        "ExpressionAttributeValues": {":amount": amount}
+                    }
+                }
+            ]
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
 
 
 def get_votes(transaction_id: str) -> dict:
@@ -149,6 +623,8 @@ def get_user_transaction_history(group_ids: list) -> list:
             transactions = get_group_transactions(group_id)
             all_transactions.extend(transactions)
         except Exception as e:
+            if is_throttled(e):
+                raise
             # If GSI doesn't exist, scan the table (slower but works)
             print(f"Warning: GSI not available, using scan for group {group_id}: {e}")
             response = transactions_table.scan(
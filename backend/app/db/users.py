@@ -2,28 +2,29 @@
 User database operations
 CRUD functions for Users table
 """
-import hashlib
 import datetime
 import uuid
 from boto3.dynamodb.conditions import Key
-from .connection import users_table
+from botocore.exceptions import ClientError
+from .connection import ddb, users_table
+from .projection import projection
+from .retry import is_conditional_failure, is_throttled, retry_policy
 from ..config import USER_PK_ATTR
 
 
-def create_user(username: str, email: str, password: str) -> dict:
+def create_user(username: str, email: str, password_hash: str) -> dict:
     """
     Create a new user in the database
     
     Args:
         username: User's display name
         email: User's email address (will be lowercased)
-        password: Plain text password (will be hashed)
+        password_hash: Hash from services.password_hasher
         
     Returns:
         dict: Created user item
     """
     user_id = str(uuid.uuid4())
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
     
     item = {
         USER_PK_ATTR: user_id,
@@ -41,9 +42,9 @@ def create_user(username: str, email: str, password: str) -> dict:
     return item
 
 
-def get_user_by_id(user_id: str) -> dict:
-    """Get user by user ID"""
-    response = users_table.get_item(Key={USER_PK_ATTR: user_id})
+def get_user_by_id(user_id: str, fields: list = None) -> dict:
+    """Get user by user ID, reading only the given attributes if fields is set"""
+    response = users_table.get_item(Key={USER_PK_ATTR: user_id}, **projection(fields, [USER_PK_ATTR]))
     return response.get("Item")
 
 
@@ -65,6 +66,8 @@ def get_all_users() -> list:
         
         return items
     except Exception as e:
+        if is_throttled(e):
+            raise
         print(f"Error scanning users table: {e}")
         return []
 
@@ -90,40 +93,117 @@ def get_user_by_email(email: str) -> dict:
         return None
 
 
-def verify_password(stored_hash: str, password: str) -> bool:
-    """Verify password matches stored hash"""
-    input_hash = hashlib.sha256(password.encode()).hexdigest()
-    return input_hash == stored_hash
+def update_password_hash(user_id: str, old_hash: str, new_hash: str) -> bool:
+    """
+    Replace a user's password hash (e.g. upgrading a legacy hash on login)
+    
+    Only applies if the stored hash is still old_hash, so a password
+    change made in the meantime isn't overwritten.
+    
+    Returns:
+        bool: True if the hash was replaced
+    """
+    try:
+        users_table.update_item(
+            Key={USER_PK_ATTR: user_id},
+            UpdateExpression="SET passwordHash = :new_hash",
+            ConditionExpression="passwordHash = :old_hash",
+            ExpressionAttributeValues={":new_hash": new_hash, ":old_hash": old_hash}
+        )
+        return True
+    except users_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
 
 
-def add_group_to_user(user_id: str, group_id: str):
-    """Add a group ID to user's groups list"""
-    users_table.update_item(
-        Key={USER_PK_ATTR: user_id},
-        UpdateExpression="SET #groups = list_append(if_not_exists(#groups, :empty_list), :group_id)",
-        ExpressionAttributeNames={"#groups": "groups"},
-        ExpressionAttributeValues={
-            ":group_id": [group_id],
-            ":empty_list": []
-        }
-    )
+def add_group_to_user(user_id: str, group_id: str) -> bool:
+    """
+    Add a group ID to user's groups list
+    
+    Returns:
+        bool: False if the list already held it (or the user doesn't exist)
+    """
+    try:
+        users_table.update_item(
+            Key={USER_PK_ATTR: user_id},
+            UpdateExpression="SET #groups = list_append(if_not_exists(#groups, :empty_list), :group_id)",
+            ConditionExpression="attribute_exists(#pk) AND (attribute_not_exists(#groups) OR NOT contains(#groups, :group))",
+            ExpressionAttributeNames={"#groups": "groups", "#pk": USER_PK_ATTR},
+            ExpressionAttributeValues={
+                ":group_id": [group_id],
+                ":group": group_id,
+                ":empty_list": []
+            }
+        )
+        return True
+    except ClientError as ce:
+        if is_conditional_failure(ce):
+            return False
+        raise
+
+
+def _remove_group_update(user_id: str, groups: list, group_id: str) -> dict:
+    """Update arguments removing group_id from a groups list as it was read"""
+    i = groups.index(group_id)
+    return {
+        "Key": {USER_PK_ATTR: user_id},
+        # The index is only right if the list hasn't changed since it was read
+        "UpdateExpression": f"REMOVE #groups[{i}]",
+        "ConditionExpression": f"#groups[{i}] = :group_id",
+        "ExpressionAttributeNames": {"#groups": "groups"},
+        "ExpressionAttributeValues": {":group_id": group_id},
+    }
 
 
 def remove_group_from_user(user_id: str, group_id: str):
     """Remove a group ID from user's groups list"""
-    user = get_user_by_id(user_id)
-    if not user:
-        return
+    def attempt():
+        user = get_user_by_id(user_id, ["groups"])
+        if not user or group_id not in user.get("groups", []):
+            return
+        users_table.update_item(**_remove_group_update(user_id, user["groups"], group_id))
+
+    retry_policy.retry_on_conflict(attempt)
+
+
+def remove_group_from_users(user_ids: list, group_id: str) -> int:
+    """
+    Remove a group ID from many users' groups lists
     
-    groups = user.get("groups", [])
-    if group_id in groups:
-        groups.remove(group_id)
-        users_table.update_item(
-            Key={USER_PK_ATTR: user_id},
-            UpdateExpression="SET #groups = :groups",
-            ExpressionAttributeNames={"#groups": "groups"},
-            ExpressionAttributeValues={":groups": groups}
-        )
+    The users are read with one batched read and updated in one
+    transaction of conditional updates (at most 100 users). If any list
+    changed in between, the transaction is cancelled and those users are
+    updated one at a time instead.
+    
+    Returns:
+        int: Number of users whose list held the group
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    found = []
+    request = {
+        users_table.name: {
+            "Keys": [{USER_PK_ATTR: u} for u in user_ids],
+            **projection(["groups"], [USER_PK_ATTR]),
+        }
+    } if user_ids else None
+    while request:
+        response = ddb.batch_get_item(RequestItems=request)
+        found.extend(response.get("Responses", {}).get(users_table.name, []))
+        request = response.get("UnprocessedKeys") or None
+    
+    updates = [
+        {"Update": {"TableName": users_table.name, **_remove_group_update(user[USER_PK_ATTR], user["groups"], group_id)}}
+        for user in found if group_id in user.get("groups", [])
+    ]
+    if not updates:
+        return 0
+    try:
+        ddb.meta.client.transact_write_items(TransactItems=updates)
+    except ClientError as ce:
+        if not is_conditional_failure(ce):
+            raise
+        for update in updates:
+            remove_group_from_user(update["Update"]["Key"][USER_PK_ATTR], group_id)
+    return len(updates)
 
 
 def get_user_groups(user_id: str) -> list:
@@ -0,0 +1,45 @@
+"""
+Field selection
+The ?fields= query parameter shared by list and detail routes
+"""
+from typing import Callable, Iterable, List, Optional
+from fastapi import HTTPException, Query
+
+
+def select_fields(allowed: Iterable[str]) -> Callable:
+    """
+    Dependency parsing ?fields=a,b,c against an allowlist
+
+    Returns:
+        Callable: Dependency returning the requested fields in order, or
+            None when the parameter is absent (return everything)
+
+    Raises:
+        HTTPException: 400 if a field is not in the allowlist
+    """
+    allowed = frozenset(allowed)
+
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: all)")
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in requested if f not in allowed]
+        if unknown or not requested:
+            raise HTTPException(
+                400,
+                f"Unknown fields: {', '.join(unknown) or '(none given)'}. "
+                f"Allowed: {', '.join(sorted(allowed))}"
+            )
+        return requested
+
+    return dependency
+
+
+def pick(item: dict, fields: Optional[List[str]], always: Iterable[str] = ()) -> dict:
+    """The requested fields of a response item (the whole item if fields is None)"""
+    if fields is None:
+        return item
+    keep = [*always, *fields]
+    return {k: item[k] for k in keep if k in item}
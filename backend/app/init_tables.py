@@ -9,7 +9,10 @@ from .config import (
     USERS_TABLE,
     GROUPS_TABLE,
     TRANSACTIONS_TABLE,
-    INVITES_TABLE
+    INVITES_TABLE,
+    SNAPSHOTS_TABLE,
+    LEDGER_TABLE,
+    LEASES_TABLE
 )
 
 
@@ -163,6 +166,82 @@ def create_tables():
         else:
             print(f"✗ Error creating {INVITES_TABLE}: {e}")
     
+    # Create Group Snapshots table (daily NAV per group)
+    try:
+        snapshots_table = dynamodb.create_table(
+            TableName=SNAPSHOTS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'groupID', 'KeyType': 'HASH'},
+                {'AttributeName': 'date', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'groupID', 'AttributeType': 'S'},
+                {'AttributeName': 'date', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+        print(f"✓ Created table: {SNAPSHOTS_TABLE}")
+    except Exception as e:
+        if 'ResourceInUseException' in str(e):
+            print(f"✓ Table already exists: {SNAPSHOTS_TABLE}")
+        else:
+            print(f"✗ Error creating {SNAPSHOTS_TABLE}: {e}")
+    
+    # Create Group Ledger table (append-only events per group, by sequence
+    # number); its stream feeds the projections in services/change_feed.py
+    try:
+        ledger_table = dynamodb.create_table(
+            TableName=LEDGER_TABLE,
+            KeySchema=[
+                {'AttributeName': 'groupID', 'KeyType': 'HASH'},
+                {'AttributeName': 'seq', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'groupID', 'AttributeType': 'S'},
+                {'AttributeName': 'seq', 'AttributeType': 'N'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            },
+            StreamSpecification={
+                'StreamEnabled': True,
+                'StreamViewType': 'KEYS_ONLY'
+            }
+        )
+        print(f"✓ Created table: {LEDGER_TABLE}")
+    except Exception as e:
+        if 'ResourceInUseException' in str(e):
+            print(f"✓ Table already exists: {LEDGER_TABLE}")
+        else:
+            print(f"✗ Error creating {LEDGER_TABLE}: {e}")
+    
+    # Create Leases table (which process runs each nightly job or reads
+    # each change feed shard, and how far it got)
+    try:
+        leases_table = dynamodb.create_table(
+            TableName=LEASES_TABLE,
+            KeySchema=[
+                {'AttributeName': 'leaseID', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'leaseID', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+        print(f"✓ Created table: {LEASES_TABLE}")
+    except Exception as e:
+        if 'ResourceInUseException' in str(e):
+            print(f"✓ Table already exists: {LEASES_TABLE}")
+        else:
+            print(f"✗ Error creating {LEASES_TABLE}: {e}")
+    
     print("\n✓ Database initialization complete!")
 
 
@@ -2,17 +2,63 @@
 TrustVault API - Main Application
 Joint investment platform for underserved communities
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import auth_routes, group_routes, transaction_routes, invite_routes, user_routes, stock_routes
+from .admission import AdmissionControl
+from .db.retry import is_throttled
+from .responses import FastResponse
+from .startup import report as startup_report, timed_import, warm_in_background
+
+# Route and service modules are imported through timed_import so the
+# startup report shows what each one costs
+ROUTE_MODULES = ["auth_routes", "group_routes", "transaction_routes", "invite_routes", "user_routes", "stock_routes", "admin_routes"]
+routers = [timed_import(f"{__package__}.routes.{name}").router for name in ROUTE_MODULES]
+alpaca_service = timed_import(f"{__package__}.services.alpaca_service").alpaca_service
+market_data_hub = timed_import(f"{__package__}.services.market_data_hub").market_data_hub
+order_queue = timed_import(f"{__package__}.services.order_queue").order_queue
+nightly_jobs = timed_import(f"{__package__}.services.nightly_jobs").nightly_jobs
+group_deletion = timed_import(f"{__package__}.services.group_deletion").group_deletion
+change_feed = timed_import(f"{__package__}.services.change_feed").change_feed
+password_hasher = timed_import(f"{__package__}.services.password_hasher").password_hasher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services"""
+    print(f"🚀 App modules imported in {startup_report()['totalImportMs']} ms")
+    # Market data clients, the simulator and the password hashing pool are
+    # all created lazily; warm them without holding up startup
+    warm_in_background("alpaca_service", alpaca_service.warm)
+    warm_in_background("password_hasher", password_hasher.warm)
+    market_data_hub.start()
+    order_queue.start()
+    nightly_jobs.start()
+    group_deletion.start()
+    change_feed.start()
+    yield
+    change_feed.stop()
+    group_deletion.stop()
+    nightly_jobs.stop()
+    order_queue.stop()
+    market_data_hub.stop()
+    password_hasher.shutdown()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="TrustVault API",
     description="Joint investment platform with group savings and democratic voting",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastResponse
 )
 
+# Admission control (added first so CORS wraps it and 429s carry CORS headers)
+app.add_middleware(AdmissionControl)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -23,12 +69,20 @@ app.add_middleware(
 )
 
 # Register route modules
-app.include_router(auth_routes.router)
-app.include_router(group_routes.router)
-app.include_router(transaction_routes.router)
-app.include_router(invite_routes.router)
-app.include_router(user_routes.router)
-app.include_router(stock_routes.router)
+for router in routers:
+    app.include_router(router)
+
+
+@app.exception_handler(ClientError)
+async def database_error_handler(request: Request, exc: ClientError):
+    """Answer 503 when DynamoDB is still throttling after retries"""
+    if is_throttled(exc):
+        return JSONResponse(
+            {"detail": "Service is busy, try again shortly"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    raise exc
 
 
 @app.get("/health")
@@ -4,6 +4,8 @@ Ensures data integrity and automatic API documentation
 """
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Dict, Optional
+from datetime import date
+from .config import MAX_BATCH_INVITES, MAX_BATCH_VOTES
 
 
 # ============== AUTH MODELS ==============
@@ -47,6 +49,11 @@ class AddMemberRequest(BaseModel):
     userId: str
 
 
+class SavingsGoalRequest(BaseModel):
+    amount: float = Field(..., gt=0)
+    targetDate: Optional[date] = None
+
+
 # ============== TRANSACTION MODELS ==============
 
 class TransactionCreate(BaseModel):
@@ -60,6 +67,15 @@ class TransactionVote(BaseModel):
     vote: str = Field(..., pattern="^(approve|reject)$")
 
 
+class BatchVoteItem(BaseModel):
+    transactionId: str
+    vote: str = Field(..., pattern="^(approve|reject)$")
+
+
+class BatchVoteRequest(BaseModel):
+    votes: List[BatchVoteItem] = Field(..., min_length=1, max_length=MAX_BATCH_VOTES)
+
+
 class TransactionResponse(BaseModel):
     transactionId: str
     groupId: str
@@ -87,6 +103,11 @@ class InviteCreate(BaseModel):
     inviteeEmail: EmailStr
 
 
+class BatchInviteCreate(BaseModel):
+    groupId: str
+    inviteeEmails: List[EmailStr] = Field(..., min_length=1, max_length=MAX_BATCH_INVITES)
+
+
 class InviteResponse(BaseModel):
     inviteID: str
     groupID: str
@@ -0,0 +1,152 @@
+"""
+Response serialization
+orjson or msgpack bodies negotiated per request, compressed when large,
+and a route class that hands untyped route results straight to them
+"""
+import asyncio
+import functools
+import gzip
+from decimal import Decimal
+from typing import Any, Callable, Optional
+import msgpack
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from .config import RESPONSE_COMPRESSION_MIN_BYTES
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+MSGPACK = "application/msgpack"
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 4  # fast; within a few percent of the top levels for JSON
+
+
+def _plain(value: Any) -> Any:
+    """Types the encoders don't handle natively (DynamoDB numbers and sets)"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """brotli if available and accepted, else gzip if accepted"""
+    offered = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        offered.add(name.strip().lower())
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+class FastResponse(Response):
+    """
+    JSON response rendered with orjson, or msgpack for clients that Accept it
+
+    The body is encoded when the response is sent, once the request's
+    Accept and Accept-Encoding headers are known. Bodies of at least
+    RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli or gzip.
+    Decimals from DynamoDB are sent as numbers.
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: Any = None, status_code: int = 200, headers=None, media_type=None, background=None):
+        self.data = content
+        self._encoded = False
+        super().__init__(None, status_code, headers, media_type, background)
+        del self.headers["content-length"]
+
+    def render(self, content: Any) -> bytes:
+        return b""
+
+    def _encode(self, request_headers: Headers):
+        accept = request_headers.get("accept", "")
+        if MSGPACK in accept:
+            body = msgpack.packb(self.data, default=_plain)
+            media_type = MSGPACK
+        else:
+            body = orjson.dumps(self.data, default=_plain, option=orjson.OPT_NON_STR_KEYS)
+            media_type = self.media_type
+
+        headers = MutableHeaders(raw=self.raw_headers)
+        headers["content-type"] = media_type
+        headers.add_vary_header("Accept")
+        if len(body) >= RESPONSE_COMPRESSION_MIN_BYTES:
+            encoding = _accepted_encoding(request_headers.get("accept-encoding", ""))
+            if encoding == "br":
+                body = brotli.compress(body, quality=_BROTLI_QUALITY)
+            elif encoding == "gzip":
+                body = gzip.compress(body, compresslevel=_GZIP_LEVEL)
+            if encoding:
+                headers["content-encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+        headers["content-length"] = str(len(body))
+        self.body = body
+
+    async def __call__(self, scope, receive, send):
+        has_body = self.status_code >= 200 and self.status_code not in (204, 304)
+        if has_body and not self._encoded:
+            self._encode(Headers(scope=scope))
+            self._encoded = True
+        await super().__call__(scope, receive, send)
+
+
+def _returns_response(endpoint: Callable, status_code: Optional[int]) -> Callable:
+    """Wrap an endpoint so a plain result comes back already as a FastResponse"""
+    def respond(result):
+        if isinstance(result, Response):
+            return result
+        return FastResponse(result, status_code=status_code or 200)
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return respond(await endpoint(*args, **kwargs))
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return respond(endpoint(*args, **kwargs))
+    return wrapper
+
+
+class FastRoute(APIRoute):
+    """
+    Route class sending untyped results without FastAPI's response encoding
+
+    Routes declared with response_model=dict (or no model and no return
+    annotation) only ever validate "is a dict", yet FastAPI still walks
+    every nested value with its generic encoder. Their results go straight
+    to FastResponse instead. Routes with a Pydantic response model keep
+    FastAPI's validation and filtering.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        model = kwargs.get("response_model")
+        untyped = model is dict or (
+            isinstance(model, DefaultPlaceholder)
+            and model.value is None
+            and "return" not in getattr(endpoint, "__annotations__", {})
+        )
+        if untyped:
+            endpoint = _returns_response(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
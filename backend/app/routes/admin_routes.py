@@ -0,0 +1,65 @@
+"""
+Admin routes
+Cross-group reports for platform administrators
+"""
+from fastapi import APIRouter, Depends
+from ..auth import require_admin
+from ..db.retry import retry_policy
+from ..responses import FastRoute
+from ..services import valuation
+from ..services.change_feed import change_feed
+from ..startup import report as startup_report
+
+router = APIRouter(prefix="/admin", tags=["Admin"], route_class=FastRoute)
+
+
+@router.get("/valuations", response_model=dict)
+def get_all_valuations(positions: bool = False, token: dict = Depends(require_admin)):
+    """
+    Value every group's portfolio at current prices
+    
+    - Positions for all groups are valued in one batch
+    - Set positions=true to include each group's holdings
+    - Admin only
+    """
+    reports = valuation.value_all_groups(include_positions=positions)
+    return {
+        "groups": reports,
+        "total_invested_value": sum(r["total_invested_value"] for r in reports),
+        "total_unrealized_pnl": sum(r["unrealized_pnl"] for r in reports),
+        "total_realized_pnl": sum(r["realized_pnl"] for r in reports),
+    }
+
+
+@router.get("/startup", response_model=dict)
+def get_startup_report(token: dict = Depends(require_admin)):
+    """
+    Module import and background warm-up times of this API process
+    
+    - Admin only
+    """
+    return startup_report()
+
+
+@router.get("/database", response_model=dict)
+def get_database_metrics(token: dict = Depends(require_admin)):
+    """
+    DynamoDB throttling and retry counters of this API process
+    
+    - Throttled calls by operation, retries and calls given up on
+    - Remaining retry budget
+    - Admin only
+    """
+    return retry_policy.metrics()
+
+
+@router.get("/change-feed", response_model=dict)
+def get_change_feed_status(token: dict = Depends(require_admin)):
+    """
+    State of this API process's change feed worker
+    
+    - Source (stream or local), groups waiting or being retried
+    - Groups projected, failures and stream records read
+    - Admin only
+    """
+    return change_feed.status()
@@ -5,15 +5,26 @@ Handles user signup and login
 import jwt
 import datetime
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from ..models import SignupRequest, LoginRequest, AuthResponse
 from ..config import JWT_SECRET, JWT_ALGORITHM
 from ..db import users
+from ..responses import FastRoute
+from ..services.password_hasher import password_hasher, HasherBusy
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=FastRoute)
 
 
+def _busy() -> HTTPException:
+    return HTTPException(503, "Too many sign-in requests, please try again shortly", headers={"Retry-After": "1"})
+
+
+# These routes are async so that waiting on the password hashing pool
+# doesn't hold one of the threadpool threads other routes run on; the
+# blocking database calls are sent to the threadpool explicitly.
+
 @router.post("/signup", response_model=AuthResponse)
-def signup(body: SignupRequest):
+async def signup(body: SignupRequest):
     """
     Register a new user
     
@@ -23,15 +34,20 @@ def signup(body: SignupRequest):
     """
     try:
         # Check if email already exists
-        existing_user = users.get_user_by_email(body.email)
+        existing_user = await run_in_threadpool(users.get_user_by_email, body.email)
         if existing_user:
             raise HTTPException(409, "Email already registered")
         
         # Create user
-        user = users.create_user(
+        try:
+            password_hash = await password_hasher.hash(body.password)
+        except HasherBusy:
+            raise _busy()
+        user = await run_in_threadpool(
+            users.create_user,
             username=body.username,
             email=body.email,
-            password=body.password
+            password_hash=password_hash
         )
         
         # Generate JWT token
@@ -79,22 +95,29 @@ def signup(body: SignupRequest):
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(body: LoginRequest):
+async def login(body: LoginRequest):
     """
     Login existing user
     
     - Validates email and password
+    - Upgrades legacy password hashes
     - Returns JWT token
     """
     try:
         # Get user by email
-        user = users.get_user_by_email(body.email)
+        user = await run_in_threadpool(users.get_user_by_email, body.email)
         if not user:
             raise HTTPException(401, "Invalid credentials")
         
         # Verify password
-        if not users.verify_password(user["passwordHash"], body.password):
+        try:
+            matches, new_hash = await password_hasher.verify(user["passwordHash"], body.password)
+        except HasherBusy:
+            raise _busy()
+        if not matches:
             raise HTTPException(401, "Invalid credentials")
+        if new_hash:
+            await run_in_threadpool(users.update_password_hash, user["userID"], user["passwordHash"], new_hash)
         
         # Generate JWT token
         token = jwt.encode(
@@ -2,14 +2,34 @@
 Group/Ranch routes
 Handles group creation, membership, and management
 """
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict
-from ..models import GroupCreate, GroupResponse, AddMemberRequest
-from ..auth import verify_token
-from ..db import groups, users, transactions
-from ..services.alpaca_service import alpaca_service
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Optional
+from botocore.exceptions import ClientError
+from ..models import GroupCreate, GroupResponse, AddMemberRequest, SavingsGoalRequest
+from ..auth import verify_token, decode_token, require_deleting_owner, require_member, require_owner
+from ..db import groups, ledger, users, transactions
+from ..db.retry import is_conditional_failure
+from ..fields import pick, select_fields
+from ..responses import FastRoute
+from ..services import group_deletion, group_ledger, nav_snapshots, savings_forecast, valuation
+from ..services.event_broker import event_broker, group_channel, publish_group_event
 
-router = APIRouter(prefix="/groups", tags=["Groups"])
+router = APIRouter(prefix="/groups", tags=["Groups"], route_class=FastRoute)
+
+# Group attributes clients may select with ?fields=
+GROUP_FIELDS = [
+    "groupID", "name", "status", "createdBy", "createdAt", "members", "memberCount",
+    "balance", "investedAmount", "holdings", "costBasis", "memberDeposits", "savingsGoal",
+]
+# Fields computed by the detail route, and the attributes each is built from
+GROUP_DETAIL_FIELDS = {
+    "memberDetails": ["members"],
+    "totalAssets": ["balance", "investedAmount"],
+}
 
 
 @router.post("", response_model=dict)
@@ -22,10 +42,10 @@ def create_group(body: GroupCreate, token: dict = Depends(verify_token)):
     """
     user_id = token["sub"]
     
-    # Create group
+    # Create group; the change feed derives the rest from group.created,
+    # but the creator's own groups list is written right away (the add is
+    # idempotent) so their next GET /groups already lists it
     group = groups.create_group(owner_id=user_id, name=body.name)
-    
-    # Add group to user's groups list
     users.add_group_to_user(user_id, group["groupID"])
     
     return {
@@ -39,9 +59,16 @@ def create_group(body: GroupCreate, token: dict = Depends(verify_token)):
 
 
 @router.get("", response_model=dict)
-def get_user_groups(token: dict = Depends(verify_token)):
+def get_user_groups(
+    fields: Optional[List[str]] = Depends(select_fields(GROUP_FIELDS)),
+    token: dict = Depends(verify_token)
+):
     """
     Get all groups the current user belongs to
+    
+    - Groups are read in batches
+    - Set fields (e.g. fields=name,balance) to read and return only those
+      attributes; groupID is always included
     """
     user_id = token["sub"]
     
@@ -49,153 +76,179 @@ def get_user_groups(token: dict = Depends(verify_token)):
     user_group_ids = users.get_user_groups(user_id)
     
     # Fetch group details
-    group_details = []
-    for group_id in user_group_ids:
-        group = groups.get_group(group_id)
-        if group:
-            group_details.append(group)
-    
-    return {"groups": group_details}
+    return {"groups": groups.get_groups(user_group_ids, fields)}
 
 
 @router.get("/{group_id}", response_model=dict)
-def get_group_details(group_id: str, token: dict = Depends(verify_token)):
+def get_group_details(
+    group_id: str,
+    fields: Optional[List[str]] = Depends(select_fields([*GROUP_FIELDS, *GROUP_DETAIL_FIELDS])),
+    token: dict = Depends(require_member)
+):
     """
     Get details of a specific group
     
     - Must be a member to view
     - Includes member details (username, email)
+    - Set fields to read and return only those attributes; member details
+      are only looked up when memberDetails is selected
     """
-    user_id = token["sub"]
+    read = None
+    if fields is not None:
+        read = list(dict.fromkeys(
+            attr for f in fields for attr in GROUP_DETAIL_FIELDS.get(f, [f])
+        ))
     
     # Get group
-    group = groups.get_group(group_id)
+    group = groups.get_group(group_id, read)
     if not group:
         raise HTTPException(404, "Group not found")
     
-    # Check membership
-    if not groups.is_member(group_id, user_id):
-        raise HTTPException(403, "You are not a member of this group")
+    group_with_members = dict(group)
     
     # Fetch member details
-    member_details = []
-    for member_id in group.get("members", []):
-        member = users.get_user_by_id(member_id)
-        if member:
-            member_details.append({
-                "userId": member.get("userID"),
-                "username": member.get("username"),
-                "email": member.get("email"),
-                "role": member.get("role", "member")
-            })
-    
-    # Add member details to group response
-    group_with_members = dict(group)
-    group_with_members["memberDetails"] = member_details
+    if fields is None or "memberDetails" in fields:
+        member_details = []
+        for member_id in group.get("members", []):
+            member = users.get_user_by_id(member_id, ["username", "email", "role"])
+            if member:
+                member_details.append({
+                    "userId": member.get("userID"),
+                    "username": member.get("username"),
+                    "email": member.get("email"),
+                    "role": member.get("role", "member")
+                })
+        group_with_members["memberDetails"] = member_details
     
     # Ensure investedAmount exists (for backwards compatibility with old groups)
-    if "investedAmount" not in group_with_members:
+    if "investedAmount" not in group_with_members and (read is None or "investedAmount" in read):
         group_with_members["investedAmount"] = 0
     
     # Add total assets calculation
-    liquid_balance = float(group_with_members.get("balance", 0))
-    invested = float(group_with_members.get("investedAmount", 0))
-    group_with_members["totalAssets"] = liquid_balance + invested
+    if fields is None or "totalAssets" in fields:
+        liquid_balance = float(group_with_members.get("balance", 0))
+        invested = float(group_with_members.get("investedAmount", 0))
+        group_with_members["totalAssets"] = liquid_balance + invested
     
-    return {"group": group_with_members}
+    return {"group": pick(group_with_members, fields, always=["groupID"])}
 
 
 @router.get("/{group_id}/holdings", response_model=dict)
-def get_group_holdings(group_id: str, token: dict = Depends(verify_token)):
+def get_group_holdings(group_id: str, token: dict = Depends(require_member)):
     """
     Get detailed stock holdings breakdown for a group
     
-    - Returns individual stock holdings with current values
-    - Calculates percentages of total portfolio
+    - Returns individual stock holdings with current values and cost basis
+    - Calculates percentages of total portfolio and unrealized/realized P&L
     - Must be a member to view
     """
-    user_id = token["sub"]
+    group = groups.get_group(group_id) or {"groupID": group_id}
     
-    # Check membership
-    if not groups.is_member(group_id, user_id):
-        raise HTTPException(403, "You are not a member of this group")
-    
-    # Get all executed transactions for this group
-    all_transactions = transactions.get_group_transactions(group_id)
-    executed_txns = [t for t in all_transactions if t.get("status") == "executed"]
-    
-    # Build holdings dictionary: {symbol: {quantity, total_cost}}
-    holdings: Dict[str, Dict] = {}
-    
-    for txn in executed_txns:
-        metadata = txn.get("metadata", {})
-        if metadata.get("stock_symbol"):
-            symbol = metadata["stock_symbol"]
-            quantity = float(metadata.get("quantity", 0))
-            
-            if symbol not in holdings:
-                holdings[symbol] = {"quantity": 0, "name": metadata.get("stock_name", symbol)}
-            
-            holdings[symbol]["quantity"] += quantity
-    
-    # Get current prices and calculate values
-    holdings_list = []
-    total_value = 0
-    
-    for symbol, data in holdings.items():
-        if data["quantity"] > 0:  # Only include positions we still hold
-            stock_info = alpaca_service.get_stock_info(symbol)
-            if stock_info:
-                current_price = stock_info["price"]
-                current_value = data["quantity"] * current_price
-                total_value += current_value
-                
-                holdings_list.append({
-                    "symbol": symbol,
-                    "name": data["name"],
-                    "quantity": data["quantity"],
-                    "current_price": current_price,
-                    "current_value": current_value,
-                })
+    report = valuation.value_group(group)
+    del report["groupID"]
+    return report
+
+
+@router.get("/{group_id}/performance", response_model=dict)
+def get_group_performance(
+    group_id: str,
+    range_name: str = Query("1M", alias="range"),
+    token: dict = Depends(require_member)
+):
+    """
+    Get the group's value over time for performance charts
     
-    # Calculate percentages
-    for holding in holdings_list:
-        holding["percentage"] = (holding["current_value"] / total_value * 100) if total_value > 0 else 0
+    - range: 1W, 1M, 3M, 6M, 1Y or ALL
+    - Served from daily NAV snapshots, downsampled for long ranges
+    - Must be a member to view
+    """
+    if range_name not in nav_snapshots.RANGES:
+        raise HTTPException(400, f"range must be one of {', '.join(nav_snapshots.RANGES)}")
     
-    # Sort by value descending
-    holdings_list.sort(key=lambda x: x["current_value"], reverse=True)
+    return nav_snapshots.get_performance(group_id, range_name)
+
+
+@router.put("/{group_id}/goal", response_model=dict)
+def set_savings_goal(group_id: str, body: SavingsGoalRequest, token: dict = Depends(require_owner)):
+    """
+    Set the group's savings goal
     
-    # Get group info for liquid balance
+    - amount: total deposits the group is saving towards
+    - targetDate: optional date to reach it by
+    - Only the owner can set the goal
+    """
+    target_date = body.targetDate.isoformat() if body.targetDate else None
+    groups.set_savings_goal(group_id, body.amount, target_date)
+    return {
+        "message": "Savings goal updated",
+        "savingsGoal": {"amount": body.amount, "targetDate": target_date}
+    }
+
+
+@router.get("/{group_id}/forecast", response_model=dict)
+def get_savings_forecast(group_id: str, token: dict = Depends(require_member)):
+    """
+    Forecast when the group will reach its savings goal
+    
+    - Based on the trend of the group's deposits so far
+    - Must be a member to view
+    """
     group = groups.get_group(group_id)
-    liquid_balance = float(group.get("balance", 0)) if group else 0
+    if not group:
+        raise HTTPException(404, "Group not found")
+    if not group.get("savingsGoal"):
+        raise HTTPException(404, "This group has no savings goal")
     
+    return savings_forecast.forecast(group)
+
+
+@router.get("/{group_id}/ledger", response_model=dict)
+def get_group_ledger(
+    group_id: str,
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    token: dict = Depends(require_member)
+):
+    """
+    Get the group's ledger: every deposit, proposal, vote, execution,
+    fill and membership change, in order
+    
+    - after: only events with a higher sequence number (for paging)
+    - limit: at most this many events
+    - Must be a member to view
+    """
+    events = list(ledger.read_events(group_id, after=after, limit=limit))
     return {
-        "holdings": holdings_list,
-        "total_invested_value": total_value,
-        "liquid_balance": liquid_balance,
-        "total_assets": total_value + liquid_balance
+        "events": events,
+        "next": int(events[-1]["seq"]) if len(events) == limit else None
     }
 
 
+@router.get("/{group_id}/ledger/state", response_model=dict)
+def get_group_ledger_state(group_id: str, token: dict = Depends(require_member)):
+    """
+    Get the group's state rebuilt from its ledger
+    
+    - Latest snapshot plus the events after it
+    - seq is the last event included
+    - Must be a member to view
+    """
+    return group_ledger.current_state(group_id)
+
+
 @router.get("/{group_id}/members", response_model=dict)
-def get_group_members(group_id: str, token: dict = Depends(verify_token)):
+def get_group_members(group_id: str, token: dict = Depends(require_member)):
     """
     Get list of members in a group with their details
     
     - Must be a member to view
     - Returns member usernames, emails, and roles
     """
-    user_id = token["sub"]
-    
     # Get group
     group = groups.get_group(group_id)
     if not group:
         raise HTTPException(404, "Group not found")
     
-    # Check membership
-    if not groups.is_member(group_id, user_id):
-        raise HTTPException(403, "You are not a member of this group")
-    
     # Fetch member details
     member_details = []
     for member_id in group.get("members", []):
@@ -223,7 +276,7 @@ def get_group_members(group_id: str, token: dict = Depends(verify_token)):
 def add_member(
     group_id: str, 
     body: AddMemberRequest, 
-    token: dict = Depends(verify_token)
+    token: dict = Depends(require_member)
 ):
     """
     Add a member to the group
@@ -231,18 +284,8 @@ def add_member(
     - Must be an existing member to invite
     - User being added must exist
     """
-    user_id = token["sub"]
     new_member_id = body.userId
     
-    # Get group
-    group = groups.get_group(group_id)
-    if not group:
-        raise HTTPException(404, "Group not found")
-    
-    # Check if current user is a member
-    if not groups.is_member(group_id, user_id):
-        raise HTTPException(403, "You are not a member of this group")
-    
     # Check if new user exists
     new_user = users.get_user_by_id(new_member_id)
     if not new_user:
@@ -252,8 +295,14 @@ def add_member(
     if groups.is_member(group_id, new_member_id):
         raise HTTPException(409, "User is already a member")
     
-    # Add member to group (this also adds the group to the user's groups list)
-    groups.add_member(group_id, new_member_id)
+    # Add member to group (the user's groups list follows from member.joined)
+    if not groups.add_member(group_id, new_member_id):
+        membership = groups.get_membership(group_id)
+        if membership and membership.deleting:
+            raise HTTPException(409, "Group is being deleted")
+        raise HTTPException(500, "Failed to add member to group")
+    
+    publish_group_event(group_id, "group.member_added", {"userId": new_member_id})
     
     return {"message": "Member added successfully"}
 
@@ -272,72 +321,83 @@ def remove_member(
     """
     user_id = token["sub"]
     
-    # Get group
-    group = groups.get_group(group_id)
-    if not group:
+    # Get group membership
+    membership = groups.get_membership(group_id)
+    if not membership:
         raise HTTPException(404, "Group not found")
     
     # Check permissions
-    is_owner = groups.is_owner(group_id, user_id)
+    is_owner = membership.owner == user_id
     is_self_remove = user_id == user_id_to_remove
     
     if not is_owner and not is_self_remove:
         raise HTTPException(403, "Only the owner can remove other members")
     
     # Can't remove the owner
-    if user_id_to_remove == group["createdBy"]:
+    if user_id_to_remove == membership.owner:
         raise HTTPException(400, "Cannot remove the group owner")
     
     # Check if user is actually a member
-    if not groups.is_member(group_id, user_id_to_remove):
+    if user_id_to_remove not in membership.members:
         raise HTTPException(404, "User is not a member of this group")
     
-    # Remove member from group
-    groups.remove_member(group_id, user_id_to_remove)
+    # Remove member from group (the user's groups list follows from member.left)
+    if not groups.remove_member(group_id, user_id_to_remove):
+        raise HTTPException(500, "Failed to remove member from group")
     
-    # Remove group from user's groups list
-    users.remove_group_from_user(user_id_to_remove, group_id)
+    publish_group_event(group_id, "group.member_removed", {"userId": user_id_to_remove})
     
     return {"message": "Member removed successfully"}
 
 
-@router.delete("/{group_id}", response_model=dict)
+@router.delete("/{group_id}", response_model=dict, status_code=202)
 def delete_group(
     group_id: str,
-    token: dict = Depends(verify_token)
+    token: dict = Depends(require_deleting_owner)
 ):
     """
     Delete a group (owner only)
     
     - Only the owner can delete the group
-    - Removes the group from all members' group lists
+    - The group is marked as deleting and the request returns at once;
+      members, transactions, invites and snapshots are removed in the
+      background (see GET /groups/{group_id}/deletion)
+    - Deleting a group that is already being deleted resumes its cleanup
     """
-    user_id = token["sub"]
+    started = groups.mark_deleting(group_id, group_deletion.new_progress())
+    group_deletion.group_deletion.enqueue(group_id)
+    if started:
+        publish_group_event(group_id, "group.deleting")
     
-    # Get group
-    group = groups.get_group(group_id)
+    return {
+        "message": "Group deletion started" if started else "Group deletion already in progress",
+        "status": "deleting"
+    }
+
+
+@router.get("/{group_id}/deletion", response_model=dict)
+def get_deletion_progress(group_id: str, token: dict = Depends(require_deleting_owner)):
+    """
+    Progress of a group's deletion (owner only)
+    
+    - Returns the current stage and counts of items removed so far
+    - 404 once the deletion has finished and the group is gone
+    """
+    group = groups.get_group(group_id, ["status", "deletion"])
     if not group:
         raise HTTPException(404, "Group not found")
-    
-    # Check if user is the owner
-    if not groups.is_owner(group_id, user_id):
-        raise HTTPException(403, "Only the owner can delete the group")
-    
-    # Remove group from all members
-    for member_id in group.get("members", []):
-        users.remove_group_from_user(member_id, group_id)
-    
-    # Delete the group
-    groups.delete_group(group_id)
-    
-    return {"message": "Group deleted successfully"}
+    return {
+        "status": group.get("status", "active"),
+        "stages": group_deletion.STAGES,
+        "deletion": group.get("deletion")
+    }
 
 
 @router.post("/{group_id}/deposit", response_model=dict)
 def deposit_to_group(
     group_id: str,
     body: dict,
-    token: dict = Depends(verify_token)
+    token: dict = Depends(require_member)
 ):
     """
     Deposit money into the group balance
@@ -353,25 +413,24 @@ def deposit_to_group(
     
     amount = float(body["amount"])
     
-    # Get group
-    group = groups.get_group(group_id)
-    if not group:
-        raise HTTPException(404, "Group not found")
-    
-    # Check membership
-    if not groups.is_member(group_id, user_id):
-        raise HTTPException(403, "You are not a member of this group")
-    
     # Check user has enough balance
     user_balance = users.get_user_balance(user_id)
     if user_balance < amount:
         raise HTTPException(400, f"Insufficient funds. Your balance is ${user_balance:.2f}")
     
-    # Deduct from user's balance
-    users.update_user_balance(user_id, -amount)
-    
-    # Add to group balance
-    groups.update_balance(group_id, amount)
+    # Move the money from the user's balance to the group's, recording the
+    # deposit, in one write (refused if the balance dropped meanwhile)
+    try:
+        deposit = transactions.record_deposit(group_id, user_id, amount)
+    except ClientError as ce:
+        if not is_conditional_failure(ce):
+            raise
+        raise HTTPException(400, f"Insufficient funds. Your balance is ${users.get_user_balance(user_id):.2f}")
+    try:
+        savings_forecast.record_deposit(group_id, amount, datetime.fromisoformat(deposit["createdAt"]))
+    except Exception as e:
+        # The forecast can be rebuilt from the deposit records; don't fail the deposit
+        print(f"❌ Failed to update savings stats for group {group_id}: {e}")
     
     # Get updated balances
     updated_group = groups.get_group(group_id)
@@ -381,6 +440,13 @@ def deposit_to_group(
     
     print(f"💰 User {user_id} deposited ${amount} to group {group_id}. New user balance: ${new_user_balance}")
     
+    publish_group_event(group_id, "group.deposit", {
+        "userId": user_id,
+        "amount": amount,
+        "balance": liquid_balance,
+        "investedAmount": invested
+    })
+    
     return {
         "message": "Deposit successful",
         "amount": amount,
@@ -389,3 +455,47 @@ def deposit_to_group(
         "totalAssets": liquid_balance + invested,
         "userBalance": new_user_balance
     }
+
+
+@router.websocket("/{group_id}/events")
+async def stream_group_events(websocket: WebSocket, group_id: str, token: Optional[str] = Query(None)):
+    """
+    Live event stream for a group
+    
+    Connect with ?token=<JWT> as a group member to receive proposals,
+    votes and tallies, status changes, deposits and membership changes.
+    A {"type": "resync"} event means events were dropped and the client
+    should refetch.
+    """
+    try:
+        user_id = decode_token(token or "")["sub"]
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    if not await run_in_threadpool(groups.is_member, group_id, user_id):
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    subscription = event_broker.subscribe(group_channel(group_id))
+    
+    async def forward_events():
+        while True:
+            event = await subscription.get()
+            await websocket.send_json(jsonable_encoder(event))
+            removed = event["type"] == "group.member_removed" and event["data"].get("userId") == user_id
+            if event["type"] == "group.deleted" or removed:
+                await websocket.close()
+                return
+    
+    forwarder = asyncio.create_task(forward_events())
+    try:
+        # Clients don't send anything; reading just notices the disconnect
+        while not forwarder.done():
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        forwarder.cancel()
+        event_broker.unsubscribe(subscription)
@@ -3,11 +3,13 @@ Invite routes for group invitations
 Endpoints for creating, accepting, declining, and managing invites
 """
 from fastapi import APIRouter, HTTPException, Depends
-from ..models import InviteCreate, InviteResponse
-from ..db import invites, groups, users
+from ..models import BatchInviteCreate, InviteCreate, InviteResponse
+from ..db import invites, groups
 from ..auth import verify_token
+from ..services.event_broker import publish_group_event
+from ..responses import FastRoute
 
-router = APIRouter(prefix="/invites", tags=["invites"])
+router = APIRouter(prefix="/invites", tags=["invites"], route_class=FastRoute)
 
 
 @router.post("", response_model=InviteResponse)
@@ -35,6 +37,36 @@ async def create_invite(invite_data: InviteCreate, current_user: dict = Depends(
     return InviteResponse(**invite)
 
 
+@router.post("/batch", response_model=dict)
+def create_invites(body: BatchInviteCreate, current_user: dict = Depends(verify_token)):
+    """
+    Invite many people to a group at once
+    
+    - Only group owners can send invites (checked once for the batch)
+    - Emails are de-duplicated; those with a pending invite to the group
+      are skipped
+    - Invites are written with batched writes
+    """
+    user_id = current_user["sub"]
+    
+    if not groups.is_owner(body.groupId, user_id):
+        raise HTTPException(status_code=403, detail="Only group owners can send invites")
+    
+    pending = {
+        inv["inviteeEmail"] for inv in invites.get_group_invites(body.groupId)
+        if inv.get("status") == "pending"
+    }
+    emails = list(dict.fromkeys(email.lower() for email in body.inviteeEmails))
+    skipped = [email for email in emails if email in pending]
+    created = invites.create_invites(body.groupId, user_id, [e for e in emails if e not in pending])
+    
+    return {
+        "invites": [InviteResponse(**inv).model_dump() for inv in created],
+        "skipped": skipped,
+        "count": len(created)
+    }
+
+
 @router.get("", response_model=list[InviteResponse])
 async def get_my_invites(current_user: dict = Depends(verify_token)):
     """
@@ -86,17 +118,19 @@ async def accept_invite(invite_id: str, current_user: dict = Depends(verify_toke
     if invite["status"] != "pending":
         raise HTTPException(status_code=400, detail=f"Invite already {invite['status']}")
     
-    # Add user to group members list
+    # Add user to group members list (the user's groups list follows from member.joined)
     success = groups.add_member(invite["groupID"], user_id)
     if not success:
+        membership = groups.get_membership(invite["groupID"])
+        if membership and membership.deleting:
+            raise HTTPException(status_code=409, detail="Group is being deleted")
         raise HTTPException(status_code=500, detail="Failed to add member to group")
     
-    # Add group to user's groups list
-    users.add_group_to_user(user_id, invite["groupID"])
-    
     # Update invite status
     invites.update_invite_status(invite_id, "accepted")
     
+    publish_group_event(invite["groupID"], "group.member_added", {"userId": user_id})
+    
     return {
         "message": "Invite accepted successfully",
         "groupId": invite["groupID"]
@@ -2,15 +2,24 @@
 Stock Trading Routes
 Handles stock listing, quotes, and trade execution
 """
+from datetime import date, timedelta
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
+from app.auth import check_member, decode_token
 from app.routes.user_routes import get_current_user
-from app.services.alpaca_service import alpaca_service
+from app.services.alpaca_service import alpaca_service, TIMEFRAMES
+from app.services.bar_cache import bars_to_dicts
+from app.services.market_data_hub import market_data_hub
+from app.services.quote_stream import quote_stream
+from app.services.symbol_catalog import symbol_catalog
 from app.db import transactions as txn_db
+from app.responses import FastRoute
+from app.services.event_broker import publish_group_event
 
-router = APIRouter(prefix="/stocks", tags=["stocks"])
+router = APIRouter(prefix="/stocks", tags=["stocks"], route_class=FastRoute)
 
 
 class StockQuoteResponse(BaseModel):
@@ -26,6 +35,11 @@ class StockListResponse(BaseModel):
     stocks: List[Dict[str, str]]
 
 
+class SymbolSearchResult(BaseModel):
+    symbol: str
+    name: str
+
+
 class TradeRequest(BaseModel):
     symbol: str
     quantity: float = Field(gt=0)
@@ -46,70 +60,121 @@ async def get_stock_lists(current_user: dict = Depends(get_current_user)):
     return alpaca_service.get_stock_lists()
 
 
+@router.get("/search", response_model=List[SymbolSearchResult])
+async def search_stocks(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search the symbol catalog by ticker or company name"""
+    return symbol_catalog.search(q, limit)
+
+
 @router.get("/quote/{symbol}")
 async def get_stock_quote(
     symbol: str,
     current_user: dict = Depends(get_current_user)
 ) -> StockQuoteResponse:
     """Get current quote for a stock symbol"""
+    if symbol not in symbol_catalog:
+        raise HTTPException(status_code=404, detail=f"Stock {symbol} not found")
     
-    # Get stock info
-    stock_info = alpaca_service.get_stock_info(symbol)
+    # Get stock info from the in-memory market snapshot (a symbol not
+    # tracked yet is fetched, so keep that off the event loop)
+    stock_info = await run_in_threadpool(market_data_hub.get_quote, symbol)
     
     if not stock_info:
         raise HTTPException(status_code=404, detail=f"Stock {symbol} not found")
     
-    # Find stock name from our lists
-    all_stocks = alpaca_service.get_stock_lists()
-    stock_name = symbol
-    
-    for category, stocks in all_stocks.items():
-        for stock in stocks:
-            if stock["symbol"] == symbol:
-                stock_name = stock["name"]
-                break
-    
     return StockQuoteResponse(
         symbol=symbol,
-        name=stock_name,
+        name=symbol_catalog.name(symbol),
         price=stock_info["price"],
         change=stock_info["change"],
         change_percent=stock_info["change_percent"],
     )
 
 
+@router.websocket("/stream")
+async def stream_quotes(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Live quote stream
+    
+    Connect with ?token=<JWT>, then send
+    {"action": "subscribe", "symbols": ["AAPL", ...]} to receive quote
+    updates for those symbols as their prices change
+    """
+    try:
+        decode_token(token or "")
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    await quote_stream.serve(websocket)
+
+
+@router.get("/{symbol}/bars")
+def get_stock_bars(
+    symbol: str,
+    timeframe: str = Query("1Day"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get historical OHLCV bars for charts
+    
+    - Defaults to the last year of daily bars
+    - Served from the local bar cache; only uncached ranges are fetched
+    - Only symbols in the catalog
+    """
+    if symbol not in symbol_catalog:
+        raise HTTPException(status_code=404, detail=f"Stock {symbol} not found")
+    if timeframe not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"Timeframe must be one of {', '.join(TIMEFRAMES)}")
+    
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    
+    try:
+        bars = alpaca_service.get_bars(symbol.upper(), timeframe, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "symbol": symbol.upper(),
+        "timeframe": timeframe,
+        "bars": bars_to_dicts(bars),
+    }
+
+
 @router.post("/quotes")
 async def get_multiple_quotes(
     symbols: List[str],
     current_user: dict = Depends(get_current_user)
 ) -> List[StockQuoteResponse]:
-    """Get quotes for multiple symbols at once"""
-    
-    all_stocks = alpaca_service.get_stock_lists()
-    stock_names = {}
+    """Get quotes for multiple symbols at once (symbols not in the catalog are skipped)"""
+    symbols = [s for s in symbols if s in symbol_catalog]
     
-    # Build name lookup
-    for category, stocks in all_stocks.items():
-        for stock in stocks:
-            stock_names[stock["symbol"]] = stock["name"]
-    
-    # Get prices
-    prices = alpaca_service.get_multiple_prices(symbols)
+    # Get quotes from the in-memory market snapshot
+    quotes = await run_in_threadpool(market_data_hub.get_quotes, symbols) if symbols else {}
     
     results = []
     for symbol in symbols:
-        if symbol in prices:
-            stock_info = alpaca_service.get_stock_info(symbol)
-            if stock_info:
-                results.append(
-                    StockQuoteResponse(
-                        symbol=symbol,
-                        name=stock_names.get(symbol, symbol),
-                        price=stock_info["price"],
-                        change=stock_info["change"],
-                        change_percent=stock_info["change_percent"],
-                    )
+        stock_info = quotes.get(symbol)
+        if stock_info:
+            results.append(
+                StockQuoteResponse(
+                    symbol=symbol,
+                    name=symbol_catalog.name(symbol),
+                    price=stock_info["price"],
+                    change=stock_info["change"],
+                    change_percent=stock_info["change_percent"],
                 )
+            )
     
     return results
 
@@ -122,10 +187,17 @@ async def create_trade_proposal(
     """
     Create a trade proposal (investment transaction)
     This will create a pending transaction that needs group approval
+    
+    - Must be a member of the group
+    - Only symbols in the catalog
     """
+    await run_in_threadpool(check_member, trade.group_id, current_user["userId"])
+    if trade.symbol not in symbol_catalog:
+        raise HTTPException(status_code=404, detail=f"Stock {trade.symbol} not found")
     
     # Get current stock price
-    price = alpaca_service.get_current_price(trade.symbol)
+    quote = await run_in_threadpool(market_data_hub.get_quote, trade.symbol)
+    price = quote["price"] if quote else None
     
     if not price:
         raise HTTPException(
@@ -137,14 +209,7 @@ async def create_trade_proposal(
     total_cost = price * trade.quantity
     
     # Find stock name
-    all_stocks = alpaca_service.get_stock_lists()
-    stock_name = trade.symbol
-    
-    for category, stocks in all_stocks.items():
-        for stock in stocks:
-            if stock["symbol"] == trade.symbol:
-                stock_name = stock["name"]
-                break
+    stock_name = symbol_catalog.name(trade.symbol)
     
     # Create description
     description = trade.description or f"Buy {trade.quantity} shares of {stock_name} ({trade.symbol}) @ ${price:.2f}"
@@ -174,6 +239,16 @@ async def create_trade_proposal(
             detail="Failed to create trade proposal"
         )
     
+    publish_group_event(trade.group_id, "transaction.proposed", {
+        "transactionId": transaction["transactionID"],
+        "amount": float(total_cost),
+        "description": description,
+        "transactionType": "investment",
+        "proposedBy": current_user["userId"],
+        "status": "pending",
+        "metadata": transaction["metadata"]
+    })
+    
     return TradeResponse(
         success=True,
         message=f"Trade proposal created: {description}",
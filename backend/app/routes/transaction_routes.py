@@ -3,11 +3,25 @@ Transaction routes
 Handles transaction proposals and voting
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from ..models import TransactionCreate, TransactionVote, VoteResponse
+from typing import List, Optional
+from botocore.exceptions import ClientError
+from ..config import MAX_BATCH_GET
+from ..models import BatchVoteRequest, TransactionCreate, TransactionVote, VoteResponse
 from ..auth import verify_token
 from ..db import transactions, groups, users
+from ..db.retry import is_throttled
+from ..fields import pick, select_fields
+from ..responses import FastRoute
+from ..services.event_broker import publish_group_event
+from ..services.order_queue import order_queue
 
-router = APIRouter(prefix="/transactions", tags=["Transactions"])
+router = APIRouter(prefix="/transactions", tags=["Transactions"], route_class=FastRoute)
+
+# Transaction attributes clients may select with ?fields=
+TRANSACTION_FIELDS = [
+    "transactionID", "groupID", "proposedBy", "amount", "description", "transactionType", "status",
+    "createdAt", "executedAt", "votes", "orderStatus", "metadata",
+]
 
 
 @router.post("", response_model=dict)
@@ -20,13 +34,13 @@ def propose_transaction(body: TransactionCreate, token: dict = Depends(verify_to
     """
     user_id = token["sub"]
     
-    # Get group
-    group = groups.get_group(body.groupId)
-    if not group:
+    # Get group membership
+    membership = groups.get_membership(body.groupId)
+    if not membership:
         raise HTTPException(404, "Group not found")
     
     # Check membership
-    if not groups.is_member(body.groupId, user_id):
+    if user_id not in membership.members:
         raise HTTPException(403, "You are not a member of this group")
     
     # Create transaction
@@ -38,6 +52,15 @@ def propose_transaction(body: TransactionCreate, token: dict = Depends(verify_to
         transaction_type=body.transactionType
     )
     
+    publish_group_event(body.groupId, "transaction.proposed", {
+        "transactionId": transaction["transactionID"],
+        "amount": body.amount,
+        "description": body.description,
+        "transactionType": body.transactionType,
+        "proposedBy": user_id,
+        "status": "pending"
+    })
+    
     return {
         "transactionId": transaction["transactionID"],
         "message": "Transaction proposed successfully",
@@ -46,40 +69,85 @@ def propose_transaction(body: TransactionCreate, token: dict = Depends(verify_to
 
 
 @router.get("", response_model=dict)
-def get_transactions(groupId: str = Query(...), token: dict = Depends(verify_token)):
+def get_transactions(
+    groupId: str = Query(...),
+    fields: Optional[List[str]] = Depends(select_fields(TRANSACTION_FIELDS)),
+    token: dict = Depends(verify_token)
+):
     """
     Get all transactions for a group
     
     - Must be a member of the group
+    - Set fields (e.g. fields=description,amount,status) to read and return
+      only those attributes; transactionID is always included
     """
     user_id = token["sub"]
     
-    # Get group
-    group = groups.get_group(groupId)
-    if not group:
+    # Get group membership
+    membership = groups.get_membership(groupId)
+    if not membership:
         raise HTTPException(404, "Group not found")
     
     # Check membership
-    if not groups.is_member(groupId, user_id):
+    if user_id not in membership.members:
         raise HTTPException(403, "You are not a member of this group")
     
     # Get transactions
-    group_transactions = transactions.get_group_transactions(groupId)
+    group_transactions = transactions.get_group_transactions(groupId, fields)
     
     return {"transactions": group_transactions}
 
 
+@router.get("/batch", response_model=dict)
+def get_transactions_by_id(
+    ids: str = Query(..., description="Comma-separated transaction IDs"),
+    fields: Optional[List[str]] = Depends(select_fields(TRANSACTION_FIELDS)),
+    token: dict = Depends(verify_token)
+):
+    """
+    Get many transactions by ID in one request
+    
+    - Transactions are read with batched reads
+    - Only transactions in the user's groups are returned; the rest are
+      listed in notFound
+    - Set fields to read and return only those attributes
+    """
+    user_id = token["sub"]
+    transaction_ids = list(dict.fromkeys(t.strip() for t in ids.split(",") if t.strip()))
+    if not transaction_ids or len(transaction_ids) > MAX_BATCH_GET:
+        raise HTTPException(400, f"Give between 1 and {MAX_BATCH_GET} transaction IDs")
+    
+    read = list(dict.fromkeys(["groupID", *fields])) if fields else None
+    visible = []
+    for transaction in transactions.get_transactions(transaction_ids, read):
+        membership = groups.get_membership(transaction["groupID"])
+        if membership and user_id in membership.members:
+            visible.append(pick(transaction, fields, always=["transactionID"]))
+    
+    returned = {t["transactionID"] for t in visible}
+    return {
+        "transactions": visible,
+        "notFound": [t for t in transaction_ids if t not in returned]
+    }
+
+
 @router.get("/{transaction_id}", response_model=dict)
-def get_transaction_details(transaction_id: str, token: dict = Depends(verify_token)):
+def get_transaction_details(
+    transaction_id: str,
+    fields: Optional[List[str]] = Depends(select_fields(TRANSACTION_FIELDS)),
+    token: dict = Depends(verify_token)
+):
     """
     Get details of a specific transaction
     
     - Must be a member of the group
+    - Set fields to read and return only those attributes
     """
     user_id = token["sub"]
     
-    # Get transaction
-    transaction = transactions.get_transaction(transaction_id)
+    # Get transaction (groupID is needed for the membership check)
+    read = list(dict.fromkeys(["groupID", *fields])) if fields else None
+    transaction = transactions.get_transaction(transaction_id, read)
     if not transaction:
         raise HTTPException(404, "Transaction not found")
     
@@ -87,7 +155,116 @@ def get_transaction_details(transaction_id: str, token: dict = Depends(verify_to
     if not groups.is_member(transaction["groupID"], user_id):
         raise HTTPException(403, "You are not a member of this group")
     
-    return {"transaction": transaction}
+    return {"transaction": pick(transaction, fields, always=["transactionID"])}
+
+
+def _settle_vote(transaction: dict, votes: dict, user_id: str, vote: str) -> dict:
+    """
+    Update a transaction's status after a vote and publish the vote events
+    
+    - Approved once a majority approves, rejected once a majority rejects
+    - The majority is of the member list read consistently, not of the
+      cached one used to authorize the vote, which other processes don't
+      invalidate
+    
+    Returns:
+        dict: status, votes, approveCount, rejectCount and totalMembers
+    """
+    transaction_id = transaction["transactionID"]
+    group_id = transaction["groupID"]
+    
+    # Count votes
+    approve_count = sum(1 for v in votes.values() if v == "approve")
+    reject_count = sum(1 for v in votes.values() if v == "reject")
+    total_members = len(groups.get_current_members(group_id))
+    
+    # Check if voting is complete
+    new_status = transaction["status"]
+    threshold = total_members / 2
+    
+    if approve_count > threshold:
+        new_status = "approved"
+    elif reject_count > threshold:
+        new_status = "rejected"
+    # Only the vote that settles a pending transaction records the outcome
+    settled = new_status != transaction["status"] and transactions.set_vote_outcome(transaction_id, group_id, new_status)
+    
+    publish_group_event(group_id, "transaction.voted", {
+        "transactionId": transaction_id,
+        "userId": user_id,
+        "vote": vote,
+        "approveCount": approve_count,
+        "rejectCount": reject_count,
+        "totalMembers": total_members,
+        "status": new_status
+    })
+    if settled:
+        publish_group_event(group_id, "transaction.status", {
+            "transactionId": transaction_id,
+            "status": new_status
+        })
+    
+    return {
+        "status": new_status,
+        "votes": votes,
+        "approveCount": approve_count,
+        "rejectCount": reject_count,
+        "totalMembers": total_members
+    }
+
+
+@router.post("/votes", response_model=dict)
+def vote_on_transactions(body: BatchVoteRequest, token: dict = Depends(verify_token)):
+    """
+    Vote on many transactions in one request
+    
+    - Transactions are read with batched reads
+    - Each vote is checked and recorded on its own, with the same rules as
+      the single vote endpoint
+    - Returns one result per vote, in request order
+    """
+    user_id = token["sub"]
+    
+    found = {
+        t["transactionID"]: t
+        for t in transactions.get_transactions([v.transactionId for v in body.votes], ["groupID", "status"])
+    }
+    memberships = {}
+    results = []
+    for item in body.votes:
+        result = {"transactionId": item.transactionId, "ok": False}
+        results.append(result)
+        transaction = found.get(item.transactionId)
+        if not transaction:
+            result["error"] = "Transaction not found"
+            continue
+        group_id = transaction["groupID"]
+        if group_id not in memberships:
+            memberships[group_id] = groups.get_membership(group_id)
+        membership = memberships[group_id]
+        if not membership:
+            result["error"] = "Group not found"
+            continue
+        if user_id not in membership.members:
+            result["error"] = "You are not a member of this group"
+            continue
+        
+        try:
+            votes = transactions.cast_vote(item.transactionId, group_id, user_id, item.vote)
+            if votes is None:
+                result["error"] = "You have already voted on this transaction"
+                continue
+            settled = _settle_vote(transaction, votes, user_id, item.vote)
+        except ClientError as ce:
+            if not is_throttled(ce):
+                raise
+            result["error"] = "Service is busy, try again shortly"
+            continue
+        # Later votes in the batch see this one's outcome
+        transaction["status"] = settled["status"]
+        result.update(ok=True, **settled)
+    
+    return {"results": results, "recorded": sum(1 for r in results if r["ok"])}
 
 
 @router.post("/{transaction_id}/vote", response_model=VoteResponse)
@@ -107,51 +284,27 @@ def vote_on_transaction(
     user_id = token["sub"]
     
     # Get transaction
-    transaction = transactions.get_transaction(transaction_id)
+    transaction = transactions.get_transaction(transaction_id, ["groupID", "status"])
     if not transaction:
         raise HTTPException(404, "Transaction not found")
     
     group_id = transaction["groupID"]
     
-    # Get group
-    group = groups.get_group(group_id)
-    if not group:
+    # Get group membership
+    membership = groups.get_membership(group_id)
+    if not membership:
         raise HTTPException(404, "Group not found")
     
     # Check membership
-    if not groups.is_member(group_id, user_id):
+    if user_id not in membership.members:
         raise HTTPException(403, "You are not a member of this group")
     
-    # Check if already voted
-    if transactions.has_user_voted(transaction_id, user_id):
+    # Record vote (refused if the user already voted)
+    votes = transactions.cast_vote(transaction_id, group_id, user_id, body.vote)
+    if votes is None:
         raise HTTPException(400, "You have already voted on this transaction")
     
-    # Record vote
-    transactions.record_vote(transaction_id, user_id, body.vote)
-    
-    # Count votes
-    approve_count, reject_count = transactions.count_votes(transaction_id)
-    total_members = len(group["members"])
-    
-    # Check if voting is complete
-    new_status = transaction["status"]
-    threshold = total_members / 2
-    
-    if approve_count > threshold:
-        new_status = "approved"
-        transactions.update_status(transaction_id, "approved")
-    elif reject_count > threshold:
-        new_status = "rejected"
-        transactions.update_status(transaction_id, "rejected")
-    
-    return VoteResponse(
-        message="Vote recorded",
-        status=new_status,
-        votes=transactions.get_votes(transaction_id),
-        approveCount=approve_count,
-        rejectCount=reject_count,
-        totalMembers=total_members
-    )
+    return VoteResponse(message="Vote recorded", **_settle_vote(transaction, votes, user_id, body.vote))
 
 
 @router.post("/{transaction_id}/execute", response_model=dict)
@@ -162,6 +315,8 @@ def execute_transaction(transaction_id: str, token: dict = Depends(verify_token)
     - Transaction must be in "approved" status
     - Deducts amount from group balance
     - Updates transaction status to "executed"
+    - Stock trades are handed to the order queue and return
+      orderStatus "pending_fill"; the fill is recorded asynchronously
     - Must be a member of the group
     """
     user_id = token["sub"]
@@ -199,39 +354,41 @@ def execute_transaction(transaction_id: str, token: dict = Depends(verify_token)
     # - investment: Move money from liquid balance to invested assets
     # - withdrawal: Deduct from liquid balance (and eventually return to proposer)
     # - deposit: Add to liquid balance (already handled separately)
+    if transaction_type not in ("investment", "withdrawal"):
+        raise HTTPException(400, f"Unknown transaction type: {transaction_type}")
     
+    # Check if there's enough liquid cash
+    action = "invest" if transaction_type == "investment" else "withdraw"
+    if current_balance < transaction_amount:
+        raise HTTPException(400, f"Insufficient liquid funds to {action} (available: ${current_balance}, required: ${transaction_amount})")
+    
+    # Balances, status and the ledger event are written together, and only
+    # if the transaction is still approved and the balance still covers it
+    if not transactions.execute(transaction, user_id):
+        raise HTTPException(409, "Transaction was executed or the group balance changed, please retry")
+    
+    new_balance = current_balance - transaction_amount
+    invested_amount = float(group.get("investedAmount", 0))
     if transaction_type == "investment":
-        # INVESTMENT - move from liquid balance to invested amount
-        # Check if there's enough liquid cash to invest
-        if current_balance < transaction_amount:
-            raise HTTPException(400, f"Insufficient liquid funds to invest (available: ${current_balance}, required: ${transaction_amount})")
-        
-        # Subtract from liquid balance
-        groups.update_balance(group_id, -transaction_amount)
-        # Add to invested amount
-        groups.update_invested_amount(group_id, transaction_amount)
-        
-        new_balance = current_balance - transaction_amount
-        invested_amount = float(group.get("investedAmount", 0)) + transaction_amount
-        
-    elif transaction_type == "withdrawal":
-        # WITHDRAWAL - deduct from liquid balance
-        if current_balance < transaction_amount:
-            raise HTTPException(400, f"Insufficient liquid funds to withdraw (available: ${current_balance}, required: ${transaction_amount})")
-        
-        # Subtract from liquid balance
-        groups.update_balance(group_id, -transaction_amount)
-        new_balance = current_balance - transaction_amount
-        invested_amount = float(group.get("investedAmount", 0))
-        
-    else:
-        raise HTTPException(400, f"Unknown transaction type: {transaction_type}")
+        invested_amount += transaction_amount
     
-    # Mark transaction as executed
-    transactions.update_status(transaction_id, "executed")
+    # Stock trades are placed with the broker in the background
+    order_status = None
+    if transaction.get("metadata", {}).get("stock_symbol"):
+        order_status = "pending_fill"
+        order_queue.enqueue(transaction_id)
+    
+    publish_group_event(group_id, "transaction.status", {
+        "transactionId": transaction_id,
+        "status": "executed",
+        "orderStatus": order_status,
+        "balance": new_balance,
+        "investedAmount": invested_amount
+    })
     
     return {
         "message": "Transaction executed successfully",
+        "orderStatus": order_status,
         "transactionId": transaction_id,
         "amount": transaction_amount,
         "previousBalance": current_balance,
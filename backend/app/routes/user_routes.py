@@ -3,62 +3,54 @@ User routes
 Handles user profile and settings
 """
 from fastapi import APIRouter, HTTPException, Depends
+from typing import List, Optional
 from ..auth import verify_token
 from ..db import users, groups, transactions
+from ..fields import pick, select_fields
+from ..responses import FastRoute
 
-router = APIRouter(prefix="/users", tags=["Users"])
+router = APIRouter(prefix="/users", tags=["Users"], route_class=FastRoute)
+
+
+# Profile fields clients may select with ?fields=; "groups.<field>" selects
+# fields of the embedded groups ("groups" alone selects all of them)
+PROFILE_FIELDS = ["userId", "username", "email", "balance", "role", "status", "groups", "totalInvested", "createdAt"]
+PROFILE_GROUP_FIELDS = ["groupID", "name", "balance", "investedAmount", "totalAssets", "members"]
 
 
 @router.get("/me")
-def get_current_user(token: dict = Depends(verify_token)):
+def get_current_user(
+    fields: Optional[List[str]] = Depends(select_fields(
+        [*PROFILE_FIELDS, *(f"groups.{f}" for f in PROFILE_GROUP_FIELDS)]
+    )),
+    token: dict = Depends(verify_token)
+):
     """
     Get current user's profile
     
     Returns user information including username, email, groups, etc.
+    
+    - Set fields (e.g. fields=username,groups.name) to read and return
+      only those; totalInvested scans every group's transactions, so
+      leave it out when it isn't needed
     """
     user_id = token["sub"]
-    
-    # Get user from database
-    user = users.get_user_by_id(user_id)
+    wanted = set(fields) if fields is not None else {*PROFILE_FIELDS, "groups"}
+    group_fields = [f for f in PROFILE_GROUP_FIELDS if "groups" in wanted or f"groups.{f}" in wanted]
+    if group_fields:
+        wanted.add("groups")
+    
+    # Get user from database, reading only what the response needs
+    read = None
+    if fields is not None:
+        read = [f for f in PROFILE_FIELDS if f in wanted and f not in ("userId", "totalInvested")]
+        if "totalInvested" in wanted and "groups" not in read:
+            read.append("groups")
+    user = users.get_user_by_id(user_id, read)
     if not user:
         raise HTTPException(404, "User not found")
     
-    # Get full group details for each group ID
-    group_ids = user.get("groups", [])
-    print(f"👤 User {user.get('username')} has group IDs: {group_ids}")
-    user_groups = []
-    for group_id in group_ids:
-        group = groups.get_group(group_id)
-        if group:
-            print(f"📦 Group data from DB: {group}")
-            print(f"🔑 GroupID field: {group.get('groupID')}")
-            user_groups.append({
-                "groupID": group.get("groupID"),
-                "name": group.get("name"),
-                "balance": group.get("balance", 0),
-                "investedAmount": group.get("investedAmount", 0),
-                "totalAssets": float(group.get("balance", 0)) + float(group.get("investedAmount", 0)),
-                "members": group.get("members", [])
-            })
-        else:
-            print(f"⚠️ Group not found for ID: {group_id}")
-    
-    # Calculate total invested from approved transactions
-    total_invested = 0
     group_ids = user.get("groups", [])
-    
-    for group_id in group_ids:
-        # Get all transactions for this group
-        group_transactions = transactions.get_group_transactions(group_id)
-        
-        # Sum up approved transactions proposed by this user with positive amounts
-        for txn in group_transactions:
-            if (txn.get("proposedBy") == user_id and 
-                txn.get("status") == "approved" and 
-                float(txn.get("amount", 0)) > 0):
-                total_invested += float(txn.get("amount", 0))
-    
-    # Remove sensitive data
     user_data = {
         "userId": user.get("userID"),
         "username": user.get("username"),
@@ -66,12 +58,44 @@ def get_current_user(token: dict = Depends(verify_token)):
         "balance": float(user.get("balance", 0)),
         "role": user.get("role", "member"),
         "status": user.get("status", "active"),
-        "groups": user_groups,
-        "totalInvested": total_invested,
         "createdAt": user.get("createdAt")
     }
     
-    return user_data
+    # Get group details for each group ID in one batched read
+    if group_fields:
+        group_attrs = [f for f in group_fields if f != "totalAssets"]
+        if "totalAssets" in group_fields:
+            group_attrs += ["balance", "investedAmount"]
+        user_groups = []
+        for group in groups.get_groups(group_ids, list(dict.fromkeys(group_attrs))):
+            summary = {
+                "groupID": group.get("groupID"),
+                "name": group.get("name"),
+                "balance": group.get("balance", 0),
+                "investedAmount": group.get("investedAmount", 0),
+                "totalAssets": float(group.get("balance", 0)) + float(group.get("investedAmount", 0)),
+                "members": group.get("members", [])
+            }
+            user_groups.append(pick(summary, group_fields, always=["groupID"]))
+        user_data["groups"] = user_groups
+    
+    # Calculate total invested from approved transactions
+    if "totalInvested" in wanted:
+        total_invested = 0
+        for group_id in group_ids:
+            # Get all transactions for this group
+            group_transactions = transactions.get_group_transactions(group_id, ["proposedBy", "status", "amount"])
+            
+            # Sum up approved transactions proposed by this user with positive amounts
+            for txn in group_transactions:
+                if (txn.get("proposedBy") == user_id and 
+                    txn.get("status") == "approved" and 
+                    float(txn.get("amount", 0)) > 0):
+                    total_invested += float(txn.get("amount", 0))
+        user_data["totalInvested"] = total_invested
+    
+    # Sensitive data (password hash) is never included
+    return pick(user_data, [f for f in PROFILE_FIELDS if f in wanted]) if fields is not None else user_data
 
 
 @router.get("/all")
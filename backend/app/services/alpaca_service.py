@@ -3,168 +3,371 @@ Alpaca Trading API Service
 Provides mock trading functionality with real market data
 """
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Callable, List, Dict, Optional
 from datetime import datetime, timedelta
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockLatestQuoteRequest, StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import MarketOrderRequest, GetOrdersRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
-
-# Curated stock lists by category
-STOCK_LISTS = {
-    "blue_chips": [
-        {"symbol": "AAPL", "name": "Apple Inc."},
-        {"symbol": "MSFT", "name": "Microsoft Corporation"},
-        {"symbol": "GOOGL", "name": "Alphabet Inc."},
-        {"symbol": "AMZN", "name": "Amazon.com Inc."},
-        {"symbol": "JPM", "name": "JPMorgan Chase & Co."},
-        {"symbol": "V", "name": "Visa Inc."},
-        {"symbol": "JNJ", "name": "Johnson & Johnson"},
-        {"symbol": "WMT", "name": "Walmart Inc."},
-        {"symbol": "PG", "name": "Procter & Gamble"},
-        {"symbol": "MA", "name": "Mastercard Inc."},
-    ],
-    "etfs": [
-        {"symbol": "SPY", "name": "SPDR S&P 500 ETF"},
-        {"symbol": "QQQ", "name": "Invesco QQQ Trust"},
-        {"symbol": "IWM", "name": "iShares Russell 2000 ETF"},
-        {"symbol": "VTI", "name": "Vanguard Total Stock Market ETF"},
-        {"symbol": "VOO", "name": "Vanguard S&P 500 ETF"},
-        {"symbol": "DIA", "name": "SPDR Dow Jones Industrial Average ETF"},
-    ],
-    "technology": [
-        {"symbol": "NVDA", "name": "NVIDIA Corporation"},
-        {"symbol": "META", "name": "Meta Platforms Inc."},
-        {"symbol": "TSLA", "name": "Tesla Inc."},
-    ],
-    "healthcare": [
-        {"symbol": "UNH", "name": "UnitedHealth Group Inc."},
-        {"symbol": "PFE", "name": "Pfizer Inc."},
-        {"symbol": "ABBV", "name": "AbbVie Inc."},
-    ],
-    "finance": [
-        {"symbol": "BAC", "name": "Bank of America Corp."},
-        {"symbol": "WFC", "name": "Wells Fargo & Company"},
-        {"symbol": "GS", "name": "Goldman Sachs Group Inc."},
-    ],
-    "consumer": [
-        {"symbol": "COST", "name": "Costco Wholesale Corporation"},
-        {"symbol": "HD", "name": "Home Depot Inc."},
-        {"symbol": "NKE", "name": "Nike Inc."},
-    ],
-    "energy": [
-        {"symbol": "XOM", "name": "Exxon Mobil Corporation"},
-        {"symbol": "CVX", "name": "Chevron Corporation"},
-        {"symbol": "COP", "name": "ConocoPhillips"},
-    ],
-    "industrial": [
-        {"symbol": "BA", "name": "Boeing Company"},
-        {"symbol": "CAT", "name": "Caterpillar Inc."},
-        {"symbol": "UPS", "name": "United Parcel Service Inc."},
-    ],
+from ..config import (
+    QUOTE_CACHE_TTL_SECONDS, QUOTE_STALE_GRACE_SECONDS, QUOTE_FETCH_TIMEOUT_SECONDS,
+    QUOTE_BATCH_WINDOW_SECONDS, BAR_CACHE_DIR,
+)
+from .bar_cache import BarCache, columns_from_dicts
+from .market_simulator import MarketSimulator
+from .symbol_catalog import symbol_catalog
+
+# Supported bar timeframes -> alpaca TimeFrame attribute (the simulator
+# only produces daily bars)
+TIMEFRAMES = {
+    "1Day": "Day",
+    "1Hour": "Hour",
+    "1Min": "Minute",
 }
 
+# Broker order states after which nothing more can fill
+FINAL_ORDER_STATUSES = {"filled", "canceled", "expired", "rejected", "not_found"}
+
+class _Flight:
+    """An upstream fetch in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class QuoteCache:
+    """
+    TTL cache of latest prices with per-symbol single-flight
+
+    Concurrent misses for the same symbol share one upstream call. Misses
+    are queued in a shared pending set that a single fetcher thread drains,
+    waiting batch_window_seconds first so misses from concurrent callers go
+    upstream as one batch. If upstream fails, a value up to
+    stale_grace_seconds past its TTL is served instead.
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[List[str]], Dict[str, float]],
+        ttl_seconds: float = QUOTE_CACHE_TTL_SECONDS,
+        stale_grace_seconds: float = QUOTE_STALE_GRACE_SECONDS,
+        wait_timeout_seconds: float = QUOTE_FETCH_TIMEOUT_SECONDS,
+        batch_window_seconds: float = QUOTE_BATCH_WINDOW_SECONDS,
+    ):
+        self.fetcher = fetcher
+        self.ttl_seconds = ttl_seconds
+        self.stale_grace_seconds = stale_grace_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.batch_window_seconds = batch_window_seconds
+        self._entries: Dict[str, tuple] = {}  # symbol -> (price, fetched_at)
+        self._inflight: Dict[str, _Flight] = {}
+        self._pending: List[str] = []  # queued for the next batch
+        self._draining = False
+        self._lock = threading.Lock()
+
+    def get_many(self, symbols: List[str]) -> Dict[str, float]:
+        """Get prices for symbols, fetching only the ones that aren't fresh"""
+        prices = {}
+        to_wait = []
+
+        with self._lock:
+            now = time.monotonic()
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entries.get(symbol)
+                if entry and now - entry[1] < self.ttl_seconds:
+                    prices[symbol] = entry[0]
+                    continue
+                if symbol not in self._inflight:
+                    self._inflight[symbol] = _Flight()
+                    self._pending.append(symbol)
+                to_wait.append(self._inflight[symbol])
+            if self._pending and not self._draining:
+                self._draining = True
+                threading.Thread(target=self._drain, name="quote-fetcher", daemon=True).start()
+
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        for flight in to_wait:
+            flight.done.wait(max(0.0, deadline - time.monotonic()))
+
+        # Whatever is still missing is either fresh now or usable as stale
+        with self._lock:
+            now = time.monotonic()
+            max_age = self.ttl_seconds + self.stale_grace_seconds
+            for symbol in symbols:
+                if symbol in prices:
+                    continue
+                entry = self._entries.get(symbol)
+                if entry and now - entry[1] < max_age:
+                    prices[symbol] = entry[0]
+
+        return prices
+
+    def _drain(self):
+        """Fetch pending symbols in batches until none are left"""
+        while True:
+            if self.batch_window_seconds > 0:
+                time.sleep(self.batch_window_seconds)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    self._draining = False
+                    return
+            try:
+                fetched = self.fetcher(batch)
+            except Exception as e:
+                print(f"❌ Error fetching prices: {e}")
+                fetched = {}
+            with self._lock:
+                fetched_at = time.monotonic()
+                for symbol in batch:
+                    if symbol in fetched:
+                        self._entries[symbol] = (fetched[symbol], fetched_at)
+                    self._inflight.pop(symbol).done.set()
+
+    def clear(self):
+        """Drop all cached prices"""
+        with self._lock:
+            self._entries.clear()
+
 
 class AlpacaService:
+    """
+    Market data and paper trading, through Alpaca when API keys are set and
+    the market simulator otherwise
+
+    alpaca-py (which pulls in pandas) is only imported, and the clients and
+    simulator only built, when first needed, so importing this module is
+    cheap. warm() builds them ahead of time.
+    """
+
     def __init__(self):
-        """Initialize Alpaca clients with API keys from environment"""
+        """Read Alpaca API keys from environment"""
         # Use paper trading keys for mock trading
         self.api_key = os.getenv("ALPACA_API_KEY", "")
         self.secret_key = os.getenv("ALPACA_SECRET_KEY", "")
-        
-        if not self.api_key or not self.secret_key:
+        self.has_api_keys = bool(self.api_key and self.secret_key)
+        if not self.has_api_keys:
             print("⚠️ Warning: Alpaca API keys not found in environment")
-            self.data_client = None
-            self.trading_client = None
-        else:
+
+        self.quote_cache = QuoteCache(self._fetch_latest_prices)
+        # Reentrant: building the bar cache builds the simulator
+        self._lock = threading.RLock()
+        self._data_client = None
+        self._trading_client = None
+        self._simulator = None
+        self._bar_cache = None
+        # Previous daily closes, for the change in quotes from Alpaca
+        self._closes_date = None
+        self._closes: Dict[str, float] = {}
+
+    def _build(self, attr: str, factory):
+        # Double-checked so concurrent first uses build only once
+        value = getattr(self, attr)
+        if value is None:
+            with self._lock:
+                value = getattr(self, attr)
+                if value is None:
+                    value = factory()
+                    setattr(self, attr, value)
+        return value
+
+    @property
+    def data_client(self):
+        """Market data client (None without API keys)"""
+        if not self.has_api_keys:
+            return None
+
+        def create():
+            from alpaca.data.historical import StockHistoricalDataClient
             # Data client for market data (free, no account needed)
-            self.data_client = StockHistoricalDataClient(
-                api_key=self.api_key,
-                secret_key=self.secret_key
-            )
-            
-            # Trading client for paper trading
-            self.trading_client = TradingClient(
-                api_key=self.api_key,
-                secret_key=self.secret_key,
-                paper=True  # Always use paper trading
-            )
+            return StockHistoricalDataClient(api_key=self.api_key, secret_key=self.secret_key)
+        return self._build("_data_client", create)
+
+    @property
+    def trading_client(self):
+        """Paper trading client (None without API keys)"""
+        if not self.has_api_keys:
+            return None
+
+        def create():
+            from alpaca.trading.client import TradingClient
+            # Always use paper trading
+            return TradingClient(api_key=self.api_key, secret_key=self.secret_key, paper=True)
+        return self._build("_trading_client", create)
+
+    @property
+    def simulator(self) -> MarketSimulator:
+        """Simulated market data for the catalog (and any symbol asked for)"""
+        return self._build("_simulator", lambda: MarketSimulator(symbol_catalog.listed_symbols()))
+
+    @property
+    def bar_cache(self) -> BarCache:
+        """On-disk cache of historical bars"""
+        def create():
+            # Bars from the simulator go in their own cache namespace, keyed by
+            # the seed its history is reproducible for
+            if self.has_api_keys:
+                bar_source = "alpaca"
+            else:
+                bar_source = f"simulator-v2-{self.simulator.seed}"
+            return BarCache(os.path.join(BAR_CACHE_DIR, bar_source), self._fetch_bars)
+        return self._build("_bar_cache", create)
+
+    def warm(self):
+        """Build the clients and simulator now instead of on first use"""
+        self.data_client
+        self.trading_client
+        self.simulator
+        self.bar_cache
 
     def get_stock_lists(self) -> Dict[str, List[Dict]]:
         """Get all available stock lists organized by category"""
-        return STOCK_LISTS
+        return symbol_catalog.get_stock_lists()
 
-    def get_current_price(self, symbol: str) -> Optional[float]:
-        """Get current price for a symbol"""
-        if not self.data_client:
-            # Return mock data if API not configured
-            return 100.0
+    def _fetch_latest_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetch latest quotes for symbols in one batched request (raises on failure)"""
+        from alpaca.data.requests import StockLatestQuoteRequest
+        request = StockLatestQuoteRequest(symbol_or_symbols=symbols)
+        quotes = self.data_client.get_stock_latest_quote(request)
         
-        try:
-            request = StockLatestQuoteRequest(symbol_or_symbols=symbol)
-            quotes = self.data_client.get_stock_latest_quote(request)
-            
+        prices = {}
+        for symbol in symbols:
             if symbol in quotes:
                 quote = quotes[symbol]
                 # Use mid-point of bid/ask
-                return float((quote.bid_price + quote.ask_price) / 2)
-            return None
-        except Exception as e:
-            print(f"❌ Error fetching price for {symbol}: {e}")
-            return None
+                prices[symbol] = float((quote.bid_price + quote.ask_price) / 2)
+        return prices
+
+    def get_current_price(self, symbol: str) -> Optional[float]:
+        """Get current price for a symbol"""
+        if not self.has_api_keys:
+            # Return simulated data if API not configured
+            return self.simulator.get_quote(symbol)["price"]
+        
+        return self.quote_cache.get_many([symbol]).get(symbol)
 
     def get_multiple_prices(self, symbols: List[str]) -> Dict[str, float]:
         """Get current prices for multiple symbols at once"""
-        if not self.data_client:
-            # Return mock data if API not configured
-            return {symbol: 100.0 for symbol in symbols}
+        if not self.has_api_keys:
+            # Return simulated data if API not configured
+            return self.simulator.get_prices(symbols)
         
-        try:
-            request = StockLatestQuoteRequest(symbol_or_symbols=symbols)
-            quotes = self.data_client.get_stock_latest_quote(request)
-            
-            prices = {}
-            for symbol in symbols:
-                if symbol in quotes:
-                    quote = quotes[symbol]
-                    prices[symbol] = float((quote.bid_price + quote.ask_price) / 2)
-            
-            return prices
-        except Exception as e:
-            print(f"❌ Error fetching prices: {e}")
-            return {}
+        return self.quote_cache.get_many(symbols)
+
+    def _fetch_previous_closes(self, symbols: List[str], today) -> Dict[str, float]:
+        """Fetch each symbol's last daily close before today in one batched request"""
+        from alpaca.data.requests import StockBarsRequest
+        from alpaca.data.timeframe import TimeFrame
+        request = StockBarsRequest(
+            symbol_or_symbols=symbols,
+            timeframe=TimeFrame.Day,
+            # Covers weekends and holidays
+            start=datetime.combine(today - timedelta(days=7), datetime.min.time()),
+            end=datetime.combine(today, datetime.min.time()),
+        )
+        data = self.data_client.get_stock_bars(request).data
+        closes = {}
+        for symbol in symbols:
+            bars = [bar for bar in data.get(symbol, []) if bar.timestamp.date() < today]
+            if bars:
+                closes[symbol] = float(bars[-1].close)
+        return closes
+
+    def _previous_closes(self, symbols: List[str]) -> Dict[str, float]:
+        """Previous closes, fetched once per day for symbols not seen yet today"""
+        today = datetime.utcnow().date()
+        with self._lock:
+            if self._closes_date != today:
+                self._closes_date, self._closes = today, {}
+            missing = [s for s in symbols if s not in self._closes]
+        if missing:
+            try:
+                fetched = self._fetch_previous_closes(missing, today)
+            except Exception as e:
+                print(f"❌ Error fetching previous closes: {e}")
+                fetched = {}
+            with self._lock:
+                if self._closes_date == today:
+                    self._closes.update(fetched)
+        with self._lock:
+            return {s: self._closes[s] for s in symbols if s in self._closes}
 
     def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """Get detailed stock information including current price and daily change"""
-        # Use mock prices for demo - works for everyone!
-        import random
-        import hashlib
+        return self.get_multiple_stock_info([symbol]).get(symbol)
+
+    def get_multiple_stock_info(self, symbols: List[str]) -> Dict[str, Dict]:
+        """
+        Get stock information for many symbols in one batch
+        
+        Prices come from the quote cache (one batched upstream request for
+        whatever isn't fresh); the daily change is against the previous close.
+        """
+        if not self.has_api_keys:
+            # Return simulated data if API not configured
+            return self.simulator.get_quotes(symbols)
         
-        # Generate consistent "random" price based on symbol
-        seed = int(hashlib.md5(symbol.encode()).hexdigest(), 16) % 10000
-        random.seed(seed)
+        prices = self.get_multiple_prices(symbols)
+        closes = self._previous_closes(list(prices))
+        quotes = {}
+        for symbol, price in prices.items():
+            close = closes.get(symbol)
+            change = price - close if close else 0.0
+            quotes[symbol] = {
+                "symbol": symbol,
+                "price": round(price, 2),
+                "change": round(change, 2),
+                "change_percent": round(change / close * 100, 2) if close else 0.0,
+            }
+        return quotes
+
+    def _fetch_bars(self, symbol: str, timeframe: str, start, end) -> Dict:
+        """Fetch OHLCV bar columns for [start, end] from Alpaca or the simulator"""
+        if not self.has_api_keys:
+            if timeframe != "1Day":
+                raise ValueError(f"Timeframe {timeframe} is not available without market data API keys")
+            return columns_from_dicts(self.simulator.get_daily_bars(symbol, start, end))
         
-        # Base price between $50 and $500
-        base_price = random.uniform(50, 500)
+        from alpaca.data.requests import StockBarsRequest
+        from alpaca.data.timeframe import TimeFrame
+        request = StockBarsRequest(
+            symbol_or_symbols=symbol,
+            timeframe=getattr(TimeFrame, TIMEFRAMES[timeframe]),
+            start=datetime.combine(start, datetime.min.time()),
+            end=datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        )
+        bars = self.data_client.get_stock_bars(request).data.get(symbol, [])
+        return columns_from_dicts([
+            {
+                "timestamp": bar.timestamp.isoformat(),
+                "open": bar.open,
+                "high": bar.high,
+                "low": bar.low,
+                "close": bar.close,
+                "volume": bar.volume,
+            }
+            for bar in bars
+        ])
+
+    def get_bars(self, symbol: str, timeframe: str, start, end) -> Dict:
+        """
+        Get historical OHLCV bars, served from the local bar cache
         
-        # Daily change between -5% and +5%
-        change_percent = random.uniform(-5, 5)
-        change = base_price * (change_percent / 100)
+        Args:
+            symbol: Stock symbol
+            timeframe: One of TIMEFRAMES
+            start: First date (inclusive)
+            end: Last date (inclusive)
         
-        return {
-            "symbol": symbol,
-            "price": round(base_price, 2),
-            "change": round(change, 2),
-            "change_percent": round(change_percent, 2),
-        }
+        Returns:
+            dict: Column name -> NumPy array
+        """
+        return self.bar_cache.get_bars(symbol, timeframe, start, end)
 
     def place_mock_order(
         self,
         symbol: str,
         quantity: float,
         side: str = "buy",
+        client_order_id: Optional[str] = None,
     ) -> Optional[Dict]:
         """
         Place a mock paper trading order
@@ -173,11 +376,13 @@ class AlpacaService:
             symbol: Stock symbol (e.g., 'AAPL')
             quantity: Number of shares
             side: 'buy' or 'sell'
+            client_order_id: Idempotency key; if an order with this ID was
+                already submitted, its current state is returned instead
         
         Returns:
             Order details if successful, None otherwise
         """
-        if not self.trading_client:
+        if not self.has_api_keys:
             # Return mock order if API not configured
             price = self.get_current_price(symbol)
             return {
@@ -186,38 +391,99 @@ class AlpacaService:
                 "quantity": quantity,
                 "side": side,
                 "price": price,
+                "filled_quantity": quantity,
                 "total": price * quantity,
                 "status": "filled",
                 "timestamp": datetime.now().isoformat(),
             }
         
         try:
-            order_side = OrderSide.BUY if side.lower() == "buy" else OrderSide.SELL
+            order = None
+            if client_order_id:
+                try:
+                    order = self.trading_client.get_order_by_client_id(client_order_id)
+                except Exception:
+                    order = None
             
-            order_data = MarketOrderRequest(
-                symbol=symbol,
-                qty=quantity,
-                side=order_side,
-                time_in_force=TimeInForce.DAY,
-            )
+            if order is None:
+                from alpaca.trading.enums import OrderSide, TimeInForce
+                from alpaca.trading.requests import MarketOrderRequest
+                order_side = OrderSide.BUY if side.lower() == "buy" else OrderSide.SELL
+                
+                order_data = MarketOrderRequest(
+                    symbol=symbol,
+                    qty=quantity,
+                    side=order_side,
+                    time_in_force=TimeInForce.DAY,
+                    client_order_id=client_order_id,
+                )
+                
+                order = self.trading_client.submit_order(order_data)
             
-            order = self.trading_client.submit_order(order_data)
-            
-            return {
-                "order_id": str(order.id),
-                "symbol": order.symbol,
-                "quantity": float(order.qty),
-                "side": order.side.value,
-                "price": float(order.filled_avg_price) if order.filled_avg_price else None,
-                "total": float(order.filled_qty) * float(order.filled_avg_price) if order.filled_avg_price else None,
-                "status": order.status.value,
-                "timestamp": order.submitted_at.isoformat() if order.submitted_at else None,
-            }
+            return self._order_details(order)
             
         except Exception as e:
             print(f"❌ Error placing order: {e}")
             return None
 
+    def cancel_order(self, client_order_id: str) -> Optional[Dict]:
+        """
+        Cancel the order placed with a client_order_id, if it is still open
+        
+        The broker cancels asynchronously, so the order's state is read
+        back after the request; only a final state means nothing more can
+        fill. An order that filled (or partly filled) before the cancel
+        reports its filled quantity.
+        
+        Args:
+            client_order_id: Idempotency key the order was placed with
+        
+        Returns:
+            Order details as after place_mock_order, with status "not_found"
+            if no order was ever placed; None if the broker couldn't be asked
+        """
+        if not self.has_api_keys:
+            # Mock orders fill when placed, so none is ever left open
+            return {"client_order_id": client_order_id, "status": "not_found"}
+        
+        try:
+            try:
+                order = self.trading_client.get_order_by_client_id(client_order_id)
+            except Exception as e:
+                if getattr(e, "status_code", None) == 404:
+                    return {"client_order_id": client_order_id, "status": "not_found"}
+                raise
+            
+            if order.status.value not in FINAL_ORDER_STATUSES | {"pending_cancel"}:
+                try:
+                    self.trading_client.cancel_order_by_id(order.id)
+                except Exception as e:
+                    # 422 when it filled or was cancelled in the meantime
+                    print(f"⚠️ Cancel of order {order.id} not accepted: {e}")
+                order = self.trading_client.get_order_by_id(order.id)
+            
+            return self._order_details(order)
+            
+        except Exception as e:
+            print(f"❌ Error cancelling order: {e}")
+            return None
+
+    @staticmethod
+    def _order_details(order) -> Dict:
+        filled = float(order.filled_qty) if order.filled_qty else 0.0
+        return {
+            "order_id": str(order.id),
+            "symbol": order.symbol,
+            "quantity": float(order.qty),
+            "filled_quantity": filled,
+            "side": order.side.value,
+            "price": float(order.filled_avg_price) if order.filled_avg_price else None,
+            "total": filled * float(order.filled_avg_price) if order.filled_avg_price else None,
+            "status": order.status.value,
+            "timestamp": order.submitted_at.isoformat() if order.submitted_at else None,
+            "filled_at": order.filled_at.isoformat() if order.filled_at else None,
+        }
+
 
 # Singleton instance
 alpaca_service = AlpacaService()
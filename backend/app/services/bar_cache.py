@@ -0,0 +1,203 @@
+"""
+Bar Cache
+On-disk columnar cache of OHLCV bars per symbol and timeframe, stored as
+NumPy arrays and read back memory-mapped
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+# fetcher(symbol, timeframe, start, end) -> {column: array}, dates inclusive
+BarFetcher = Callable[[str, str, date, date], Dict[str, np.ndarray]]
+
+
+class BarCache:
+    """
+    Per-(symbol, timeframe) bar store with incremental fill
+
+    Each series lives in its own directory as one .npy file per column plus
+    an index.json listing the date ranges already fetched. A request only
+    fetches the parts of [start, end] not covered yet; today is never
+    cached because its bars are still changing.
+    """
+
+    def __init__(self, root_dir: str, fetcher: BarFetcher):
+        self.root_dir = root_dir
+        self.fetcher = fetcher
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._mmaps: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+
+    # ---------- paths / index ----------
+
+    def _series_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root_dir, timeframe, symbol.upper())
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _read_ranges(self, series_dir: str) -> List[Tuple[date, date]]:
+        try:
+            with open(os.path.join(series_dir, "index.json")) as f:
+                ranges = json.load(f)["ranges"]
+        except (FileNotFoundError, KeyError, ValueError):
+            return []
+        return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in ranges]
+
+    def _write_ranges(self, series_dir: str, ranges: List[Tuple[date, date]]):
+        tmp = os.path.join(series_dir, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"ranges": [[s.isoformat(), e.isoformat()] for s, e in ranges]}, f)
+        os.replace(tmp, os.path.join(series_dir, "index.json"))
+
+    # ---------- arrays ----------
+
+    def _load(self, key: Tuple[str, str], series_dir: str) -> Dict[str, np.ndarray]:
+        arrays = self._mmaps.get(key)
+        if arrays is None:
+            try:
+                arrays = {
+                    c: np.load(os.path.join(series_dir, f"{c}.npy"), mmap_mode="r")
+                    for c in COLUMNS
+                }
+            except FileNotFoundError:
+                arrays = _empty_columns()
+            self._mmaps[key] = arrays
+        return arrays
+
+    def _store(self, key: Tuple[str, str], series_dir: str, arrays: Dict[str, np.ndarray]):
+        self._mmaps.pop(key, None)
+        os.makedirs(series_dir, exist_ok=True)
+        for c in COLUMNS:
+            tmp = os.path.join(series_dir, f"{c}.tmp.npy")
+            np.save(tmp, arrays[c])
+            os.replace(tmp, os.path.join(series_dir, f"{c}.npy"))
+
+    # ---------- public ----------
+
+    def get_bars(self, symbol: str, timeframe: str, start: date, end: date) -> Dict[str, np.ndarray]:
+        """
+        Get bars with timestamps in [start, end], fetching only missing ranges
+
+        Returns:
+            dict: Column name -> array (timestamp is epoch seconds, UTC)
+        """
+        symbol = symbol.upper()
+        key = (symbol, timeframe)
+        series_dir = self._series_dir(symbol, timeframe)
+        today = datetime.now(timezone.utc).date()
+        cacheable_end = min(end, today - timedelta(days=1))
+
+        with self._lock_for(key):
+            ranges = self._read_ranges(series_dir)
+            missing = _subtract_ranges((start, cacheable_end), ranges) if start <= cacheable_end else []
+
+            if missing:
+                current = self._load(key, series_dir)
+                parts = [{c: np.asarray(current[c]) for c in COLUMNS}]
+                for gap_start, gap_end in missing:
+                    parts.append(self.fetcher(symbol, timeframe, gap_start, gap_end))
+                merged = _merge_columns(parts)
+                # Release the old mapping before its files are replaced
+                del current, parts
+                self._store(key, series_dir, merged)
+                self._write_ranges(series_dir, _union_ranges(ranges + missing))
+
+            cached = self._load(key, series_dir)
+
+        lo = np.searchsorted(cached["timestamp"], _epoch(start), side="left")
+        hi = np.searchsorted(cached["timestamp"], _epoch(end + timedelta(days=1)), side="left")
+        result = {c: cached[c][lo:hi] for c in COLUMNS}
+
+        if end > cacheable_end:
+            live_start = max(start, cacheable_end + timedelta(days=1))
+            live = self.fetcher(symbol, timeframe, live_start, end)
+            result = _merge_columns([result, live])
+        return result
+
+
+def bars_to_dicts(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """Convert bar columns to a list of JSON-friendly dicts"""
+    return [
+        {
+            "timestamp": datetime.fromtimestamp(int(t), timezone.utc).isoformat(),
+            "open": round(float(o), 4),
+            "high": round(float(h), 4),
+            "low": round(float(l), 4),
+            "close": round(float(c), 4),
+            "volume": int(v),
+        }
+        for t, o, h, l, c, v in zip(*(columns[c] for c in COLUMNS))
+    ]
+
+
+def columns_from_dicts(bars: List[Dict]) -> Dict[str, np.ndarray]:
+    """Build bar columns from dicts with a date or timestamp field"""
+    timestamps = [
+        _epoch(date.fromisoformat(b["date"])) if "date" in b
+        else int(datetime.fromisoformat(b["timestamp"]).timestamp())
+        for b in bars
+    ]
+    return {
+        "timestamp": np.array(timestamps, dtype=np.int64),
+        "open": np.array([b["open"] for b in bars], dtype=np.float64),
+        "high": np.array([b["high"] for b in bars], dtype=np.float64),
+        "low": np.array([b["low"] for b in bars], dtype=np.float64),
+        "close": np.array([b["close"] for b in bars], dtype=np.float64),
+        "volume": np.array([b["volume"] for b in bars], dtype=np.float64),
+    }
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    return {c: np.empty(0, dtype=np.int64 if c == "timestamp" else np.float64) for c in COLUMNS}
+
+
+def _merge_columns(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Concatenate bar columns, sorted by timestamp with duplicates dropped"""
+    merged = {c: np.concatenate([np.asarray(p[c]) for p in parts]) for c in COLUMNS}
+    merged["timestamp"] = merged["timestamp"].astype(np.int64)
+    # Later parts win on duplicate timestamps: reverse, unique, keep first
+    reversed_ts = merged["timestamp"][::-1]
+    _, first = np.unique(reversed_ts, return_index=True)
+    keep = len(reversed_ts) - 1 - first
+    return {c: merged[c][keep] for c in COLUMNS}
+
+
+def _epoch(d: date) -> int:
+    return int(datetime.combine(d, dt_time(), tzinfo=timezone.utc).timestamp())
+
+
+def _union_ranges(ranges: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Merge overlapping or adjacent date ranges"""
+    merged: List[Tuple[date, date]] = []
+    for s, e in sorted(ranges):
+        if merged and s <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def _subtract_ranges(
+    wanted: Tuple[date, date], covered: List[Tuple[date, date]]
+) -> List[Tuple[date, date]]:
+    """Parts of the wanted range not inside any covered range"""
+    gaps = []
+    cursor = wanted[0]
+    for s, e in _union_ranges(covered):
+        if e < cursor:
+            continue
+        if s > wanted[1]:
+            break
+        if s > cursor:
+            gaps.append((cursor, s - timedelta(days=1)))
+        cursor = max(cursor, e + timedelta(days=1))
+    if cursor <= wanted[1]:
+        gaps.append((cursor, wanted[1]))
+    return gaps
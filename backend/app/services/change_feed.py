@@ -0,0 +1,483 @@
+"""
+Change Feed
+Keeps the read models derived from group ledger events (user group lists,
+member counts, member deposits, holdings) up to date in the background
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from botocore.exceptions import ClientError
+from ..config import (
+    CHANGE_FEED_LEASE_SECONDS,
+    CHANGE_FEED_POLL_SECONDS,
+    CHANGE_FEED_RETRY_SECONDS,
+    CHANGE_FEED_SOURCE,
+)
+from ..db import groups, leases, ledger, users
+from ..db.connection import ledger_table, streams
+from . import group_ledger
+
+# Describing a stream is rate limited, so new shards are picked up this often
+_SHARD_REFRESH_SECONDS = 60
+
+
+def _touched_users(event: dict) -> Set[str]:
+    """Users whose groups list may change with an event"""
+    data = event.get("data", {})
+    kind = event["type"]
+    if kind == "group.created":
+        return {data["createdBy"]}
+    if kind in ("member.joined", "member.left"):
+        return {data["userId"]}
+    if kind == "group.imported":
+        return set(data.get("members", []))
+    return set()
+
+
+def project_group(group_id: str, after: Optional[int] = None, apply: bool = True) -> Optional[dict]:
+    """
+    Bring a group's projections up to its newest ledger event
+
+    The group's state is folded from the ledger and its projections set to
+    absolute values, so applying the same events twice changes nothing and
+    any number of new events costs one group write. Users named by events
+    after the checkpoint get the group added to or removed from their
+    groups list according to the member list as read afterwards, which is
+    at least as new as the fold even if another worker projected the group
+    at the same time. The checkpoint (projectedSeq on the group) only
+    moves forward.
+
+    Args:
+        after: Only look at users named by events after this one (the
+            group's checkpoint if None; 0 replays the whole ledger)
+        apply: False to only report what would be written
+
+    A group created before the ledger existed and not imported yet (see
+    scripts/import_group_ledgers.py) has no origin event to fold from, so
+    its new events are applied as changes to the projections stored on
+    the group instead, exactly once, as the write requests used to.
+
+    Returns:
+        dict: {"seq", "values", "added", "removed", "written"}, or None if
+            the group is gone or being deleted (or replayed without an
+            origin event, since its history before the ledger is missing)
+    """
+    checkpoint = groups.get_projection_checkpoint(group_id)
+    if checkpoint is None:
+        return None
+    replay = after is not None
+    after = checkpoint if after is None else after
+    if not replay and ledger.get_head(group_id) <= checkpoint:
+        return {"seq": checkpoint, "values": {}, "added": [], "removed": [], "written": False}
+
+    state = group_ledger.current_state(group_id)
+    if state["createdBy"] is None:
+        return None if replay else _project_changes(group_id, apply)
+
+    touched: Set[str] = set()
+    for event in ledger.read_events(group_id, after=after):
+        if int(event["seq"]) > state["seq"]:
+            # Appended after the fold; projected on the next round
+            break
+        touched |= _touched_users(event)
+
+    members = set(groups.get_current_members(group_id)) if touched else set()
+    result = {
+        "seq": state["seq"],
+        "values": {
+            "memberCount": len(state["members"]),
+            "holdings": state["holdings"],
+            "costBasis": state["costBasis"],
+            "memberDeposits": state.get("memberDeposits", {}),
+        },
+        "added": sorted(touched & members),
+        "removed": sorted(touched - members),
+        "written": False,
+    }
+    if not apply:
+        return result
+
+    _update_users(group_id, result)
+    result["written"] = groups.set_projections(group_id, state["seq"], result["values"], replay=replay)
+    return result
+
+
+def _project_changes(group_id: str, apply: bool) -> Optional[dict]:
+    """
+    Apply a group's events after its checkpoint to the projections stored
+    on it, for groups whose ledger has no origin event
+
+    The write only goes through if the checkpoint hasn't moved since the
+    projections were read, so no event is applied twice; if another
+    worker moved it first, the events after its checkpoint are applied.
+    """
+    while True:
+        result = _apply_changes(group_id, apply)
+        if not result or result["written"] or not result["values"] or not apply:
+            return result
+
+
+def _apply_changes(group_id: str, apply: bool) -> Optional[dict]:
+    stored = groups.get_projections(group_id)
+    if stored is None:
+        return None
+    checkpoint = int(stored.get("projectedSeq", 0))
+    state = group_ledger.initial_state()
+    for key in ("holdings", "costBasis", "memberDeposits"):
+        state[key] = dict(stored.get(key) or {})
+    state["seq"] = checkpoint
+
+    touched: Set[str] = set()
+    for event in ledger.read_events(group_id, after=checkpoint):
+        group_ledger.apply(state, event)
+        touched |= _touched_users(event)
+    if state["seq"] == checkpoint:
+        return {"seq": checkpoint, "values": {}, "added": [], "removed": [], "written": False}
+
+    members = set(groups.get_current_members(group_id))
+    result = {
+        "seq": state["seq"],
+        "values": {
+            "memberCount": len(members),
+            "holdings": state["holdings"],
+            "costBasis": state["costBasis"],
+            "memberDeposits": state["memberDeposits"],
+        },
+        "added": sorted(touched & members),
+        "removed": sorted(touched - members),
+        "written": False,
+    }
+    if not apply:
+        return result
+
+    _update_users(group_id, result)
+    result["written"] = groups.set_projections(group_id, state["seq"], result["values"], previous_seq=checkpoint)
+    return result
+
+
+def _update_users(group_id: str, result: dict):
+    # Users first: those updates are idempotent, so if anything after
+    # them fails the next round simply does them again
+    for user_id in result["added"]:
+        users.add_group_to_user(user_id, group_id)
+    for user_id in result["removed"]:
+        users.remove_group_from_user(user_id, group_id)
+
+
+class _ShardLeases:
+    """
+    Which shards of the ledger's stream this process reads, and the
+    position in each
+
+    A shard is read by one process at a time, the one holding its lease in
+    the Leases table. Its position is stored with the lease once its
+    records are projected, so a restart, or another process or host taking
+    over a lease that wasn't renewed, carries on where the last reader
+    stopped.
+    """
+
+    def __init__(self, lease_seconds: float = CHANGE_FEED_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.owner = leases.new_owner()
+        self.stream_arn: Optional[str] = None
+        self.shard_ids: List[str] = []
+        # Position of each shard held (or found closed): sequenceNumber, closed
+        self.positions: Dict[str, dict] = {}
+        self._renewed_at: Dict[str, float] = {}
+
+    def _lease_id(self, shard_id: str) -> str:
+        # A recreated table has a new stream, with its own shards
+        return f"change-feed:{self.stream_arn}:{shard_id}"
+
+    @property
+    def held(self) -> List[str]:
+        return list(self._renewed_at)
+
+    def keep(self, shard_ids: List[str]):
+        """Forget shards no longer listed (past the stream's 24 hour retention)"""
+        self.shard_ids = shard_ids
+        self.positions = {s: p for s, p in self.positions.items() if s in shard_ids}
+        self._renewed_at = {s: t for s, t in self._renewed_at.items() if s in shard_ids}
+
+    def hold(self, shard_id: str) -> bool:
+        """
+        Whether this process reads the shard, taking its lease if it's free
+
+        Returns:
+            bool: False if another process holds it or the shard is closed
+        """
+        if shard_id in self._renewed_at:
+            return True
+        if self.positions.get(shard_id, {}).get("closed"):
+            return False
+        lease_id = self._lease_id(shard_id)
+        if not leases.acquire(lease_id, self.owner, self.lease_seconds):
+            return False
+        lease = leases.get_lease(lease_id) or {}
+        self.positions[shard_id] = {k: lease[k] for k in ("sequenceNumber", "closed") if k in lease}
+        if lease.get("closed"):
+            leases.release(lease_id, self.owner)
+            return False
+        self._renewed_at[shard_id] = time.monotonic()
+        return True
+
+    def due(self, shard_id: str) -> bool:
+        """The lease should be renewed even without new records"""
+        return time.monotonic() - self._renewed_at.get(shard_id, 0) > self.lease_seconds / 3
+
+    def save(self, shard_id: str) -> bool:
+        """
+        Store the shard's position and renew its lease (releasing it once the shard is closed)
+
+        Returns:
+            bool: False if another process took the lease over
+        """
+        position = self.positions[shard_id]
+        lease_id = self._lease_id(shard_id)
+        if not leases.renew(lease_id, self.owner, self.lease_seconds, progress=position):
+            self._renewed_at.pop(shard_id, None)
+            return False
+        if position.get("closed"):
+            self._renewed_at.pop(shard_id, None)
+            leases.release(lease_id, self.owner)
+        else:
+            self._renewed_at[shard_id] = time.monotonic()
+        return True
+
+    def release_all(self):
+        """Hand every held shard to the next process at once"""
+        for shard_id in self.held:
+            self._renewed_at.pop(shard_id, None)
+            leases.release(self._lease_id(shard_id), self.owner)
+
+
+class ChangeFeed:
+    """
+    Background worker projecting ledger events onto the read models
+
+    Write requests only make their primary write and append its event;
+    this worker derives the rest. It learns which groups have new events
+    from two places:
+    - this process's own appends, which wake it right away
+    - the ledger table's DynamoDB Stream (CHANGE_FEED_SOURCE=stream), for
+      events appended by other processes; each shard is read by whichever
+      process holds its lease, and its position is stored with the lease
+      once its records are projected (see _ShardLeases)
+    With CHANGE_FEED_SOURCE=local (offline runs, or a table without a
+    stream) start() instead compares every group's checkpoint with its
+    ledger to catch up on events appended while the worker was down.
+    A group that fails to project is retried after CHANGE_FEED_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._retry_at: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.source = CHANGE_FEED_SOURCE
+        self._shards = _ShardLeases()
+        self._iterators: Dict[str, Optional[str]] = {}
+        self._shards_listed_at = 0.0
+        self._stats = {"projected": 0, "failed": 0, "streamRecords": 0, "lastProjectedAt": None}
+
+    def start(self):
+        """Start the worker, catching up on events it hasn't projected"""
+        if self._thread and self._thread.is_alive():
+            return
+        ledger.on_append(self.notify)
+        self._stop.clear()
+        if self.source == "stream" and not self._open_stream():
+            self.source = "local"
+        if self.source == "local":
+            threading.Thread(target=self._catch_up, name="change-feed-catch-up", daemon=True).start()
+        self._thread = threading.Thread(target=self._work, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop after the current group; unprojected events are picked up on the next start"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self._shards.release_all()
+        except ClientError as e:
+            print(f"❌ Could not release the change feed's stream shards: {e}")
+
+    def notify(self, group_id: str, seq: int = None):
+        """Mark a group as having new events to project"""
+        with self._lock:
+            self._pending.add(group_id)
+        self._wake.set()
+
+    def status(self) -> dict:
+        """Source, backlog and counters of this worker"""
+        with self._lock:
+            return {
+                "source": self.source,
+                "running": bool(self._thread and self._thread.is_alive()),
+                "pendingGroups": len(self._pending),
+                "retryingGroups": len(self._retry_at),
+                "shards": len(self._shards.held) if self.source == "stream" else None,
+                **self._stats,
+            }
+
+    def _catch_up(self):
+        try:
+            for group_id, projected_seq in groups.scan_projection_checkpoints():
+                if self._stop.is_set():
+                    return
+                if ledger.get_head(group_id) > projected_seq:
+                    self.notify(group_id)
+        except Exception as e:
+            print(f"❌ Change feed could not catch up on unprojected events: {e}")
+
+    def _work(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            self._project_pending()
+            busy = self.source == "stream" and self._poll_stream()
+            if not busy:
+                self._wake.wait(self._next_wait())
+
+    def _next_wait(self) -> float:
+        with self._lock:
+            if self._pending:
+                return 0
+            wait = CHANGE_FEED_POLL_SECONDS if self.source == "stream" else CHANGE_FEED_RETRY_SECONDS
+            if self._retry_at:
+                wait = min(wait, max(0.0, min(self._retry_at.values()) - time.monotonic()))
+            return wait
+
+    def _project_pending(self):
+        now = time.monotonic()
+        with self._lock:
+            for group_id, at in list(self._retry_at.items()):
+                if at <= now:
+                    del self._retry_at[group_id]
+                    self._pending.add(group_id)
+            pending, self._pending = self._pending, set()
+        for group_id in pending:
+            if self._stop.is_set():
+                with self._lock:
+                    self._pending.add(group_id)
+                return
+            self._project(group_id)
+
+    def _project(self, group_id: str) -> bool:
+        try:
+            result = project_group(group_id)
+        except Exception as e:
+            print(f"❌ Failed to project ledger of group {group_id}: {e}")
+            with self._lock:
+                self._stats["failed"] += 1
+                self._retry_at[group_id] = time.monotonic() + CHANGE_FEED_RETRY_SECONDS
+            return False
+        if result and result["written"]:
+            with self._lock:
+                self._stats["projected"] += 1
+                self._stats["lastProjectedAt"] = datetime.utcnow().isoformat()
+        return True
+
+    def _open_stream(self) -> bool:
+        try:
+            stream_arn = ledger_table.latest_stream_arn
+        except ClientError as e:
+            print(f"❌ Could not describe the ledger table's stream: {e}")
+            stream_arn = None
+        if not stream_arn:
+            print("⚠️ Ledger table has no stream; the change feed only sees this process's events")
+            return False
+        self._shards.stream_arn = stream_arn
+        return True
+
+    def _list_shards(self):
+        shard_ids = []
+        describe_kwargs = {"StreamArn": self._shards.stream_arn}
+        while True:
+            description = streams.describe_stream(**describe_kwargs)["StreamDescription"]
+            shard_ids.extend(shard["ShardId"] for shard in description.get("Shards", []))
+            if not description.get("LastEvaluatedShardId"):
+                break
+            describe_kwargs["ExclusiveStartShardId"] = description["LastEvaluatedShardId"]
+        self._shards.keep(shard_ids)
+        self._iterators = {s: self._iterators.get(s) for s in shard_ids}
+        self._shards_listed_at = time.monotonic()
+
+    def _iterator(self, shard_id: str) -> str:
+        position = self._shards.positions[shard_id]
+        iterator_kwargs = {"StreamArn": self._shards.stream_arn, "ShardId": shard_id}
+        if position.get("sequenceNumber"):
+            iterator_kwargs.update(ShardIteratorType="AFTER_SEQUENCE_NUMBER", SequenceNumber=position["sequenceNumber"])
+        else:
+            iterator_kwargs["ShardIteratorType"] = "TRIM_HORIZON"
+        return streams.get_shard_iterator(**iterator_kwargs)["ShardIterator"]
+
+    def _poll_stream(self) -> bool:
+        """Read each open shard this process holds once; True if any records came back"""
+        try:
+            if time.monotonic() - self._shards_listed_at > _SHARD_REFRESH_SECONDS:
+                self._list_shards()
+        except ClientError as e:
+            print(f"❌ Could not list the ledger stream's shards: {e}")
+            return False
+
+        busy = False
+        for shard_id in self._shards.shard_ids:
+            if self._stop.is_set():
+                break
+            try:
+                if not self._shards.hold(shard_id):
+                    continue
+            except ClientError as e:
+                print(f"❌ Could not take the lease of ledger stream shard {shard_id}: {e}")
+                continue
+            position = self._shards.positions[shard_id]
+            try:
+                iterator = self._iterators.get(shard_id) or self._iterator(shard_id)
+                response = streams.get_records(ShardIterator=iterator, Limit=1000)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                self._iterators[shard_id] = None
+                if code == "TrimmedDataAccessException":
+                    # Read from the oldest record still kept; projecting twice is harmless
+                    position.pop("sequenceNumber", None)
+                elif code != "ExpiredIteratorException":
+                    print(f"❌ Could not read ledger stream shard {shard_id}: {e}")
+                continue
+
+            records = response.get("Records", [])
+            group_ids = {
+                r["dynamodb"]["Keys"]["groupID"]["S"] for r in records
+                if r.get("eventName") == "INSERT" and r["dynamodb"]["Keys"]["seq"]["N"] != str(ledger.SNAPSHOT_SEQ)
+            }
+            if not all([self._project(group_id) for group_id in group_ids]):
+                # Read these records again from the checkpoint
+                self._iterators[shard_id] = None
+                continue
+
+            self._iterators[shard_id] = response.get("NextShardIterator")
+            if records:
+                busy = True
+                position["sequenceNumber"] = records[-1]["dynamodb"]["SequenceNumber"]
+                with self._lock:
+                    self._stats["streamRecords"] += len(records)
+            if not self._iterators[shard_id]:
+                position["closed"] = True
+            if records or position.get("closed") or self._shards.due(shard_id):
+                try:
+                    if not self._shards.save(shard_id):
+                        # Its new reader starts from the position it finds stored
+                        print(f"⚠️ Ledger stream shard {shard_id} was taken over by another process")
+                        self._iterators[shard_id] = None
+                except ClientError as e:
+                    print(f"❌ Could not save the position in ledger stream shard {shard_id}: {e}")
+        return busy
+
+
+# Singleton instance
+change_feed = ChangeFeed()
@@ -0,0 +1,126 @@
+"""
+Event Broker
+Publish/subscribe channel for group activity (proposals, votes, status
+changes, deposits, membership) consumed by WebSocket clients
+"""
+import asyncio
+import itertools
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set
+from ..config import EVENT_BROKER, EVENT_STREAM_MAX_PENDING
+
+
+class Subscription:
+    """
+    A bounded event queue owned by one event loop
+
+    If a consumer falls more than max_pending events behind, its queue is
+    replaced by a single {"type": "resync"} event telling the client to
+    refetch, rather than growing without bound.
+    """
+
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.channel = channel
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self._overflowed = False
+
+    def _deliver(self, event: dict):
+        # Runs on self.loop
+        if self._overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "channel": self.channel})
+
+    async def get(self) -> dict:
+        """Wait for the next event"""
+        event = await self.queue.get()
+        if event["type"] == "resync":
+            self._overflowed = False
+        return event
+
+
+class InProcessBroker:
+    """
+    Broker for a single API process
+
+    Events only reach subscribers connected to the same process. Anything
+    with the same publish/subscribe/unsubscribe methods (e.g. backed by
+    Redis pub/sub) can replace it when running several workers.
+    """
+
+    def __init__(self, max_pending: int = EVENT_STREAM_MAX_PENDING):
+        self.max_pending = max_pending
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event: dict):
+        """Deliver an event to every subscriber of a channel (safe from any thread)"""
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel: str) -> Subscription:
+        """Subscribe to a channel (call from the consuming event loop)"""
+        subscription = Subscription(channel, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stop delivering events to a subscription"""
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+
+def _create_broker():
+    if EVENT_BROKER == "memory":
+        return InProcessBroker()
+    raise ValueError(f"Unknown EVENT_BROKER: {EVENT_BROKER}")
+
+
+# Singleton instance
+event_broker = _create_broker()
+
+_sequence = itertools.count(1)
+
+
+def group_channel(group_id: str) -> str:
+    return f"group:{group_id}"
+
+
+def publish_group_event(group_id: str, event_type: str, data: Optional[dict] = None):
+    """
+    Publish an event to everyone watching a group
+
+    Args:
+        group_id: ID of the group
+        event_type: e.g. "transaction.proposed", "transaction.voted"
+        data: JSON-serializable event payload
+    """
+    try:
+        event_broker.publish(group_channel(group_id), {
+            "type": event_type,
+            "groupId": group_id,
+            "seq": next(_sequence),
+            "data": data or {},
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+    except Exception as e:
+        # Events are best-effort; never fail the write that produced them
+        print(f"❌ Failed to publish {event_type} for group {group_id}: {e}")
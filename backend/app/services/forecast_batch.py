@@ -0,0 +1,165 @@
+"""
+Forecast Batch
+Nightly job fitting every group's savings trend in one vectorized pass
+over all deposits, stored on the group as savingsForecast
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from ..config import FORECAST_SCAN_SEGMENTS, FORECAST_WRITE_WORKERS
+from ..db import groups, transactions
+
+_SECONDS_PER_DAY = 86400.0
+
+
+class DepositColumns(NamedTuple):
+    group_ids: np.ndarray  # object array of groupID strings
+    times: np.ndarray      # datetime64[us]
+    amounts: np.ndarray    # float64
+
+
+def _read_segment(segment: int, total_segments: int) -> DepositColumns:
+    """Scan one segment, converting each page to arrays as it arrives"""
+    ids, times, amounts = [], [], []
+    for page in transactions.scan_deposit_pages(segment, total_segments):
+        if not page:
+            continue
+        ids.append(np.array([item["groupID"] for item in page], dtype=object))
+        times.append(np.array([item["createdAt"] for item in page], dtype="datetime64[us]"))
+        amounts.append(np.array([float(item["amount"]) for item in page], dtype=np.float64))
+    return _concat([DepositColumns(i, t, a) for i, t, a in zip(ids, times, amounts)])
+
+
+def _concat(parts: List[DepositColumns]) -> DepositColumns:
+    if not parts:
+        return DepositColumns(
+            np.empty(0, dtype=object), np.empty(0, dtype="datetime64[us]"), np.empty(0)
+        )
+    return DepositColumns(*(np.concatenate(column) for column in zip(*parts)))
+
+
+def read_deposits(total_segments: int = FORECAST_SCAN_SEGMENTS) -> DepositColumns:
+    """Read every executed deposit with a parallel segmented scan"""
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        parts = list(pool.map(lambda s: _read_segment(s, total_segments), range(total_segments)))
+    return _concat(parts)
+
+
+class TrendFit(NamedTuple):
+    group_ids: np.ndarray  # unique groupIDs
+    n: np.ndarray
+    origin: np.ndarray     # datetime64[us] of each group's first deposit
+    total: np.ndarray      # total deposited
+    slope: np.ndarray      # dollars per day, NaN with fewer than two deposit times
+    intercept: np.ndarray
+
+
+def fit_trends(deposits: DepositColumns) -> TrendFit:
+    """
+    Least-squares line of cumulative deposits over time for every group
+
+    Matches the per-group fit in savings_forecast: x is days since the
+    group's first deposit and y the total deposited so far. Sums are
+    taken around each group's mean so large totals don't lose precision.
+    """
+    if not len(deposits.amounts):
+        empty = np.empty(0)
+        return TrendFit(np.empty(0, dtype=object), np.empty(0, dtype=np.int64),
+                        np.empty(0, dtype="datetime64[us]"), empty, empty, empty)
+
+    group_ids, codes = np.unique(deposits.group_ids, return_inverse=True)
+    n_groups = len(group_ids)
+    order = np.lexsort((deposits.times, codes))
+    codes = codes[order]
+    times = deposits.times[order]
+    amounts = deposits.amounts[order]
+
+    n = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+
+    # Cumulative deposits, restarting at each group
+    running = np.cumsum(amounts)
+    before_group = np.where(starts > 0, running[starts - 1], 0.0)
+    y = running - before_group[codes]
+
+    origin = times[starts]
+    x = (times - origin[codes]) / np.timedelta64(1, "s") / _SECONDS_PER_DAY
+
+    mean_x = np.bincount(codes, weights=x, minlength=n_groups) / np.maximum(n, 1)
+    mean_y = np.bincount(codes, weights=y, minlength=n_groups) / np.maximum(n, 1)
+    dx = x - mean_x[codes]
+    dy = y - mean_y[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+
+    slope = np.divide(sxy, sxx, out=np.full(n_groups, np.nan), where=(n >= 2) & (sxx > 0))
+    intercept = mean_y - slope * mean_x
+    total = y[np.cumsum(n) - 1]
+    return TrendFit(group_ids, n, origin, total, slope, intercept)
+
+
+def _completion_dates(fit: TrendFit, goals: np.ndarray) -> np.ndarray:
+    """Projected completion time per group (NaT where there is no positive trend)"""
+    days = np.divide(goals - fit.intercept, fit.slope, out=np.full(len(goals), np.nan), where=fit.slope > 0)
+    reached = fit.total >= goals
+    days = np.where(reached, 0.0, days)
+    valid = np.isfinite(days)
+    offsets = np.where(valid, days * _SECONDS_PER_DAY * 1e6, 0).astype("timedelta64[us]")
+    return np.where(valid, fit.origin + offsets, np.datetime64("NaT"))
+
+
+def _money(value: float) -> Decimal:
+    return Decimal(str(round(float(value), 2)))
+
+
+def run_forecast_batch(now: Optional[datetime] = None) -> int:
+    """
+    Refit every group's savings trend and store the forecasts
+
+    One segmented scan of deposits, one vectorized fit for all groups,
+    then one write per group that has a savings goal.
+
+    Returns:
+        int: Number of forecasts written
+    """
+    now = now or datetime.utcnow()
+    goals_by_group = groups.get_savings_goals()
+    if not goals_by_group:
+        return 0
+    fit = fit_trends(read_deposits())
+    row = {g: i for i, g in enumerate(fit.group_ids)}
+
+    goals = np.array([float(goals_by_group.get(g, {}).get("amount", np.nan)) for g in fit.group_ids])
+    completion = _completion_dates(fit, goals)
+
+    forecasts: Dict[str, dict] = {}
+    for group_id in goals_by_group:
+        i = row.get(group_id)
+        if i is None:
+            forecasts[group_id] = {"deposits": 0, "totalDeposited": Decimal("0"), "computedAt": now.isoformat()}
+            continue
+        forecast = {
+            "deposits": int(fit.n[i]),
+            "totalDeposited": _money(fit.total[i]),
+            "origin": str(fit.origin[i]),
+            "computedAt": now.isoformat(),
+        }
+        if np.isfinite(fit.slope[i]):
+            forecast["rate"] = Decimal(str(float(fit.slope[i])))
+            forecast["intercept"] = Decimal(str(float(fit.intercept[i])))
+        if not np.isnat(completion[i]):
+            forecast["predictedCompletionDate"] = str(completion[i].astype("datetime64[D]"))
+        forecasts[group_id] = forecast
+
+    def write(item):
+        try:
+            groups.set_savings_forecast(*item)
+        except Exception as e:
+            print(f"❌ Failed to store forecast for group {item[0]}: {e}")
+
+    with ThreadPoolExecutor(max_workers=FORECAST_WRITE_WORKERS) as pool:
+        list(pool.map(write, forecasts.items()))
+    print(f"🔮 Forecast {len(forecasts)} savings goals from {int(fit.n.sum())} deposits")
+    return len(forecasts)
@@ -0,0 +1,241 @@
+"""
+Group Deletion
+Deletes a group's dependent data in the background after the group is
+marked as deleting, keeping progress on the group so it can resume
+"""
+import queue
+import threading
+from datetime import datetime
+from typing import List, Optional, Set
+from ..config import GROUP_DELETE_CHUNK_PAUSE_SECONDS, GROUP_DELETE_CHUNK_SIZE, GROUP_DELETE_RETRY_SECONDS
+from ..db import groups, invites, ledger, snapshots, transactions, users
+from . import group_ledger
+from .event_broker import publish_group_event
+from .order_queue import order_queue
+
+# Cascade stages, in order. Members go first so nobody can add data to
+# the group while the rest is deleted, and broker orders still being
+# worked on must settle before their transactions can go.
+STAGES = ["members", "orders", "transactions", "invites", "snapshots", "ledger", "group"]
+
+
+def _chunks(items: List, size: int = GROUP_DELETE_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def new_progress(now: Optional[datetime] = None) -> dict:
+    """Progress record of a cascade that hasn't started yet"""
+    now = (now or datetime.utcnow()).isoformat()
+    return {
+        "stage": STAGES[0],
+        "startedAt": now,
+        "updatedAt": now,
+        "membersRemoved": 0,
+        "transactionsDeleted": 0,
+        "invitesDeleted": 0,
+        "snapshotsDeleted": 0,
+        "ledgerItemsDeleted": 0,
+    }
+
+
+class GroupDeletion:
+    """
+    Background worker running group deletion cascades one group at a time
+
+    Each stage works in chunks of GROUP_DELETE_CHUNK_SIZE items with a
+    pause between chunks, so a large group doesn't take the tables' write
+    capacity from live traffic. Progress, including the transaction scan
+    position, is written to the group after every chunk. A cascade that
+    fails, or is waiting for open orders, is retried after
+    GROUP_DELETE_RETRY_SECONDS; one interrupted by a restart is picked up
+    again by start().
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._queued: Set[str] = set()
+        self._timers: Set[threading.Timer] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the worker and resume cascades left unfinished by a previous run"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._work, name="group-deletion", daemon=True)
+        self._thread.start()
+        try:
+            for group_id in groups.get_deleting_groups():
+                self.enqueue(group_id)
+        except Exception as e:
+            print(f"❌ Could not resume group deletions: {e}")
+
+    def stop(self):
+        """Stop after the current chunk; the cascade resumes on the next start"""
+        self._stop.set()
+        with self._lock:
+            for timer in self._timers:
+                timer.cancel()
+            self._timers.clear()
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def enqueue(self, group_id: str) -> bool:
+        """
+        Queue a group's cascade (the group must already be marked deleting)
+
+        Returns:
+            bool: False if the group is already queued
+        """
+        with self._lock:
+            if group_id in self._queued:
+                return False
+            self._queued.add(group_id)
+        self._queue.put(group_id)
+        return True
+
+    def _retry_later(self, group_id: str):
+        def requeue():
+            with self._lock:
+                self._timers.discard(timer)
+            self.enqueue(group_id)
+
+        timer = threading.Timer(GROUP_DELETE_RETRY_SECONDS, requeue)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def _work(self):
+        while not self._stop.is_set():
+            group_id = self._queue.get()
+            if group_id is None:
+                return
+            with self._lock:
+                self._queued.discard(group_id)
+            try:
+                self.run(group_id)
+            except Exception as e:
+                print(f"❌ Deleting group {group_id} failed, will retry: {e}")
+                self._retry_later(group_id)
+
+    def _pause(self) -> bool:
+        """Wait between chunks; True if the worker is stopping"""
+        return self._stop.wait(GROUP_DELETE_CHUNK_PAUSE_SECONDS)
+
+    def _save(self, group_id: str, progress: dict):
+        progress["updatedAt"] = datetime.utcnow().isoformat()
+        groups.set_deletion_progress(group_id, progress)
+
+    def run(self, group_id: str) -> bool:
+        """
+        Run (or resume) a group's cascade in the calling thread
+
+        Returns:
+            bool: True once the group is gone, False if stopped part way
+                or waiting for open orders
+        """
+        group = groups.get_group(group_id)
+        if not group or group.get("status") != "deleting":
+            return True
+        progress = {**new_progress(), **group.get("deletion", {})}
+
+        for stage in STAGES[STAGES.index(progress["stage"]):]:
+            progress["stage"] = stage
+            self._save(group_id, progress)
+            if not getattr(self, f"_delete_{stage}")(group, progress):
+                return False
+        print(
+            f"🗑️ Deleted group {group_id}: {progress['transactionsDeleted']} transactions, "
+            f"{progress['invitesDeleted']} invites, {progress['snapshotsDeleted']} snapshots, "
+            f"{progress['ledgerItemsDeleted']} ledger items"
+        )
+        return True
+
+    def _delete_members(self, group: dict, progress: dict) -> bool:
+        group_id = group["groupID"]
+        for chunk in _chunks(list(group.get("members", []))):
+            progress["membersRemoved"] += users.remove_group_from_users(chunk, group_id)
+            self._save(group_id, progress)
+            if self._pause():
+                return False
+        groups.clear_members(group_id)
+        return True
+
+    def _delete_orders(self, group: dict, progress: dict) -> bool:
+        """Wait until no trade of the group is waiting for a broker fill"""
+        group_id = group["groupID"]
+        pending = group_ledger.current_state(group_id)["pendingFills"]
+        if not pending:
+            return True
+        # The order queue fills them, or cancels and refunds them once
+        # out of attempts; make sure it is working on each
+        for transaction_id in pending:
+            order_queue.enqueue(transaction_id)
+        print(f"⏳ Waiting for {len(pending)} open orders before deleting group {group_id}")
+        self._retry_later(group_id)
+        return False
+
+    def _delete_transactions(self, group: dict, progress: dict) -> bool:
+        group_id = group["groupID"]
+        pages = transactions.scan_group_transaction_ids(group_id, progress.get("transactionScanKey"))
+        for transaction_ids, next_key in pages:
+            for chunk in _chunks(transaction_ids):
+                transactions.delete_transactions(chunk)
+                progress["transactionsDeleted"] += len(chunk)
+                if self._pause():
+                    self._save(group_id, progress)
+                    return False
+            # A page is only passed once all of it is deleted, so a resumed
+            # scan never skips undeleted items
+            if next_key:
+                progress["transactionScanKey"] = next_key
+            else:
+                progress.pop("transactionScanKey", None)
+            self._save(group_id, progress)
+        return True
+
+    def _delete_invites(self, group: dict, progress: dict) -> bool:
+        group_id = group["groupID"]
+        for chunk in _chunks(invites.get_group_invite_ids(group_id)):
+            invites.delete_invites(chunk)
+            progress["invitesDeleted"] += len(chunk)
+            self._save(group_id, progress)
+            if self._pause():
+                return False
+        return True
+
+    def _delete_snapshots(self, group: dict, progress: dict) -> bool:
+        group_id = group["groupID"]
+        for chunk in _chunks(snapshots.get_snapshot_dates(group_id)):
+            snapshots.delete_snapshots(group_id, chunk)
+            progress["snapshotsDeleted"] += len(chunk)
+            self._save(group_id, progress)
+            if self._pause():
+                return False
+        return True
+
+    def _delete_ledger(self, group: dict, progress: dict) -> bool:
+        group_id = group["groupID"]
+        while True:
+            deleted = ledger.delete_ledger(group_id, limit=GROUP_DELETE_CHUNK_SIZE)
+            if not deleted:
+                return True
+            progress["ledgerItemsDeleted"] += deleted
+            self._save(group_id, progress)
+            if self._pause():
+                return False
+
+    def _delete_group(self, group: dict, progress: dict) -> bool:
+        groups.delete_group(group["groupID"])
+        publish_group_event(group["groupID"], "group.deleted")
+        return True
+
+
+# Singleton instance
+group_deletion = GroupDeletion()
@@ -0,0 +1,135 @@
+"""
+Group Ledger
+Folds a group's ordered events into its state, rebuilding from the latest
+snapshot plus the events after it
+"""
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+from ..config import LEDGER_SNAPSHOT_EVERY
+from ..db import ledger
+
+_ZERO = Decimal("0")
+
+
+def initial_state() -> dict:
+    return {
+        "seq": 0,
+        "name": None,
+        "createdBy": None,
+        "members": [],
+        "balance": _ZERO,
+        "investedAmount": _ZERO,
+        "holdings": {},
+        "costBasis": {},
+        # Total each user has deposited
+        "memberDeposits": {},
+        # Proposals not yet executed or rejected, by transaction ID
+        "openTransactions": {},
+        "pendingFills": [],
+    }
+
+
+def _add(mapping: Dict, key: str, amount: Decimal):
+    mapping[key] = mapping.get(key, _ZERO) + amount
+
+
+def apply(state: dict, event: dict) -> dict:
+    """
+    Apply one event to a group's state (in place) and return it
+
+    Events must be applied in sequence order; unknown event types only
+    advance the sequence number, so older code can fold newer logs.
+    """
+    data = event.get("data", {})
+    kind = event["type"]
+    transaction_id = data.get("transactionId")
+    open_transactions = state["openTransactions"]
+
+    if kind == "group.created":
+        state.update(name=data["name"], createdBy=data["createdBy"], members=[data["createdBy"]])
+    elif kind == "group.imported":
+        state.update({k: v for k, v in data.items() if k in state and k != "seq"})
+    elif kind == "member.joined":
+        if data["userId"] not in state["members"]:
+            state["members"].append(data["userId"])
+    elif kind == "member.left":
+        if data["userId"] in state["members"]:
+            state["members"].remove(data["userId"])
+    elif kind == "deposit.made":
+        amount = Decimal(str(data["amount"]))
+        state["balance"] += amount
+        # Snapshots taken before memberDeposits existed don't have it
+        _add(state.setdefault("memberDeposits", {}), event["actor"], amount)
+    elif kind == "transaction.proposed":
+        open_transactions[transaction_id] = {
+            "type": data["transactionType"],
+            "amount": Decimal(str(data["amount"])),
+            "status": "pending",
+            "votes": {},
+        }
+    elif kind == "vote.cast":
+        if transaction_id in open_transactions:
+            open_transactions[transaction_id]["votes"][event["actor"]] = data["vote"]
+    elif kind == "transaction.approved":
+        if transaction_id in open_transactions:
+            open_transactions[transaction_id]["status"] = "approved"
+    elif kind == "transaction.rejected":
+        open_transactions.pop(transaction_id, None)
+    elif kind == "transaction.executed":
+        open_transactions.pop(transaction_id, None)
+        amount = Decimal(str(data["amount"]))
+        state["balance"] -= amount
+        if data["transactionType"] == "investment":
+            state["investedAmount"] += amount
+        if data.get("pendingFill"):
+            state["pendingFills"].append(transaction_id)
+    elif kind == "order.filled":
+        adjustment = Decimal(str(data["adjustment"]))
+        state["balance"] -= adjustment
+        state["investedAmount"] += adjustment
+        _add(state["holdings"], data["symbol"], Decimal(str(data["quantity"])))
+        _add(state["costBasis"], data["symbol"], Decimal(str(data["total"])))
+        if transaction_id in state["pendingFills"]:
+            state["pendingFills"].remove(transaction_id)
+    elif kind == "order.failed":
+        amount = Decimal(str(data["amount"]))
+        state["balance"] += amount
+        state["investedAmount"] -= amount
+        if transaction_id in state["pendingFills"]:
+            state["pendingFills"].remove(transaction_id)
+
+    state["seq"] = int(event["seq"])
+    return state
+
+
+def fold(events: Iterable[dict], state: Optional[dict] = None) -> dict:
+    """Apply events in order to a state (a fresh group if None)"""
+    state = state if state is not None else initial_state()
+    for event in events:
+        apply(state, event)
+    return state
+
+
+def current_state(group_id: str) -> dict:
+    """
+    A group's state as of its newest event
+
+    Reads the latest snapshot and folds only the events after it, so the
+    cost grows with the tail, not with the group's whole history. When
+    the tail has reached LEDGER_SNAPSHOT_EVERY events, the result is
+    stored as the new snapshot.
+    """
+    snapshot = ledger.get_snapshot(group_id)
+    if snapshot:
+        base = int(snapshot["snapshotSeq"])
+        state = fold(ledger.read_events(group_id, after=base), snapshot["state"])
+    else:
+        base = 0
+        state = fold(ledger.read_events(group_id))
+    if state["seq"] - base >= LEDGER_SNAPSHOT_EVERY:
+        try:
+            ledger.put_snapshot(group_id, state["seq"], state)
+        except Exception as e:
+            # Only costs the next read a longer tail
+            print(f"❌ Failed to snapshot ledger of group {group_id}: {e}")
+    return state
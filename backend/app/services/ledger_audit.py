@@ -0,0 +1,206 @@
+"""
+Ledger Audit
+Reconciles each group's balance and investedAmount with what its group
+ledger implies (from its opening balance, for groups imported into the
+ledger), folding only the events appended since the group's last audit
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+from ..config import LEDGER_AUDIT_SEGMENTS, LEDGER_AUDIT_WRITE_WORKERS
+from ..db import groups, ledger
+from . import group_ledger
+
+_TOLERANCE = Decimal("0.005")
+ORIGIN_TYPES = ("group.created", "group.imported")
+
+
+class GroupLedger:
+    """
+    What the audit knows about one group
+
+    Money that reached a group before deposits were recorded in the ledger
+    has no events to fold, so a group imported into the group ledger starts
+    from the balances in its group.imported event and folds only what
+    happened after it. A group created with a ledger starts from zero. So
+    does one not imported yet, but its history may be incomplete, so it is
+    never repaired.
+    """
+
+    __slots__ = ("group_id", "previous_watermark", "watermark", "folded", "observed", "discrepancy", "origin")
+
+    def __init__(self, item: dict):
+        audit = item.get("ledgerAudit") or {}
+        self.group_id = item["groupID"]
+        # Sequence number of the last event in the folded totals (audits
+        # from before the audit read the ledger stored a time instead)
+        self.previous_watermark = audit.get("watermark")
+        self.watermark = 0
+        self.folded = (Decimal(str(audit.get("balance", 0))), Decimal(str(audit.get("investedAmount", 0))))
+        self.origin = audit.get("origin")
+        self.observed = (
+            Decimal(str(item.get("balance", 0))), Decimal(str(item.get("investedAmount", 0)))
+        )
+        self.discrepancy = audit.get("discrepancy")
+
+    def fold(self, full: bool) -> int:
+        """
+        Fold the group's new ledger events into its totals
+
+        Continues from the previous audit's watermark; the first audit of a
+        group (and a full one) starts from the ledger's state snapshot.
+
+        Returns:
+            int: Number of events folded
+        """
+        state = group_ledger.initial_state()
+        if full or not isinstance(self.previous_watermark, Decimal):
+            snapshot = ledger.get_snapshot(self.group_id)
+            if snapshot:
+                state = snapshot["state"]
+                origin = ledger.get_origin(self.group_id)
+                self.origin = origin["type"] if origin else None
+            else:
+                self.origin = None
+            state["seq"] = int(snapshot["snapshotSeq"]) if snapshot else 0
+        else:
+            state.update(
+                seq=int(self.previous_watermark), balance=self.folded[0], investedAmount=self.folded[1]
+            )
+
+        events = 0
+        for event in ledger.read_events(self.group_id, after=state["seq"]):
+            group_ledger.apply(state, event)
+            if event["type"] == "group.imported" or (event["type"] == "group.created" and event["seq"] == 1):
+                self.origin = event["type"]
+            events += 1
+        self.watermark = state["seq"]
+        self.folded = (Decimal(str(state["balance"])), Decimal(str(state["investedAmount"])))
+        return events
+
+
+def _audit_segment(segment: int, total_segments: int, full: bool) -> Tuple[Dict[str, GroupLedger], int]:
+    """
+    Read one segment's groups and fold each one's new ledger events
+
+    Returns:
+        tuple: ({groupID: GroupLedger}, events folded)
+    """
+    ledgers = {}
+    events = 0
+    for page in groups.scan_ledger_pages(segment, total_segments):
+        for item in page:
+            if item.get("status") != "deleting":
+                group = GroupLedger(item)
+                events += group.fold(full)
+                ledgers[item["groupID"]] = group
+    return ledgers, events
+
+
+def run_ledger_audit(repair: bool = False, full: bool = False, now: Optional[datetime] = None) -> dict:
+    """
+    Check every group's balances against its group ledger
+
+    Groups are read with a parallel scan, and each segment queries the
+    ledger of each of its groups for the events after the group's
+    watermark, so a run reads only what was appended since the last one.
+    Each group keeps its folded totals and the sequence number they reach
+    in ledgerAudit. A group that moved money while the audit ran is
+    rechecked by the next run instead of being reported.
+
+    Args:
+        repair: Set balance and investedAmount to the expected values for
+            groups where this run and the previous one found the same
+            discrepancy (a request caught between updating the balance and
+            recording its event only shows up once). Groups not yet
+            imported into the group ledger are only reported.
+        full: Ignore the watermarks and refold every group from its
+            ledger snapshot
+
+    Returns:
+        dict: Counts of groups, events folded, mismatches and repairs
+    """
+    now = now or datetime.utcnow()
+    total_segments = LEDGER_AUDIT_SEGMENTS
+
+    ledgers: Dict[str, GroupLedger] = {}
+    events = 0
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        for part, segment_events in pool.map(
+            lambda s: _audit_segment(s, total_segments, full), range(total_segments)
+        ):
+            ledgers.update(part)
+            events += segment_events
+
+    suspects = [
+        group_id for group_id, group in ledgers.items()
+        if any(abs(o - e) > _TOLERANCE for o, e in zip(group.observed, group.folded))
+    ]
+
+    # A balance that changed after the group was read may already be in
+    # the folded events, so it can't be compared with what the scan saw
+    current = {
+        g["groupID"]: (Decimal(str(g.get("balance", 0))), Decimal(str(g.get("investedAmount", 0))))
+        for g in groups.get_groups(suspects, ["balance", "investedAmount"])
+    } if suspects else {}
+    mismatched = {g for g in suspects if current.get(g) == ledgers[g].observed}
+    changed = len(suspects) - len(mismatched)
+
+    checked_at = now.isoformat()
+
+    def write(group: GroupLedger) -> str:
+        group_id = group.group_id
+        audit = {
+            "watermark": group.watermark,
+            "balance": group.folded[0],
+            "investedAmount": group.folded[1],
+            "checkedAt": checked_at,
+        }
+        if group.origin:
+            audit["origin"] = group.origin
+        fix = None
+        if group_id in mismatched:
+            (balance, invested), (observed_balance, observed_invested) = group.folded, group.observed
+            audit["discrepancy"] = {
+                "balance": observed_balance - balance,
+                "investedAmount": observed_invested - invested,
+            }
+            print(
+                f"❗ Group {group_id}: balance {observed_balance} (expected {balance}), "
+                f"investedAmount {observed_invested} (expected {invested})"
+            )
+            if not group.origin:
+                # History from before deposits were recorded is missing
+                print(f"   Group {group_id} predates recorded deposits; import its ledger to repair it")
+            elif repair and group.discrepancy == audit["discrepancy"]:
+                fix = (balance, invested, observed_balance, observed_invested)
+        try:
+            if fix:
+                repaired = {k: v for k, v in audit.items() if k != "discrepancy"}
+                if groups.set_ledger_audit(group_id, repaired, group.previous_watermark, fix):
+                    return "repaired"
+                audit.pop("discrepancy")  # the balances moved; recheck next run
+            if groups.set_ledger_audit(group_id, audit, group.previous_watermark):
+                return "written"
+            return "skipped"
+        except Exception as e:
+            print(f"❌ Failed to store ledger audit for group {group_id}: {e}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=LEDGER_AUDIT_WRITE_WORKERS) as pool:
+        outcomes = list(pool.map(write, ledgers.values()))
+
+    report = {
+        "groups": len(ledgers),
+        "events": events,
+        "mismatched": len(mismatched),
+        "repaired": outcomes.count("repaired"),
+        "notRepairable": sum(1 for g in mismatched if not ledgers[g].origin),
+        "changedDuringAudit": changed,
+    }
+    print(
+        f"🧾 Audited {report['groups']} groups ({events} new ledger events): "
+        f"{report['mismatched']} mismatched, {report['repaired']} repaired"
+    )
+    return report
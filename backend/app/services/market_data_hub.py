@@ -0,0 +1,145 @@
+"""
+Market Data Hub
+Refreshes quotes for the whole catalog in the background so routes can
+read prices from memory instead of calling the market data API
+"""
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from ..config import MARKET_DATA_REFRESH_SECONDS
+from .alpaca_service import alpaca_service
+from .symbol_catalog import symbol_catalog
+
+
+class MarketSnapshot(NamedTuple):
+    quotes: Dict[str, Dict]
+    updated_at: Optional[datetime]
+
+
+class MarketDataHub:
+    """
+    Holds one consistent snapshot of quotes for every tracked symbol
+
+    Tracked symbols are every symbol in a catalog category plus any other
+    catalog symbol registered with track() (e.g. positions a group holds),
+    so the set is bounded by the catalog. A background thread refreshes
+    them all in one batched call per interval (a single upstream request
+    with market data API keys) and swaps the snapshot in atomically, so
+    readers never see a half-updated set.
+    """
+
+    def __init__(self, refresh_seconds: float = MARKET_DATA_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._symbols = set(symbol_catalog.listed_symbols())
+        self._snapshot = MarketSnapshot({}, None)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[MarketSnapshot], None]] = []
+
+    def start(self):
+        """
+        Start the background refresh thread
+
+        The first snapshot is loaded on that thread so startup doesn't wait
+        for it; a read before then loads it synchronously.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-data-hub", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.refresh_seconds + 1)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Market data refresh failed: {e}")
+            if self._stop.wait(self.refresh_seconds):
+                return
+
+    def add_listener(self, listener: Callable[[MarketSnapshot], None]):
+        """
+        Call listener with each new snapshot
+
+        Listeners run on the refresh thread and must not block.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[MarketSnapshot], None]):
+        """Stop calling a listener"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def track(self, symbols: Iterable[str]):
+        """
+        Add symbols to the refresh set
+
+        New symbols are fetched right away so the caller can read them
+        immediately. Symbols not in the catalog, or that upstream doesn't
+        know, are not tracked.
+        """
+        symbols = [s.upper() for s in symbols if s in symbol_catalog]
+        with self._lock:
+            new_symbols = [s for s in dict.fromkeys(symbols) if s not in self._symbols]
+        if not new_symbols:
+            return
+        quotes = alpaca_service.get_multiple_stock_info(new_symbols)
+        with self._lock:
+            self._symbols.update(quotes)
+        self._publish(quotes)
+
+    def refresh(self):
+        """Fetch quotes for every tracked symbol and publish a new snapshot"""
+        with self._lock:
+            symbols = sorted(self._symbols)
+        quotes = alpaca_service.get_multiple_stock_info(symbols)
+        if quotes:
+            self._publish(quotes, datetime.utcnow())
+
+    def _publish(self, quotes: Dict[str, Dict], updated_at: Optional[datetime] = None):
+        # Keep the last known quote for any symbol this batch missed
+        with self._lock:
+            merged = dict(self._snapshot.quotes)
+            merged.update(quotes)
+            self._snapshot = MarketSnapshot(merged, updated_at or self._snapshot.updated_at or datetime.utcnow())
+            snapshot = self._snapshot
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"❌ Market data listener failed: {e}")
+
+    def snapshot(self) -> MarketSnapshot:
+        """Get the current snapshot, loading one synchronously if none exists yet"""
+        if self._snapshot.updated_at is None:
+            self.refresh()
+        return self._snapshot
+
+    def get_quote(self, symbol: str) -> Optional[Dict]:
+        """Get the latest quote for a symbol (None if it isn't in the catalog)"""
+        return self.get_quotes([symbol]).get(symbol)
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Get the latest quotes for several symbols, keyed as requested"""
+        quotes = self.snapshot().quotes
+        missing = [s for s in symbols if s.upper() not in quotes]
+        if missing:
+            self.track(missing)
+            quotes = self._snapshot.quotes
+        return {s: quotes[s.upper()] for s in symbols if s.upper() in quotes}
+
+
+# Singleton instance
+market_data_hub = MarketDataHub()
@@ -0,0 +1,345 @@
+"""
+Market Simulator
+Generates seedable, moving prices for the whole catalog at once using
+geometric Brownian motion, so the app works without a market data feed
+"""
+import threading
+import time
+import zlib
+from datetime import date, datetime, time as clock_time, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ..config import MARKET_SIM_SEED, MARKET_SIM_TICK_SECONDS, MARKET_SIM_HISTORY_DAYS
+
+try:
+    from zoneinfo import ZoneInfo
+    EXCHANGE_TZ = ZoneInfo("America/New_York")
+except Exception:  # no tz database: Eastern Standard Time all year
+    EXCHANGE_TZ = timezone(timedelta(hours=-5))
+
+TRADING_DAYS_PER_YEAR = 252
+SESSION_OPEN = clock_time(9, 30)
+SESSION_SECONDS = 23400  # 6.5 hour trading session
+# Business day prices are anchored to; each symbol trades near its base price here
+ANCHOR_DATE = date(2025, 1, 1)
+
+# Noise streams per symbol
+_RETURNS, _HIGHS, _LOWS, _VOLUMES, _INTRADAY = range(1, 6)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _symbol_key(symbol: str) -> int:
+    return zlib.crc32(symbol.encode())
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, elementwise over uint64"""
+    with np.errstate(over="ignore"):
+        x = x + _GOLDEN
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def _normals(keys: np.ndarray, *counters) -> np.ndarray:
+    """
+    Standard normal draws hashed from per-symbol keys and counters
+
+    Each draw depends only on its symbol's key and the counters (which
+    broadcast against keys), so any day or tick is drawn directly, for
+    all symbols in one vectorized call.
+    """
+    h = keys
+    for counter in counters:
+        h = _mix(h ^ np.asarray(counter, dtype=np.int64).astype(np.uint64))
+    u1 = ((_mix(h) >> np.uint64(11)) + np.uint64(1)) * 2.0 ** -53  # (0, 1]
+    u2 = (_mix(h ^ _GOLDEN) >> np.uint64(11)) * 2.0 ** -53
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def _day_index(d: date) -> int:
+    """Business days from ANCHOR_DATE to d (negative before it); weekends count as the next business day"""
+    return int(np.busday_count(ANCHOR_DATE, d)) if d >= ANCHOR_DATE else -int(np.busday_count(d, ANCHOR_DATE))
+
+
+def _day_date(index: int) -> date:
+    return np.busday_offset(np.datetime64(ANCHOR_DATE), index, roll="forward").astype(date)
+
+
+class MarketSimulator:
+    """
+    Vectorized GBM price simulator tied to the real calendar
+
+    Every symbol gets its own drift and volatility derived from the seed and
+    the symbol name, and every random draw is derived from (seed, symbol,
+    business day), so all processes with the same seed see the same prices
+    for the same symbol at the same time, and history doesn't depend on
+    when a process started or which other symbols it simulates. Each
+    weekday is one trading day over the exchange's regular session. During
+    the session the price moves every tick_seconds along a Brownian bridge
+    from the previous close to that day's close; outside it the last close
+    is quoted.
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str] = (),
+        seed: int = MARKET_SIM_SEED,
+        tick_seconds: float = MARKET_SIM_TICK_SECONDS,
+        history_days: int = MARKET_SIM_HISTORY_DAYS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.seed = seed
+        self.tick_seconds = tick_seconds
+        self.history_days = history_days
+        self.clock = clock
+        self.ticks_per_day = max(1, int(round(SESSION_SECONDS / tick_seconds)))
+
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._symbols: List[str] = []
+
+        # Per-symbol parameters, one slot per symbol
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._mu = np.empty(0)
+        self._sigma = np.empty(0)
+        self._base_price = np.empty(0)
+        self._base_volume = np.empty(0)
+
+        # Daily history for business days first_day..last_day (indexes from
+        # the anchor), shape (days, symbols), rebuilt when the day rolls
+        self._first_day: Optional[int] = None
+        self._last_day: Optional[int] = None
+        self._open = self._high = self._low = self._close = self._volume = np.empty((0, 0))
+        # Bridge offsets of every symbol at the last tick served, as (day, tick, offsets)
+        self._bridge: Optional[Tuple[int, int, np.ndarray]] = None
+        self.add_symbols(symbols)
+
+    # ---------- symbols ----------
+
+    def add_symbols(self, symbols: Iterable[str]):
+        """Add symbols (case-insensitive) to the simulation"""
+        with self._lock:
+            new = [s for s in dict.fromkeys(s.upper() for s in symbols) if s not in self._index]
+            if not new:
+                return
+            n = len(new)
+
+            mu = np.empty(n)
+            sigma = np.empty(n)
+            base_price = np.empty(n)
+            base_volume = np.empty(n)
+            for i, symbol in enumerate(new):
+                params = np.random.default_rng([self.seed, _symbol_key(symbol)])
+                mu[i] = params.normal(0.07, 0.08)
+                sigma[i] = params.uniform(0.15, 0.6)
+                base_price[i] = params.uniform(20, 500)
+                base_volume[i] = params.uniform(5e5, 5e7)
+
+            keys = _mix(_mix(np.full(n, self.seed, dtype=np.uint64)) ^ np.array(
+                [_symbol_key(symbol) for symbol in new], dtype=np.uint64
+            ))
+
+            added = slice(len(self._symbols), len(self._symbols) + n)
+            for i, symbol in enumerate(new):
+                self._index[symbol] = added.start + i
+            self._symbols.extend(new)
+            self._keys = np.concatenate([self._keys, keys])
+            self._mu = np.concatenate([self._mu, mu])
+            self._sigma = np.concatenate([self._sigma, sigma])
+            self._base_price = np.concatenate([self._base_price, base_price])
+            self._base_volume = np.concatenate([self._base_volume, base_volume])
+
+            # Extend the history with columns for just the new symbols
+            if self._last_day is not None:
+                columns = self._history(self._first_day, self._last_day, added)
+                self._open, self._high, self._low, self._close, self._volume = (
+                    np.concatenate([current, new_columns], axis=1)
+                    for current, new_columns in zip(
+                        (self._open, self._high, self._low, self._close, self._volume), columns
+                    )
+                )
+            self._bridge = None
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol.upper() in self._index
+
+    # ---------- simulation ----------
+
+    def _noise(self, stream: int, first: int, last: int, symbols: slice) -> np.ndarray:
+        """Standard normal draws for business days first..last, shape (days, symbols)"""
+        days = np.arange(first, last + 1)[:, None]
+        return _normals(self._keys[symbols], stream, days)
+
+    def _history(self, first: int, last: int, symbols: slice) -> Tuple[np.ndarray, ...]:
+        """Daily OHLCV of some symbols for business days first..last, anchored at the base prices"""
+        dt = 1.0 / TRADING_DAYS_PER_YEAR
+        mu, sigma = self._mu[symbols], self._sigma[symbols]
+        base_price, base_volume = self._base_price[symbols], self._base_volume[symbols]
+        lo, hi = min(first, 0), max(last, 0)
+        # Log return of day i moves the close of day i - 1 to day i
+        log_ret = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * self._noise(_RETURNS, lo, hi, symbols)
+        cumulative = np.cumsum(log_ret, axis=0)
+        # Close of day i is the base price times the returns between the anchor and i
+        log_close = cumulative - cumulative[-lo]  # row -lo is the anchor day
+        closes = base_price * np.exp(log_close)
+        opens = base_price * np.exp(log_close - log_ret)
+
+        rows = slice(first - lo, last - lo + 1)
+        opens, closes = opens[rows], closes[rows]
+        # Approximate the intraday range from the daily volatility
+        wick = sigma * np.sqrt(dt) * 0.5
+        highs = np.maximum(opens, closes) * np.exp(np.abs(self._noise(_HIGHS, first, last, symbols)) * wick)
+        lows = np.minimum(opens, closes) * np.exp(-np.abs(self._noise(_LOWS, first, last, symbols)) * wick)
+        volumes = np.round(base_volume * np.exp(0.3 * self._noise(_VOLUMES, first, last, symbols)))
+        return opens, highs, lows, closes, volumes
+
+    def _build_days(self, first: int, last: int):
+        """Daily OHLCV of every symbol for business days first..last"""
+        self._open, self._high, self._low, self._close, self._volume = self._history(first, last, slice(None))
+        self._first_day, self._last_day = first, last
+        self._bridge = None
+
+    def _bridge_offsets(self, day: int, tick: int) -> np.ndarray:
+        """
+        Brownian bridge (0 at both ends of the session) at one tick, one value per symbol
+
+        The bridge is built top down: the value at the midpoint of an
+        interval is drawn given the values at its ends, halving down to the
+        tick. Each midpoint's draw is hashed from (symbol, day, midpoint),
+        so every tick of a session lies on the same path but only the
+        ~log2(ticks) midpoints above it are drawn.
+        """
+        if self._bridge and self._bridge[:2] == (day, tick):
+            return self._bridge[2]
+        zeros = np.zeros(len(self._symbols))
+        a, b, at_a, at_b = 0, self.ticks_per_day, zeros, zeros
+        while tick not in (a, b):
+            m = (a + b) // 2
+            z = _normals(self._keys, _INTRADAY, day, m)
+            at_m = at_a + (at_b - at_a) * (m - a) / (b - a) + np.sqrt((m - a) * (b - m) / (b - a)) * z
+            if tick < m:
+                b, at_b = m, at_m
+            else:
+                a, at_a = m, at_m
+        tick_dt = 1.0 / (TRADING_DAYS_PER_YEAR * self.ticks_per_day)
+        offsets = (at_a if tick == a else at_b) * self._sigma * np.sqrt(tick_dt)
+        self._bridge = (day, tick, offsets)
+        return offsets
+
+    def _session(self) -> Tuple[int, Optional[int]]:
+        """
+        The current business day and how far its session is
+
+        Returns:
+            tuple: (day index, tick into the session, or None once it closed;
+                before the open, the previous day is the one that closed)
+        """
+        now = datetime.fromtimestamp(self.clock(), EXCHANGE_TZ)
+        today = now.date()
+        day = _day_index(today)
+        if today.weekday() >= 5:
+            return day - 1, None
+        opened = datetime.combine(today, SESSION_OPEN, now.tzinfo)
+        elapsed = (now - opened).total_seconds()
+        if elapsed < 0:
+            return day - 1, None
+        if elapsed >= SESSION_SECONDS:
+            return day, None
+        return day, int(elapsed / self.tick_seconds)
+
+    def _current(self) -> Tuple[int, Optional[int]]:
+        """Bring the history up to the current session (caller holds the lock)"""
+        day, tick = self._session()
+        if self._last_day != day:
+            self._build_days(day - self.history_days, day)
+        return day, tick
+
+    def _prices(self, tick: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Current price and previous close of every symbol (caller holds the lock)"""
+        close, prev_close = self._close[-1], self._close[-2]
+        if tick is None:
+            return close, prev_close
+        fraction = tick / self.ticks_per_day
+        log_price = np.log(prev_close) + fraction * np.log(close / prev_close)
+        return np.exp(log_price + self._bridge_offsets(self._last_day, tick)), prev_close
+
+    # ---------- reads ----------
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """Get price and daily change for symbols, adding unknown ones to the simulation"""
+        symbols = list(symbols)
+        self.add_symbols(symbols)
+        with self._lock:
+            _, tick = self._current()
+            price, prev_close = self._prices(tick)
+            idx = np.array([self._index[s.upper()] for s in symbols], dtype=np.intp)
+            prices = price[idx]
+            changes = prices - prev_close[idx]
+            change_pcts = changes / prev_close[idx] * 100
+
+        return {
+            symbol: {
+                "symbol": symbol.upper(),
+                "price": round(float(price), 2),
+                "change": round(float(change), 2),
+                "change_percent": round(float(pct), 2),
+            }
+            for symbol, price, change, pct in zip(symbols, prices, changes, change_pcts)
+        }
+
+    def get_quote(self, symbol: str) -> Dict:
+        """Get price and daily change for one symbol"""
+        return self.get_quotes([symbol])[symbol]
+
+    def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """Get current prices for symbols"""
+        return {s: q["price"] for s, q in self.get_quotes(symbols).items()}
+
+    def get_daily_bars(
+        self,
+        symbol: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[Dict]:
+        """
+        Get completed daily OHLCV bars for a symbol
+
+        Args:
+            symbol: Stock symbol
+            start: First date to include (inclusive)
+            end: Last date to include (inclusive)
+
+        Returns:
+            list: Bars as dicts with date, open, high, low, close, volume
+        """
+        self.add_symbols([symbol])
+        with self._lock:
+            day, tick = self._current()
+            i = self._index[symbol.upper()]
+            # Today's bar only exists once its session has closed
+            last = day if tick is None else day - 1
+            first = self._first_day
+            if start:
+                first = max(first, _day_index(start))
+            if end:
+                last = min(last, _day_index(end) - (0 if end.weekday() < 5 else 1))
+            rows = np.arange(first - self._first_day, last - self._first_day + 1)
+            columns = [
+                self._open[rows, i], self._high[rows, i], self._low[rows, i],
+                self._close[rows, i], self._volume[rows, i],
+            ] if len(rows) else [[]] * 5
+            bar_dates = [_day_date(self._first_day + r) for r in rows]
+
+        return [
+            {
+                "date": d.isoformat(),
+                "open": round(float(o), 2),
+                "high": round(float(h), 2),
+                "low": round(float(l), 2),
+                "close": round(float(c), 2),
+                "volume": int(v),
+            }
+            for d, o, h, l, c, v in zip(bar_dates, *columns)
+        ]
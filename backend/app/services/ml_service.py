@@ -52,6 +52,27 @@ def predict_completion_date(transactions: list, goal_amount: float):
         "message": f"At your current pace, you'll reach your goal by {predicted_date.date()}."
     }
 
+def fit_savings_trend(deposits: list):
+    """
+    Full refit of the savings trend the API keeps as running sums
+    (services/savings_forecast). Used only to verify those sums.
+
+    x is days since the first deposit, y the cumulative amount deposited.
+    Returns (slope, intercept), or None with fewer than two deposits.
+    """
+    df = pd.DataFrame(deposits)
+    if len(df) < 2:
+        return None
+
+    df['createdAt'] = pd.to_datetime(df['createdAt'])
+    df = df.sort_values(by='createdAt')
+    df['total_amount'] = df['amount'].astype(float).cumsum()
+    df['days_since_start'] = (df['createdAt'] - df['createdAt'].iloc[0]).dt.total_seconds() / 86400
+
+    model = LinearRegression()
+    model.fit(df[['days_since_start']].values, df['total_amount'].values)
+    return model.coef_[0], model.intercept_
+
 # example
 if __name__ == "__main__":
     sample_transactions = [
@@ -0,0 +1,125 @@
+"""
+NAV Snapshots
+Daily job recording each group's net asset value, and the performance
+series served from those records
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from ..config import PERFORMANCE_MAX_POINTS
+from ..db import groups, snapshots, transactions
+from . import valuation
+
+# Performance chart ranges in days (None = since the first snapshot)
+RANGES = {"1W": 7, "1M": 30, "3M": 91, "6M": 182, "1Y": 365, "ALL": None}
+
+
+def take_snapshots(now: Optional[datetime] = None) -> int:
+    """
+    Record today's NAV for every group
+
+    Positions continue from each group's previous snapshot plus the trades
+    settled (executed or filled) since it was taken; only groups without a
+    snapshot yet are rebuilt from their full trade history. Trades still
+    waiting for their fill are carried at their cost without entering the
+    positions, so they count once they fill, and a failed order simply
+    never does. Cash is the group's current balance. Running again on the
+    same day replaces that day's record.
+
+    Returns:
+        int: Number of groups snapshotted
+    """
+    now = now or datetime.utcnow()
+    taken_at = now.isoformat()
+    group_items = groups.get_all_groups()
+    group_ids = [g["groupID"] for g in group_items]
+    if not group_ids:
+        return 0
+    latest = snapshots.get_latest_snapshots(group_ids)
+
+    # One scan covers every group: from the oldest previous snapshot, or
+    # for a group without one, from when it was created (groups from
+    # before createdAt existed need the whole table)
+    starts = [
+        latest[g["groupID"]]["takenAt"] if g["groupID"] in latest else g.get("createdAt")
+        for g in group_items
+    ]
+    since = None if None in starts else min(starts)
+    trades = [
+        t for t in transactions.get_executed_trades(settled_after=since)
+        if valuation.trade_time(t) <= taken_at
+    ]
+    pending = np.zeros(len(group_ids))
+    group_index = {g: i for i, g in enumerate(group_ids)}
+    for t in trades:
+        if t.get("orderStatus") == "pending_fill" and t["groupID"] in group_index:
+            pending[group_index[t["groupID"]]] += float(t.get("amount", 0))
+    trades = [
+        t for t in trades
+        if valuation.settled_time(t) <= taken_at
+        and (t["groupID"] not in latest or valuation.settled_time(t) > latest[t["groupID"]]["takenAt"])
+    ]
+
+    opening = {g: s["positions"] for g, s in latest.items()}
+    book = valuation.build_book(trades, group_ids, opening=opening)
+    valued = valuation.value_book(book, valuation.current_prices(book.symbols))
+
+    day = now.date().isoformat()
+    snapshots.put_snapshots([
+        {
+            "groupID": group_id,
+            "date": day,
+            "takenAt": taken_at,
+            "balance": float(group.get("balance", 0)),
+            "invested": float(valued.group_market_value[i] + pending[i]),
+            "costBasis": float(valued.group_cost[i] + pending[i]),
+            "positions": valuation.positions_of(book, i),
+        }
+        for i, (group_id, group) in enumerate(zip(group_ids, group_items))
+    ])
+    print(f"📸 Recorded NAV snapshots for {len(group_ids)} groups ({len(trades)} new trades)")
+    return len(group_ids)
+
+
+def downsample(points: List[dict], max_points: int = PERFORMANCE_MAX_POINTS) -> List[dict]:
+    """Keep at most max_points evenly spaced points, always keeping the first and last"""
+    if len(points) <= max_points:
+        return points
+    keep = np.unique(np.round(np.linspace(0, len(points) - 1, max_points)).astype(int))
+    return [points[i] for i in keep]
+
+
+def get_performance(group_id: str, range_name: str, today: Optional[datetime] = None) -> Dict:
+    """
+    Get a group's NAV series for a chart range
+
+    Args:
+        group_id: ID of the group
+        range_name: One of RANGES
+
+    Returns:
+        dict: range, points [{date, balance, invested, total}] and the
+            change in total over the range
+    """
+    today = (today or datetime.utcnow()).date()
+    days = RANGES[range_name]
+    start = (today - timedelta(days=days)).isoformat() if days else "0000-00-00"
+    items = snapshots.get_daily_snapshots(group_id, start, today.isoformat())
+
+    points = [
+        {
+            "date": item["date"],
+            "balance": float(item["balance"]),
+            "invested": float(item["invested"]),
+            "total": float(item["total"]),
+        }
+        for item in items
+    ]
+    change = points[-1]["total"] - points[0]["total"] if points else 0.0
+    first_total = points[0]["total"] if points else 0.0
+    return {
+        "range": range_name,
+        "points": downsample(points),
+        "change": change,
+        "changePercent": change / first_total * 100 if first_total > 0 else 0,
+    }
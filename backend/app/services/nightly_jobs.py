@@ -0,0 +1,110 @@
+"""
+Nightly Jobs
+Runs the once-a-day batch jobs (NAV snapshots, savings forecasts, ledger
+audit) after the market close, in whichever API process takes each job's lease
+"""
+import threading
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from ..config import NIGHTLY_JOB_HOUR_UTC, NIGHTLY_JOB_CHECK_SECONDS, NIGHTLY_JOB_LEASE_SECONDS
+from ..db import leases
+from .forecast_batch import run_forecast_batch
+from .ledger_audit import run_ledger_audit
+from .nav_snapshots import take_snapshots
+
+
+class NightlyJobs:
+    """
+    Background thread that runs each job once per day after hour_utc
+
+    Every API process (and worker, and restart) runs this thread, so each
+    job is claimed with a lease in the Leases table, renewed while it runs,
+    and its last run date is stored there when it completes: only one
+    process runs a job, and only once a day. A job that fails releases its
+    lease and is retried at the next check; the others still run. The same
+    jobs can be run by hand from scripts/ if the API was down.
+    """
+
+    def __init__(
+        self,
+        jobs: List[Tuple[str, Callable[[], object]]],
+        hour_utc: int = NIGHTLY_JOB_HOUR_UTC,
+        check_seconds: float = NIGHTLY_JOB_CHECK_SECONDS,
+        lease_seconds: float = NIGHTLY_JOB_LEASE_SECONDS,
+    ):
+        self.jobs = jobs
+        self.hour_utc = hour_utc
+        self.check_seconds = check_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = leases.new_owner()
+        self._last_run = {}  # jobs known to be done, to skip the lease read
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="nightly-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            now = datetime.utcnow()
+            if now.hour >= self.hour_utc:
+                for name, job in self.jobs:
+                    if self._last_run.get(name) == now.date():
+                        continue
+                    try:
+                        self._run_job(name, job, now.date().isoformat())
+                    except Exception as e:
+                        print(f"❌ Nightly job {name} failed: {e}")
+            if self._stop.wait(self.check_seconds):
+                return
+
+    def _run_job(self, name: str, job: Callable[[], object], day: str):
+        """Run a job under its lease, unless it already ran today or another process holds it"""
+        lease_id = f"nightly:{name}"
+        if not leases.acquire(lease_id, self.owner, self.lease_seconds, skip_run=day):
+            lease = leases.get_lease(lease_id) or {}
+            if lease.get("lastRun") == day:
+                self._last_run[name] = datetime.fromisoformat(day).date()
+            return
+
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    if not leases.renew(lease_id, self.owner, self.lease_seconds):
+                        print(f"⚠️ Nightly job {name} lost its lease")
+                        return
+                except Exception as e:
+                    print(f"⚠️ Failed to renew the lease of nightly job {name}: {e}")
+
+        renewer = threading.Thread(target=heartbeat, name=f"nightly-{name}-lease", daemon=True)
+        renewer.start()
+        try:
+            job()
+        except Exception:
+            leases.release(lease_id, self.owner)
+            raise
+        finally:
+            done.set()
+            renewer.join()
+        leases.release(lease_id, self.owner, completed_run=day)
+        self._last_run[name] = datetime.fromisoformat(day).date()
+
+
+# Singleton instance
+nightly_jobs = NightlyJobs([
+    ("nav_snapshots", take_snapshots),
+    ("savings_forecasts", run_forecast_batch),
+    ("ledger_audit", run_ledger_audit),
+])
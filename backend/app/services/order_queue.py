@@ -0,0 +1,195 @@
+"""
+Order Queue
+Places broker orders for executed trade proposals in the background and
+records the fills, so request handlers never wait on the broker
+"""
+import queue
+import random
+import threading
+from datetime import datetime
+from typing import Optional, Set
+from ..config import ORDER_WORKERS, ORDER_MAX_ATTEMPTS, ORDER_RETRY_BASE_SECONDS, ORDER_RETRY_MAX_SECONDS
+from ..db import transactions
+from .alpaca_service import FINAL_ORDER_STATUSES, alpaca_service
+from .event_broker import publish_group_event
+
+
+class OrderQueue:
+    """
+    Work queue of trade transaction IDs served by a fixed pool of workers
+
+    A transaction ID is queued at most once at a time. Orders that fail or
+    aren't filled yet are retried with exponential backoff and jitter; after
+    max_attempts the broker order is cancelled, and once the broker confirms
+    nothing more can fill, the trade is marked failed and the group refunded
+    (or whatever did fill is recorded). Until then the order keeps being
+    polled. The transaction ID doubles as the broker's client_order_id, so a
+    retry never places a second order.
+    """
+
+    def __init__(
+        self,
+        workers: int = ORDER_WORKERS,
+        max_attempts: int = ORDER_MAX_ATTEMPTS,
+        retry_base_seconds: float = ORDER_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = ORDER_RETRY_MAX_SECONDS,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._keys: Set[str] = set()
+        self._timers: Set[threading.Timer] = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start the workers and requeue trades left pending by a previous run"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"order-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        try:
+            for transaction_id in transactions.get_pending_fills():
+                self.enqueue(transaction_id)
+        except Exception as e:
+            print(f"❌ Could not recover pending orders: {e}")
+
+    def stop(self):
+        """Stop the workers after the jobs already running finish"""
+        with self._lock:
+            for timer in self._timers:
+                timer.cancel()
+            self._timers.clear()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def enqueue(self, transaction_id: str) -> bool:
+        """
+        Queue an order job for an executed trade
+
+        Returns:
+            bool: False if the transaction is already queued
+        """
+        with self._lock:
+            if transaction_id in self._keys:
+                return False
+            self._keys.add(transaction_id)
+        self._queue.put((transaction_id, 1))
+        return True
+
+    def _retry_later(self, transaction_id: str, attempt: int):
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempt - 1))
+        delay *= random.uniform(0.5, 1.0)
+
+        def requeue():
+            with self._lock:
+                self._timers.discard(timer)
+            self._queue.put((transaction_id, attempt + 1))
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            transaction_id, attempt = job
+            try:
+                done = self._process(transaction_id, attempt)
+            except Exception as e:
+                print(f"❌ Order job for {transaction_id} failed (attempt {attempt}): {e}")
+                done = False
+            if not done and attempt < self.max_attempts:
+                self._retry_later(transaction_id, attempt)
+                continue
+            if not done and not self._give_up(transaction_id):
+                # Not confirmed cancelled yet; ask again later
+                self._retry_later(transaction_id, attempt)
+                continue
+            with self._lock:
+                self._keys.discard(transaction_id)
+
+    def _process(self, transaction_id: str, attempt: int) -> bool:
+        """Place or check the order; returns True once there is nothing left to do"""
+        transaction = transactions.get_transaction(transaction_id)
+        if not transaction or transaction.get("orderStatus") != "pending_fill":
+            return True
+
+        metadata = transaction.get("metadata", {})
+        order = alpaca_service.place_mock_order(
+            symbol=metadata["stock_symbol"],
+            quantity=float(metadata["quantity"]),
+            side=metadata.get("side", "buy"),
+            client_order_id=transaction_id,
+        )
+        if not order or order.get("status") != "filled" or not order.get("price"):
+            return False
+
+        self._record_fill(transaction, order)
+        return True
+
+    def _record_fill(self, transaction: dict, order: dict):
+        transaction_id = transaction["transactionID"]
+        symbol = transaction["metadata"]["stock_symbol"]
+        quantity = order.get("filled_quantity", order["quantity"])
+        fill = {
+            "orderId": order["order_id"],
+            "price": order["price"],
+            "quantity": quantity,
+            "filledAt": order.get("filled_at") or order.get("timestamp") or datetime.utcnow().isoformat(),
+        }
+        if transactions.record_fill(transaction, fill):
+            print(f"📈 Filled {symbol} x{quantity} @ ${order['price']} for {transaction_id}")
+            publish_group_event(transaction["groupID"], "transaction.filled", {
+                "transactionId": transaction_id,
+                "symbol": symbol,
+                "price": order["price"],
+                "quantity": quantity,
+                "orderId": order["order_id"],
+            })
+
+    def _give_up(self, transaction_id: str) -> bool:
+        """
+        Cancel the broker order of a trade out of attempts and settle it
+
+        Returns:
+            bool: False if the broker hasn't confirmed the order is done yet
+        """
+        try:
+            transaction = transactions.get_transaction(transaction_id)
+            if not transaction or transaction.get("orderStatus") != "pending_fill":
+                return True
+
+            order = alpaca_service.cancel_order(transaction_id)
+            if not order or order["status"] not in FINAL_ORDER_STATUSES:
+                return False
+            if order.get("filled_quantity") and order.get("price"):
+                # Filled, at least partly, before the cancel went through
+                self._record_fill(transaction, order)
+                return True
+
+            if transactions.record_fill_failure(transaction):
+                print(f"❌ Order for {transaction_id} failed after {self.max_attempts} attempts; refunded group")
+                publish_group_event(transaction["groupID"], "transaction.status", {
+                    "transactionId": transaction_id,
+                    "status": "failed",
+                })
+            return True
+        except Exception as e:
+            print(f"❌ Could not mark order {transaction_id} as failed: {e}")
+            return False
+
+
+# Singleton instance
+order_queue = OrderQueue()
@@ -0,0 +1,159 @@
+"""
+Password Hasher
+Hashes and verifies passwords with scrypt in a dedicated, bounded
+process pool so logins never tie up the API's own threads
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from ..config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, SCRYPT_N, SCRYPT_R, SCRYPT_P
+
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued"""
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # Runs in a worker process
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r + (1 << 20), dklen=_KEY_BYTES
+    )
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _parse(stored_hash: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    """Split "scrypt$n$r$p$salt$key" (None for legacy SHA-256 hex digests)"""
+    parts = stored_hash.split("$")
+    if len(parts) != 6 or parts[0] != "scrypt":
+        return None
+    n, r, p = (int(x) for x in parts[1:4])
+    return n, r, p, base64.b64decode(parts[4]), base64.b64decode(parts[5])
+
+
+class PasswordHasher:
+    """
+    scrypt hashing on a process pool of fixed size
+
+    At most max_pending hashes may be queued or running; beyond that
+    HasherBusy is raised straight away so a login storm is shed instead of
+    building an ever longer queue. Hashes record their own parameters, so
+    n/r/p can be raised later and older hashes upgraded on the next login.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        n: int = SCRYPT_N,
+        r: int = SCRYPT_R,
+        p: int = SCRYPT_P,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.n, self.r, self.p = n, r, p
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the API process has threads running
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def warm(self):
+        """Start the worker processes now instead of on the first login"""
+        pool = self._executor()
+        futures = [pool.submit(_scrypt, "", b"", 1024, 8, 1) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._reset()
+
+    def _reset(self, broken: bool = False):
+        with self._lock:
+            if self._pool is not None and (not broken or self._pool._broken):
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def _derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            try:
+                return await asyncio.wrap_future(self._executor().submit(_scrypt, password, salt, n, r, p))
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool once
+                self._reset(broken=True)
+                return await asyncio.wrap_future(self._executor().submit(_scrypt, password, salt, n, r, p))
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the current parameters
+
+        Raises:
+            HasherBusy: if the queue is full
+        """
+        salt = os.urandom(_SALT_BYTES)
+        key = await self._derive(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(key)}"
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        """True for legacy SHA-256 hashes and scrypt hashes with old parameters"""
+        parsed = _parse(stored_hash)
+        return parsed is None or parsed[:3] != (self.n, self.r, self.p)
+
+    async def verify(self, stored_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password against a stored hash
+
+        Returns:
+            tuple: (matches, new hash to store or None). A new hash is
+                returned when the password matches a legacy or outdated hash,
+                unless the queue is full; the upgrade then waits for a later
+                login.
+
+        Raises:
+            HasherBusy: if the queue is full before the password is checked
+        """
+        parsed = _parse(stored_hash)
+        if parsed is None:
+            # Legacy unsalted SHA-256 hex digest
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            matches = hmac.compare_digest(legacy, stored_hash)
+        else:
+            n, r, p, salt, key = parsed
+            matches = hmac.compare_digest(await self._derive(password, salt, n, r, p), key)
+
+        if matches and self.needs_rehash(stored_hash):
+            try:
+                return True, await self.hash(password)
+            except HasherBusy:
+                pass
+        return matches, None
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,131 @@
+"""
+Quote Stream
+Fans market data hub snapshots out to WebSocket subscribers as
+conflated per-symbol deltas
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional, Set
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from ..config import MAX_STREAM_SYMBOLS
+from .market_data_hub import MarketDataHub, MarketSnapshot, market_data_hub
+
+
+class _Subscriber:
+    """
+    One WebSocket connection and the symbols it watches
+
+    Updates land in a pending dict keyed by symbol, so while a slow client
+    is still being sent to, newer ticks overwrite older unsent ones instead
+    of queueing up behind them.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.symbols: Set[str] = set()
+        self.last_sent: Dict[str, tuple] = {}
+        self.pending: Dict[str, Dict] = {}
+        self.wakeup = asyncio.Event()
+
+    def offer(self, quotes: Dict[str, Dict], force: bool = False):
+        """Queue quotes for subscribed symbols that changed since last sent"""
+        for symbol in self.symbols:
+            quote = quotes.get(symbol)
+            if quote is None:
+                continue
+            if force or self.last_sent.get(symbol) != (quote["price"], quote["change"]):
+                self.pending[symbol] = quote
+        if self.pending:
+            self.wakeup.set()
+
+    async def send_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch, self.pending = self.pending, {}
+            for symbol, quote in batch.items():
+                self.last_sent[symbol] = (quote["price"], quote["change"])
+            await self.websocket.send_json({
+                "type": "quotes",
+                "quotes": batch,
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+
+
+class QuoteStream:
+    """Shares one market data hub listener between all WebSocket subscribers"""
+
+    def __init__(self, hub: MarketDataHub):
+        self.hub = hub
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _attach(self):
+        if self._loop is None:
+            self.hub.add_listener(self._on_snapshot)
+        self._loop = asyncio.get_running_loop()
+
+    def _on_snapshot(self, snapshot: MarketSnapshot):
+        # Called on the hub's refresh thread; hop over to the event loop
+        loop = self._loop
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, snapshot)
+
+    def _fan_out(self, snapshot: MarketSnapshot):
+        for subscriber in list(self._subscribers):
+            subscriber.offer(snapshot.quotes)
+
+    async def serve(self, websocket: WebSocket):
+        """
+        Run a subscriber connection until the client disconnects
+
+        Clients send {"action": "subscribe" | "unsubscribe", "symbols": [...]}
+        and receive {"type": "quotes", "quotes": {symbol: quote}} messages
+        holding only the symbols whose price changed.
+        """
+        self._attach()
+        subscriber = _Subscriber(websocket)
+        self._subscribers.add(subscriber)
+        sender = asyncio.create_task(subscriber.send_loop())
+        try:
+            while True:
+                try:
+                    message = json.loads(await websocket.receive_text())
+                except ValueError:
+                    message = None
+                action = message.get("action") if isinstance(message, dict) else None
+                symbols = message.get("symbols") if isinstance(message, dict) else None
+                if action not in ("subscribe", "unsubscribe") or not isinstance(symbols, list):
+                    await websocket.send_json({"type": "error", "message": "Expected {action, symbols}"})
+                    continue
+                symbols = [str(s).upper() for s in symbols]
+
+                if action == "unsubscribe":
+                    subscriber.symbols.difference_update(symbols)
+                    for symbol in symbols:
+                        subscriber.last_sent.pop(symbol, None)
+                        subscriber.pending.pop(symbol, None)
+                    continue
+
+                new_symbols = [s for s in dict.fromkeys(symbols) if s not in subscriber.symbols]
+                if len(subscriber.symbols) + len(new_symbols) > MAX_STREAM_SYMBOLS:
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": f"At most {MAX_STREAM_SYMBOLS} symbols per connection",
+                    })
+                    continue
+                # Tracking unknown symbols may fetch them, so keep it off the loop
+                quotes = await run_in_threadpool(self.hub.get_quotes, new_symbols)
+                subscriber.symbols.update(new_symbols)
+                subscriber.offer(quotes, force=True)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            sender.cancel()
+
+
+# Singleton instance
+quote_stream = QuoteStream(market_data_hub)
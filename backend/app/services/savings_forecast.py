@@ -0,0 +1,139 @@
+"""
+Savings Forecast
+Predicts when a group reaches its savings goal from a least-squares line
+through its cumulative deposits, kept as running sums on the group
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+from ..db import groups, transactions
+
+_X_STEP = Decimal("0.000001")  # days (~0.1s)
+_Y_STEP = Decimal("0.01")
+
+
+def _days_since(origin: str, at: datetime) -> Decimal:
+    days = (at - datetime.fromisoformat(origin)).total_seconds() / 86400
+    return Decimal(str(days)).quantize(_X_STEP)
+
+
+def add_deposit(stats: Optional[Dict], amount: float, at: datetime) -> Dict:
+    """
+    Add one deposit to the running sums
+
+    Each deposit is a point (x, y): x is days since the first deposit and y
+    the total deposited so far. Keeping n, Σx, Σy, Σxy and Σx² is enough to
+    refit the line in O(1). Sums are Decimals, so they stay exact however
+    many deposits are added.
+    """
+    if not stats:
+        stats = {
+            "origin": at.isoformat(),
+            "n": Decimal(0), "sx": Decimal(0), "sy": Decimal(0),
+            "sxy": Decimal(0), "sxx": Decimal(0), "total": Decimal(0),
+        }
+    x = _days_since(stats["origin"], at)
+    y = (stats["total"] + Decimal(str(amount))).quantize(_Y_STEP)
+    return {
+        "origin": stats["origin"],
+        "n": stats["n"] + 1,
+        "sx": stats["sx"] + x,
+        "sy": stats["sy"] + y,
+        "sxy": stats["sxy"] + x * y,
+        "sxx": stats["sxx"] + x * x,
+        "total": y,
+        "updatedAt": at.isoformat(),
+    }
+
+
+def record_deposit(group_id: str, amount: float, at: Optional[datetime] = None) -> Optional[Dict]:
+    """Fold a deposit into the group's stored running sums"""
+    at = at or datetime.utcnow()
+    return groups.update_savings_stats(group_id, lambda stats: add_deposit(stats, amount, at))
+
+
+def fit(stats: Dict) -> Optional[Tuple[float, float]]:
+    """
+    Least-squares slope and intercept from the running sums
+
+    Returns:
+        tuple: (dollars per day, intercept), or None with fewer than two
+            distinct deposit times
+    """
+    n, sx, sy, sxy, sxx = (Decimal(stats[k]) for k in ("n", "sx", "sy", "sxy", "sxx"))
+    denominator = n * sxx - sx * sx
+    if n < 2 or denominator == 0:
+        return None
+    slope = (n * sxy - sx * sy) / denominator
+    intercept = (sy - slope * sx) / n
+    return float(slope), float(intercept)
+
+
+def forecast(group: Dict, now: Optional[datetime] = None) -> Dict:
+    """
+    Forecast the group's goal completion date from its stored stats
+
+    Args:
+        group: Group item with savingsGoal and (optionally) savingsStats
+            or the nightly savingsForecast
+
+    Returns:
+        dict: goal, total deposited, progress and, when there is a positive
+            trend, the predicted completion date
+    """
+    now = now or datetime.utcnow()
+    goal = group["savingsGoal"]
+    goal_amount = float(goal["amount"])
+    stats = group.get("savingsStats")
+    nightly = group.get("savingsForecast")
+    if stats:
+        total, line, origin = float(stats["total"]), fit(stats), stats["origin"]
+    elif nightly:
+        # No live sums yet: fall back to the nightly batch fit
+        total = float(nightly["totalDeposited"])
+        line = (float(nightly["rate"]), float(nightly["intercept"])) if "rate" in nightly else None
+        origin = nightly.get("origin")
+    else:
+        total, line, origin = 0.0, None, None
+
+    result = {
+        "goalAmount": goal_amount,
+        "targetDate": goal.get("targetDate"),
+        "totalDeposited": total,
+        "progressPercent": min(100.0, total / goal_amount * 100),
+        "predictedCompletionDate": None,
+        "currentRate": None,
+        "daysRemaining": None,
+        "onTrack": None,
+    }
+
+    if total >= goal_amount:
+        result.update(daysRemaining=0, onTrack=True, message="Goal reached!")
+        return result
+
+    if line is None:
+        result["message"] = "Not enough deposits yet to forecast."
+        return result
+
+    slope, intercept = line
+    result["currentRate"] = round(slope, 2)
+    if slope <= 0:
+        result["message"] = "No positive saving trend detected."
+        return result
+
+    predicted = datetime.fromisoformat(origin) + timedelta(days=(goal_amount - intercept) / slope)
+    predicted_date = max(predicted, now).date()
+    result["predictedCompletionDate"] = predicted_date.isoformat()
+    result["daysRemaining"] = (predicted_date - now.date()).days
+    if goal.get("targetDate"):
+        result["onTrack"] = predicted_date.isoformat() <= goal["targetDate"]
+    result["message"] = f"At your current pace, you'll reach your goal by {predicted_date}."
+    return result
+
+
+def rebuild_stats(group_id: str) -> Optional[Dict]:
+    """Recompute a group's running sums from its recorded deposits"""
+    stats = None
+    for deposit in sorted(transactions.get_deposits(group_id), key=lambda d: d["createdAt"]):
+        stats = add_deposit(stats, float(deposit["amount"]), datetime.fromisoformat(deposit["createdAt"]))
+    return stats
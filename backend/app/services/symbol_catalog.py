@@ -0,0 +1,201 @@
+"""
+Symbol Catalog
+Indexed list of tradable symbols loaded from a CSV data file, with
+category lists and prefix/fuzzy search
+"""
+import bisect
+import csv
+import difflib
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from ..config import SYMBOL_CATALOG_PATH
+
+
+class SymbolCatalog:
+    """
+    Symbol metadata with O(1) lookup by symbol
+
+    The data file has symbol, name and category columns. Category may be
+    empty (not shown in any curated list) or several names separated by ';'.
+    Symbols and names are held in parallel tuples indexed by position, and
+    the search index is only built the first time search() is called.
+    """
+
+    def __init__(self, path: str = SYMBOL_CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._symbols: Tuple[str, ...] = ()
+        self._names: Tuple[str, ...] = ()
+        self._index: Dict[str, int] = {}
+        self._category_rows: Dict[str, Tuple[int, ...]] = {}
+        self._category_sets: Dict[str, FrozenSet[str]] = {}
+        self._stock_lists: Dict[str, List[Dict]] = {}
+        # Built lazily by _ensure_search_index
+        self._name_tokens: Optional[List[Tuple[str, int]]] = None
+
+    # ---------- loading ----------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            symbols, names = [], []
+            index: Dict[str, int] = {}
+            categories: Dict[str, List[int]] = {}
+            with open(self.path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    symbol = row["symbol"].strip().upper()
+                    if not symbol or symbol in index:
+                        continue
+                    index[symbol] = len(symbols)
+                    symbols.append(symbol)
+                    names.append((row.get("name") or symbol).strip())
+                    for category in (row.get("category") or "").split(";"):
+                        category = category.strip()
+                        if category:
+                            categories.setdefault(category, []).append(index[symbol])
+
+            self._symbols = tuple(symbols)
+            self._names = tuple(names)
+            self._index = index
+            self._category_rows = {c: tuple(rows) for c, rows in categories.items()}
+            self._category_sets = {
+                c: frozenset(symbols[i] for i in rows) for c, rows in categories.items()
+            }
+            self._stock_lists = {
+                c: [{"symbol": symbols[i], "name": names[i]} for i in rows]
+                for c, rows in categories.items()
+            }
+            self._loaded = True
+
+    def _ensure_search_index(self):
+        self._ensure_loaded()
+        if self._name_tokens is not None:
+            return
+        with self._lock:
+            if self._name_tokens is None:
+                tokens = []
+                for i, name in enumerate(self._names):
+                    for token in name.lower().replace(",", " ").split():
+                        tokens.append((token, i))
+                tokens.sort()
+                self._unique_tokens = sorted({t for t, _ in tokens})
+                self._name_tokens = tokens
+                # Symbols sorted for prefix search, kept as (symbol, row) pairs
+                self._sorted_symbols = sorted((s, i) for i, s in enumerate(self._symbols))
+
+    # ---------- lookups ----------
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        self._ensure_loaded()
+        return symbol.upper() in self._index
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Get metadata for a symbol, or None if it isn't listed"""
+        self._ensure_loaded()
+        i = self._index.get(symbol.upper())
+        if i is None:
+            return None
+        return {"symbol": self._symbols[i], "name": self._names[i]}
+
+    def name(self, symbol: str) -> str:
+        """Get a symbol's company name, falling back to the symbol itself"""
+        self._ensure_loaded()
+        i = self._index.get(symbol.upper())
+        return self._names[i] if i is not None else symbol
+
+    def names(self, symbols: List[str]) -> Dict[str, str]:
+        """Get company names for several symbols"""
+        return {s: self.name(s) for s in symbols}
+
+    def get_stock_lists(self) -> Dict[str, List[Dict]]:
+        """Get curated stock lists organized by category"""
+        self._ensure_loaded()
+        return self._stock_lists
+
+    def in_category(self, symbol: str, category: str) -> bool:
+        """Check if a symbol belongs to a category"""
+        self._ensure_loaded()
+        return symbol.upper() in self._category_sets.get(category, frozenset())
+
+    def listed_symbols(self) -> List[str]:
+        """Get every symbol that appears in at least one category"""
+        self._ensure_loaded()
+        rows = sorted({i for rows in self._category_rows.values() for i in rows})
+        return [self._symbols[i] for i in rows]
+
+    # ---------- search ----------
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Search symbols by ticker or company name
+
+        Results are ranked: exact ticker, ticker prefix, company-name word
+        prefix, then fuzzy ticker/name matches for typos.
+
+        Args:
+            query: Text the user typed
+            limit: Maximum number of results
+
+        Returns:
+            list: Matching symbols as dicts with symbol and name
+        """
+        query = query.strip()
+        if not query:
+            return []
+        self._ensure_search_index()
+
+        rows: List[int] = []
+        seen = set()
+
+        def add(i: int):
+            if i not in seen and len(rows) < limit:
+                seen.add(i)
+                rows.append(i)
+
+        upper = query.upper()
+        if upper in self._index:
+            add(self._index[upper])
+
+        # Ticker prefix, shortest tickers first
+        start = bisect.bisect_left(self._sorted_symbols, (upper,))
+        end = bisect.bisect_left(self._sorted_symbols, (upper + "\uffff",))
+        for _, i in sorted(self._sorted_symbols[start:end], key=lambda p: (len(p[0]), p[0])):
+            add(i)
+
+        # Company-name word prefix (every query word must match some word)
+        words = query.lower().split()
+        if len(rows) < limit and words:
+            candidates = None
+            for word in words:
+                start = bisect.bisect_left(self._name_tokens, (word,))
+                end = bisect.bisect_left(self._name_tokens, (word + "\uffff",))
+                matched = {i for _, i in self._name_tokens[start:end]}
+                candidates = matched if candidates is None else candidates & matched
+            for i in sorted(candidates or (), key=lambda i: self._symbols[i]):
+                add(i)
+
+        # Fuzzy matches for typos
+        if len(rows) < limit:
+            for symbol in difflib.get_close_matches(upper, self._symbols, n=limit, cutoff=0.75):
+                add(self._index[symbol])
+        if len(rows) < limit and words:
+            for word in words:
+                for token in difflib.get_close_matches(word, self._unique_tokens, n=limit, cutoff=0.8):
+                    start = bisect.bisect_left(self._name_tokens, (token,))
+                    end = bisect.bisect_right(self._name_tokens, (token, len(self._symbols)))
+                    for _, i in self._name_tokens[start:end]:
+                        add(i)
+
+        return [{"symbol": self._symbols[i], "name": self._names[i]} for i in rows]
+
+
+# Singleton instance
+symbol_catalog = SymbolCatalog()
@@ -0,0 +1,297 @@
+"""
+Portfolio Valuation
+Values group positions (as projected onto the group items, or rebuilt
+from executed trades) against market prices with NumPy, for one group or
+every group at once
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from ..db import groups
+from .market_data_hub import market_data_hub
+from .symbol_catalog import symbol_catalog
+
+# Positions smaller than this are treated as closed
+_EPSILON = 1e-9
+
+
+class PositionBook(NamedTuple):
+    """
+    Open positions of one or more groups as parallel arrays
+
+    Position rows are sorted by group, so the rows of group i are
+    group_start[i]:group_start[i + 1].
+    """
+    group_ids: List[str]
+    symbols: List[str]
+    names: Dict[str, str]
+    group_idx: np.ndarray   # per position: index into group_ids
+    symbol_idx: np.ndarray  # per position: index into symbols
+    quantity: np.ndarray    # per position: shares held
+    cost: np.ndarray        # per position: total cost of the shares held
+    realized: np.ndarray    # per group: realized P&L from sells
+    group_start: np.ndarray
+
+
+class Valuation(NamedTuple):
+    """A PositionBook valued at a set of prices"""
+    book: PositionBook
+    price: np.ndarray            # per position, NaN if no quote
+    market_value: np.ndarray     # per position (cost basis if no quote)
+    unrealized: np.ndarray       # per position
+    weight: np.ndarray           # per position: share of its group's market value
+    group_market_value: np.ndarray
+    group_cost: np.ndarray
+    group_unrealized: np.ndarray
+
+
+def _trade_terms(metadata: dict):
+    """Quantity and price of a trade, preferring the broker fill if recorded"""
+    fill = metadata.get("fill") or {}
+    quantity = float(fill.get("quantity") or metadata.get("quantity") or 0)
+    price = float(fill.get("price") or metadata.get("price_per_share") or 0)
+    return quantity, price
+
+
+def trade_time(trade: dict) -> str:
+    """When a trade took effect (trades executed before executedAt existed use createdAt)"""
+    return trade.get("executedAt") or trade.get("createdAt", "")
+
+
+def settled_time(trade: dict) -> str:
+    """When a trade's shares were held: when its fill was recorded, for trades that went through the order queue"""
+    return trade.get("filledAt") or trade_time(trade)
+
+
+def build_book(
+    trades: Iterable[dict],
+    group_ids: Optional[Sequence[str]] = None,
+    opening: Optional[Dict[str, Dict[str, Tuple[float, float]]]] = None,
+) -> PositionBook:
+    """
+    Fold settled trades into open positions using average cost
+
+    Trades still waiting for their fill, and failed ones, hold no shares
+    and are skipped.
+
+    Args:
+        trades: Executed trade items (see transactions.get_executed_trades)
+        group_ids: Groups to include, in report order. Trades for other
+            groups are ignored; None includes every group seen.
+        opening: Positions to start from, {group_id: {symbol: (quantity, cost)}}
+
+    Returns:
+        PositionBook: Positions of the requested groups
+    """
+    trades = sorted(trades, key=settled_time)
+    if group_ids is None:
+        group_ids = list(dict.fromkeys(t["groupID"] for t in trades))
+    group_index = {g: i for i, g in enumerate(group_ids)}
+
+    positions: Dict[tuple, List[float]] = {}
+    realized = np.zeros(len(group_ids))
+    names: Dict[str, str] = {}
+    for group_id, held in (opening or {}).items():
+        g = group_index.get(group_id)
+        if g is not None:
+            for symbol, (quantity, cost) in held.items():
+                positions[(g, symbol)] = [float(quantity), float(cost)]
+    for trade in trades:
+        g = group_index.get(trade.get("groupID"))
+        if g is None or trade.get("orderStatus") in ("failed", "pending_fill"):
+            continue
+        metadata = trade.get("metadata", {})
+        symbol = metadata["stock_symbol"]
+        names.setdefault(symbol, metadata.get("stock_name", symbol))
+        quantity, price = _trade_terms(metadata)
+        position = positions.setdefault((g, symbol), [0.0, 0.0])
+
+        if metadata.get("side", "buy") == "sell":
+            sold = min(quantity, position[0])
+            if sold <= 0:
+                continue
+            sold_cost = position[1] * sold / position[0]
+            realized[g] += sold * price - sold_cost
+            position[0] -= sold
+            position[1] -= sold_cost
+        else:
+            position[0] += quantity
+            position[1] += quantity * price
+
+    return _book(group_ids, positions, realized, names)
+
+
+def book_from_holdings(group_items: Sequence[dict]) -> PositionBook:
+    """
+    Read open positions from the holdings and costBasis maps of group items
+
+    The maps are kept up to date by the change feed, so no trades are read.
+    They only record buys, so there is no realized P&L.
+    """
+    positions: Dict[tuple, List[float]] = {}
+    for g, group in enumerate(group_items):
+        cost_basis = group.get("costBasis") or {}
+        for symbol, quantity in (group.get("holdings") or {}).items():
+            positions[(g, symbol)] = [float(quantity), float(cost_basis.get(symbol, 0))]
+    names = {symbol: symbol_catalog.name(symbol) for _, symbol in positions}
+    return _book([g["groupID"] for g in group_items], positions, np.zeros(len(group_items)), names)
+
+
+def _book(
+    group_ids: Sequence[str],
+    positions: Dict[tuple, List[float]],
+    realized: np.ndarray,
+    names: Dict[str, str],
+) -> PositionBook:
+    """Lay out {(group index, symbol): [quantity, cost]} as a PositionBook"""
+    open_positions = sorted(
+        ((g, symbol, q, c) for (g, symbol), (q, c) in positions.items() if q > _EPSILON),
+        key=lambda p: p[0]
+    )
+    symbols = sorted({p[1] for p in open_positions})
+    symbol_index = {s: i for i, s in enumerate(symbols)}
+
+    group_idx = np.array([p[0] for p in open_positions], dtype=np.int64)
+    return PositionBook(
+        group_ids=list(group_ids),
+        symbols=symbols,
+        names=names,
+        group_idx=group_idx,
+        symbol_idx=np.array([symbol_index[p[1]] for p in open_positions], dtype=np.int64),
+        quantity=np.array([p[2] for p in open_positions], dtype=np.float64),
+        cost=np.array([p[3] for p in open_positions], dtype=np.float64),
+        realized=realized,
+        group_start=np.searchsorted(group_idx, np.arange(len(group_ids) + 1)),
+    )
+
+
+def positions_of(book: PositionBook, g: int) -> Dict[str, Tuple[float, float]]:
+    """Open positions of one group as {symbol: (quantity, cost)}"""
+    start, end = book.group_start[g], book.group_start[g + 1]
+    return {
+        book.symbols[book.symbol_idx[r]]: (float(book.quantity[r]), float(book.cost[r]))
+        for r in range(start, end)
+    }
+
+
+def value_book(book: PositionBook, prices: Dict[str, float]) -> Valuation:
+    """
+    Value every position in a book at once
+
+    Positions without a price are carried at cost so group totals don't
+    drop while a quote is unavailable.
+    """
+    n_groups = len(book.group_ids)
+    symbol_prices = np.array([prices.get(s, np.nan) for s in book.symbols], dtype=np.float64)
+    price = symbol_prices[book.symbol_idx]
+    market_value = np.where(np.isnan(price), book.cost, book.quantity * price)
+    unrealized = market_value - book.cost
+
+    group_market_value = np.bincount(book.group_idx, weights=market_value, minlength=n_groups)
+    group_cost = np.bincount(book.group_idx, weights=book.cost, minlength=n_groups)
+    position_total = group_market_value[book.group_idx]
+    weight = np.divide(
+        market_value, position_total,
+        out=np.zeros_like(market_value), where=position_total > 0
+    )
+
+    return Valuation(
+        book=book,
+        price=price,
+        market_value=market_value,
+        unrealized=unrealized,
+        weight=weight,
+        group_market_value=group_market_value,
+        group_cost=group_cost,
+        group_unrealized=group_market_value - group_cost,
+    )
+
+
+def current_prices(symbols: List[str]) -> Dict[str, float]:
+    """Get the latest price of every symbol in one batch"""
+    quotes = market_data_hub.get_quotes(symbols)
+    return {symbol: quote["price"] for symbol, quote in quotes.items()}
+
+
+def _percent(part: float, whole: float) -> float:
+    return part / whole * 100 if whole > 0 else 0
+
+
+def group_report(valuation: Valuation, g: int, liquid_balance: float, include_positions: bool = True) -> dict:
+    """
+    Summarize one group of a valuation
+
+    Args:
+        valuation: Result of value_book
+        g: Index of the group in valuation.book.group_ids
+        liquid_balance: The group's cash balance
+        include_positions: Add the per-position "holdings" list
+
+    Returns:
+        dict: Totals, plus holdings sorted by market value
+    """
+    book = valuation.book
+    market_value = float(valuation.group_market_value[g])
+    cost = float(valuation.group_cost[g])
+    unrealized = float(valuation.group_unrealized[g])
+    report = {
+        "groupID": book.group_ids[g],
+        "total_invested_value": market_value,
+        "total_cost_basis": cost,
+        "unrealized_pnl": unrealized,
+        "unrealized_pnl_percent": _percent(unrealized, cost),
+        "realized_pnl": float(book.realized[g]),
+        "liquid_balance": liquid_balance,
+        "total_assets": market_value + liquid_balance,
+    }
+    if not include_positions:
+        return report
+
+    start, end = book.group_start[g], book.group_start[g + 1]
+    rows = start + np.argsort(-valuation.market_value[start:end], kind="stable")
+    holdings = []
+    for r in rows:
+        symbol = book.symbols[book.symbol_idx[r]]
+        quantity = float(book.quantity[r])
+        cost_basis = float(book.cost[r])
+        price = valuation.price[r]
+        holdings.append({
+            "symbol": symbol,
+            "name": book.names.get(symbol, symbol),
+            "quantity": quantity,
+            "current_price": None if np.isnan(price) else float(price),
+            "current_value": float(valuation.market_value[r]),
+            "percentage": float(valuation.weight[r]) * 100,
+            "cost_basis": cost_basis,
+            "average_cost": cost_basis / quantity,
+            "unrealized_pnl": float(valuation.unrealized[r]),
+            "unrealized_pnl_percent": _percent(float(valuation.unrealized[r]), cost_basis),
+        })
+    report["holdings"] = holdings
+    return report
+
+
+def value_group(group: dict) -> dict:
+    """Value a single group's portfolio from its group item"""
+    book = book_from_holdings([group])
+    valuation = value_book(book, current_prices(book.symbols))
+    return group_report(valuation, 0, float(group.get("balance", 0)))
+
+
+def value_all_groups(include_positions: bool = False) -> List[dict]:
+    """
+    Value every group's portfolio in one pass
+
+    One scan of groups and one batched price lookup, however many groups
+    there are.
+    """
+    group_items = groups.get_all_groups()
+    book = book_from_holdings(group_items)
+    valuation = value_book(book, current_prices(book.symbols))
+
+    reports = []
+    for i, group in enumerate(group_items):
+        report = group_report(valuation, i, float(group.get("balance", 0)), include_positions)
+        report["name"] = group.get("name")
+        report["status"] = group.get("status", "active")
+        reports.append(report)
+    return reports
@@ -0,0 +1,57 @@
+"""
+Startup report
+Records how long the app's modules take to import and how long
+background services take to warm up, to keep cold starts fast
+"""
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict
+
+_import_ms: Dict[str, float] = {}
+_warmup_ms: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def timed_import(module_name: str) -> ModuleType:
+    """
+    Import a module and record how long it took
+
+    Shared dependencies are only loaded once, so their cost is counted
+    against whichever module imported them first.
+    """
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _import_ms[module_name] = (time.perf_counter() - start) * 1000
+    return module
+
+
+def warm_in_background(name: str, warm: Callable[[], object]) -> threading.Thread:
+    """Run a warm-up function on a daemon thread and record how long it took"""
+    def run():
+        start = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:
+            print(f"❌ Warm-up of {name} failed: {e}")
+            return
+        with _lock:
+            _warmup_ms[name] = (time.perf_counter() - start) * 1000
+
+    thread = threading.Thread(target=run, name=f"warm-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def report() -> dict:
+    """Import and warm-up times in milliseconds, slowest first"""
+    with _lock:
+        imports = dict(sorted(_import_ms.items(), key=lambda kv: kv[1], reverse=True))
+        warmups = dict(_warmup_ms)
+    return {
+        "imports": {name: round(ms, 1) for name, ms in imports.items()},
+        "totalImportMs": round(sum(imports.values()), 1),
+        "warmups": {name: round(ms, 1) for name, ms in warmups.items()},
+    }
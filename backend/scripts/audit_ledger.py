@@ -0,0 +1,18 @@
+"""Reconcile group balances with their group ledger (normally run nightly by the API).
+
+Reports mismatches; --repair corrects those found by two runs in a row, --full refolds everything.
+Groups are only repaired once their ledger has an origin (see import_group_ledgers.py).
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+from app.services.ledger_audit import run_ledger_audit
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repair", action="store_true", help="Correct mismatches confirmed by the previous run")
+    parser.add_argument("--full", action="store_true", help="Ignore watermarks and refold every group from its ledger snapshot")
+    args = parser.parse_args()
+
+    run_ledger_audit(repair=args.repair, full=args.full)
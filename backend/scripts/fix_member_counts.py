@@ -1,39 +1,31 @@
 """Backfill script: ensure each group's memberCount matches len(members).
 
+Dry run by default; --apply writes, --restart ignores a saved checkpoint.
 Run from backend/ with Python environment configured for AWS (or DynamoDB local).
 """
 from decimal import Decimal
 from app.db.connection import groups_table
+from app.db.maintenance import Backfill, run_cli
 
+FIELDS = ["members", "memberCount"]
 
-def fix_member_counts(dry_run=True):
-    # scan all groups (be careful with large tables)
-    response = groups_table.scan()
-    items = response.get("Items", [])
-
-    updated = 0
-    for item in items:
-        group_id = item.get("groupID")
-        members = item.get("members", []) or []
-        correct_count = Decimal(len(members))
-        current = item.get("memberCount")
-        if current != correct_count:
-            print(f"Group {group_id}: memberCount {current} -> {correct_count}")
-            if not dry_run:
-                groups_table.update_item(
-                    Key={"groupID": group_id},
-                    UpdateExpression="SET memberCount = :count",
-                    ExpressionAttributeValues={":count": correct_count}
-                )
-            updated += 1
-    print(f"Checked {len(items)} groups, would update {updated} items{"" if dry_run else ""}.")
 
+def member_count_update(item):
+    correct_count = Decimal(len(item.get("members", []) or []))
+    if item.get("memberCount") != correct_count:
+        return {"memberCount": correct_count}
+    return None
 
-if __name__ == "__main__":
-    import argparse
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--apply", action="store_true", help="Apply changes instead of dry-run")
-    args = parser.parse_args()
+def fix_member_counts(dry_run=True):
+    return Backfill("fix_member_counts", groups_table, FIELDS, member_count_update, apply=not dry_run).run()
 
-    fix_member_counts(dry_run=not args.apply)
+
+if __name__ == "__main__":
+    run_cli(
+        "fix_member_counts",
+        groups_table,
+        FIELDS,
+        member_count_update,
+        description=__doc__,
+    )
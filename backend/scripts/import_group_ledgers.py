@@ -0,0 +1,107 @@
+"""Start the ledger of groups created before it existed with a group.imported event.
+
+The event holds the group's current state (members, balances, holdings,
+member deposits, open proposals and pending fills) and is written only if the group's
+members and balances still match what was read. Groups whose ledger
+already starts with group.created or holds a group.imported event are
+skipped, so the script can be run again safely.
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+from decimal import Decimal
+from app.db import ledger
+from app.db.connection import groups_table
+from app.db.transactions import get_group_transactions
+
+_ZERO = Decimal("0")
+
+
+def _state(group):
+    open_transactions, pending_fills, member_deposits = {}, [], {}
+    for t in get_group_transactions(group["groupID"]):
+        if t.get("transactionType") == "deposit" and t.get("status") == "executed":
+            user_id = t["proposedBy"]
+            member_deposits[user_id] = member_deposits.get(user_id, _ZERO) + t["amount"]
+        elif t.get("status") in ("pending", "approved"):
+            open_transactions[t["transactionID"]] = {
+                "type": t.get("transactionType", "investment"),
+                "amount": t["amount"],
+                "status": t["status"],
+                "votes": t.get("votes", {}),
+            }
+        elif t.get("orderStatus") == "pending_fill":
+            pending_fills.append(t["transactionID"])
+    return {
+        "name": group.get("name"),
+        "createdBy": group.get("createdBy"),
+        "members": group.get("members", []),
+        "balance": group.get("balance", _ZERO),
+        "investedAmount": group.get("investedAmount", _ZERO),
+        "holdings": group.get("holdings", {}),
+        "costBasis": group.get("costBasis", {}),
+        "memberDeposits": member_deposits,
+        "openTransactions": open_transactions,
+        "pendingFills": pending_fills,
+    }
+
+
+def _unchanged(group):
+    """ConditionCheck that the attributes read are still the same"""
+    names, values, conditions = {}, {}, []
+    for i, attribute in enumerate(["members", "balance", "investedAmount"]):
+        names[f"#a{i}"] = attribute
+        if attribute in group:
+            values[f":a{i}"] = group[attribute]
+            conditions.append(f"#a{i} = :a{i}")
+        else:
+            conditions.append(f"attribute_not_exists(#a{i})")
+    check = {
+        "TableName": groups_table.name,
+        "Key": {"groupID": group["groupID"]},
+        "ConditionExpression": " AND ".join(conditions),
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        check["ExpressionAttributeValues"] = values
+    return {"ConditionCheck": check}
+
+
+def import_group_ledgers(dry_run=True):
+    scan_kwargs = {}
+    imported = skipped = failed = 0
+    while True:
+        response = groups_table.scan(**scan_kwargs)
+        for group in response.get("Items", []):
+            group_id = group["groupID"]
+            if group.get("status") == "deleting" or ledger.get_origin(group_id):
+                skipped += 1
+                continue
+            print(f"Group {group_id}: importing balance {group.get('balance', 0)}, {len(group.get('members', []))} members")
+            if not dry_run:
+                try:
+                    # Events appended since the ledger existed are already in
+                    # the state read, and are folded before the import
+                    ledger.append(
+                        group_id, "group.imported", _state(group), writes=[_unchanged(group)],
+                        first=ledger.get_head(group_id) == 0
+                    )
+                except Exception as e:
+                    # Usually a concurrent change; running again picks it up
+                    print(f"❌ Group {group_id}: {e}")
+                    failed += 1
+                    continue
+            imported += 1
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    verb = "Imported" if not dry_run else "Would import"
+    print(f"{verb} {imported} groups, skipped {skipped}, failed {failed}.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apply", action="store_true", help="Apply changes instead of dry-run")
+    args = parser.parse_args()
+
+    import_group_ledgers(dry_run=not args.apply)
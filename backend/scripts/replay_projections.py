@@ -0,0 +1,44 @@
+"""Replay group ledgers onto their projections (user group lists, memberCount,
+memberDeposits, holdings, costBasis).
+
+Every event is looked at again, not only those after the group's checkpoint,
+so this also repairs projections that drifted or were written before the
+change feed existed. Dry run by default; --apply writes, --group limits the
+replay to one group.
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+from app.db import groups
+from app.services.change_feed import project_group
+
+
+def replay_projections(group_id=None, dry_run=True):
+    group_ids = [group_id] if group_id else [g for g, _ in groups.scan_projection_checkpoints()]
+    replayed = skipped = 0
+    for group_id in group_ids:
+        result = project_group(group_id, after=0, apply=not dry_run)
+        if result is None:
+            print(f"Group {group_id}: skipped (deleting, missing, or no group.created/group.imported event)")
+            skipped += 1
+            continue
+        values = result["values"]
+        print(
+            f"Group {group_id}: seq {result['seq']}, memberCount {values['memberCount']}, "
+            f"{len(values['holdings'])} holdings, groups lists: {len(result['added'])} to hold it, {len(result['removed'])} not"
+        )
+        if not dry_run and not result["written"]:
+            # A newer event was projected meanwhile, which already covers it
+            print(f"Group {group_id}: newer events projected concurrently")
+        replayed += 1
+    verb = "Replayed" if not dry_run else "Would replay"
+    print(f"{verb} {replayed} groups, skipped {skipped}.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apply", action="store_true", help="Apply changes instead of dry-run")
+    parser.add_argument("--group", help="Only replay this group")
+    args = parser.parse_args()
+
+    replay_projections(group_id=args.group, dry_run=not args.apply)
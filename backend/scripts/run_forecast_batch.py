@@ -0,0 +1,9 @@
+"""Refit every group's savings forecast (normally run nightly by the API).
+
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+from app.services.forecast_batch import run_forecast_batch
+
+
+if __name__ == "__main__":
+    run_forecast_batch()
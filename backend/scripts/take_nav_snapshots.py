@@ -0,0 +1,11 @@
+"""Take today's NAV snapshot for every group (for cron, or to fill a missed run).
+
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+from app.services.market_data_hub import market_data_hub
+from app.services.nav_snapshots import take_snapshots
+
+
+if __name__ == "__main__":
+    market_data_hub.refresh()
+    take_snapshots()
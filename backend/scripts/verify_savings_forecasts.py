@@ -0,0 +1,39 @@
+"""Check each group's running savings stats against a full refit of its deposits.
+
+Needs pandas and scikit-learn, which the API itself doesn't use.
+Run from backend/ with Python environment configured for AWS (or DynamoDB local).
+"""
+import math
+from app.db.connection import groups_table
+from app.db import transactions
+from app.services import ml_service, savings_forecast
+
+
+def verify_savings_forecasts(tolerance=1e-6):
+    response = groups_table.scan(ProjectionExpression="groupID, savingsStats")
+    items = response.get("Items", [])
+    while "LastEvaluatedKey" in response:
+        response = groups_table.scan(
+            ProjectionExpression="groupID, savingsStats",
+            ExclusiveStartKey=response["LastEvaluatedKey"]
+        )
+        items.extend(response.get("Items", []))
+
+    mismatched = 0
+    for item in items:
+        group_id = item["groupID"]
+        stats = item.get("savingsStats")
+        running = savings_forecast.fit(stats) if stats else None
+        refit = ml_service.fit_savings_trend(transactions.get_deposits(group_id))
+        if running is None or refit is None:
+            ok = running is None and refit is None
+        else:
+            ok = all(math.isclose(a, b, rel_tol=tolerance, abs_tol=1e-4) for a, b in zip(running, refit))
+        if not ok:
+            mismatched += 1
+            print(f"Group {group_id}: running {running} != refit {refit}")
+    print(f"Checked {len(items)} groups, {mismatched} mismatched.")
+
+
+if __name__ == "__main__":
+    verify_savings_forecasts()
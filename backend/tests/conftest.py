@@ -0,0 +1,28 @@
+"""
+Shared fixtures: every test gets fresh in-memory DynamoDB tables (moto)
+
+Install with: pip install -r requirements-dev.txt
+"""
+import os
+
+# Set before app modules read them at import (and so a local .env can't
+# point the tests at a real database)
+os.environ.update({
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_REGION": "us-east-1",
+    "DYNAMODB_ENDPOINT": "",
+})
+
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture(autouse=True)
+def dynamodb():
+    """Mock AWS and create the app's tables"""
+    with mock_aws():
+        from app.init_tables import create_tables
+        create_tables()
+        yield
@@ -0,0 +1,125 @@
+"""Change feed: idempotent projections, legacy groups and stream shard checkpoints"""
+import uuid
+from decimal import Decimal
+import pytest
+from app.db import groups, leases, ledger, transactions, users
+from app.db.connection import groups_table
+from app.services import change_feed as change_feed_module
+from app.services.change_feed import ChangeFeed, project_group
+
+
+def _user(name):
+    return users.create_user(name, f"{name}@example.com", "hash")["userID"]
+
+
+def test_projecting_the_same_events_twice_changes_nothing():
+    owner, friend = _user("owner"), _user("friend")
+    group_id = groups.create_group(owner, "grp")["groupID"]
+    groups.add_member(group_id, friend)
+    transactions.record_deposit(group_id, friend, 25)
+
+    first = project_group(group_id)
+    assert first["written"] and first["seq"] == 3
+    assert sorted(first["added"]) == sorted([owner, friend])
+    projected = groups.get_group(group_id)
+
+    # Caught up: nothing to write
+    assert project_group(group_id)["written"] is False
+    # Replaying the whole ledger writes the same values again
+    replayed = project_group(group_id, after=0)
+    assert replayed["values"] == first["values"]
+
+    group = groups.get_group(group_id)
+    for key in ("memberCount", "memberDeposits", "holdings", "costBasis", "projectedSeq"):
+        assert group[key] == projected[key]
+    assert group["memberDeposits"] == {friend: Decimal("25")}
+    assert users.get_user_groups(friend) == [group_id]
+
+
+def test_group_without_origin_applies_each_event_once():
+    owner, friend = _user("owner"), _user("friend")
+    group_id = str(uuid.uuid4())
+    groups_table.put_item(Item={
+        "groupID": group_id, "name": "old", "members": [owner], "createdBy": owner,
+        "balance": Decimal("500"), "investedAmount": Decimal("0"), "status": "active",
+        "memberCount": Decimal(1), "memberDeposits": {owner: Decimal("500")},
+    })
+    groups.add_member(group_id, friend)
+    transactions.record_deposit(group_id, friend, 40)
+
+    result = project_group(group_id)
+    assert result["written"] and result["seq"] == 2
+    assert project_group(group_id)["written"] is False
+
+    group = groups.get_group(group_id)
+    # Deposits from before the ledger are kept, the new one added once
+    assert group["memberDeposits"] == {owner: Decimal("500"), friend: Decimal("40")}
+    assert group["memberCount"] == 2
+    assert users.get_user_groups(friend) == [group_id]
+    # Its history before the ledger is missing, so it can't be replayed
+    assert project_group(group_id, after=0) is None
+
+
+@pytest.fixture
+def projected(monkeypatch):
+    """Groups the change feed projects, in order, instead of projecting them"""
+    seen = []
+
+    def record(group_id, after=None, apply=True):
+        seen.append(group_id)
+        return {"written": True}
+
+    monkeypatch.setattr(change_feed_module, "project_group", record)
+    return seen
+
+
+def _stream_feed(lease_seconds=30):
+    feed = ChangeFeed()
+    feed._shards.lease_seconds = lease_seconds
+    assert feed._open_stream()
+    return feed
+
+
+def _append():
+    group_id = str(uuid.uuid4())
+    ledger.append(group_id, "deposit.made", {"amount": Decimal("1")}, actor="someone")
+    return group_id
+
+
+def test_stream_resumes_from_the_stored_shard_position(projected):
+    first = _stream_feed()
+    a, b = _append(), _append()
+    assert first._poll_stream()
+    assert sorted(projected) == sorted([a, b])
+    assert first.status()["shards"] == 1
+    first.stop()
+
+    # A new process (or host) picks up where the first one stopped
+    projected.clear()
+    c = _append()
+    second = _stream_feed()
+    second._poll_stream()
+    assert projected == [c]
+    second.stop()
+
+
+def test_one_reader_per_shard_until_its_lease_runs_out(projected, monkeypatch):
+    first, second = _stream_feed(lease_seconds=30), _stream_feed(lease_seconds=30)
+    a = _append()
+    first._poll_stream()
+    second._poll_stream()
+    assert projected == [a]
+    assert second.status()["shards"] == 0
+
+    # The first reader stops renewing; once its lease expires the second takes over
+    b = _append()
+    monkeypatch.setattr(leases, "_now", lambda: Decimal("9999999999"))
+    second._poll_stream()
+    assert projected == [a, b]
+    assert second.status()["shards"] == 1
+
+    # The first finds out when it next stores its position (the records it
+    # read meanwhile are projected twice, which is harmless)
+    _append()
+    first._poll_stream()
+    assert first.status()["shards"] == 0
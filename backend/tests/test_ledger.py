@@ -0,0 +1,103 @@
+"""Group ledger: sequence numbers under concurrent appends, snapshots, origins and imports"""
+import threading
+import uuid
+from decimal import Decimal
+import pytest
+from botocore.exceptions import ClientError
+from app.db import ledger
+from app.db.connection import groups_table
+from app.services import group_ledger
+from scripts.import_group_ledgers import import_group_ledgers
+
+
+def _legacy_group(balance="500"):
+    """A group created before the ledger existed"""
+    group_id = str(uuid.uuid4())
+    groups_table.put_item(Item={
+        "groupID": group_id, "name": "old", "members": ["owner"], "createdBy": "owner",
+        "balance": Decimal(balance), "investedAmount": Decimal("0"), "status": "active",
+    })
+    return group_id
+
+
+def test_concurrent_appends_take_every_sequence_number_once():
+    group_id = str(uuid.uuid4())
+    ledger.append(group_id, "group.created", {"name": "grp", "createdBy": "owner"}, actor="owner", first=True)
+
+    def deposit(user):
+        for _ in range(5):
+            ledger.append(group_id, "deposit.made", {"amount": Decimal("10")}, actor=user)
+
+    threads = [threading.Thread(target=deposit, args=(f"user{i}",)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    events = list(ledger.read_events(group_id))
+    assert [int(e["seq"]) for e in events] == list(range(1, 32))
+    state = group_ledger.fold(events)
+    assert state["balance"] == Decimal("300")
+    assert state["memberDeposits"] == {f"user{i}": Decimal("50") for i in range(6)}
+
+
+def test_failed_write_does_not_take_a_sequence_number():
+    group_id = str(uuid.uuid4())
+    ledger.append(group_id, "group.created", {"name": "grp", "createdBy": "owner"}, first=True)
+    with pytest.raises(ClientError):
+        ledger.append(group_id, "deposit.made", {"amount": Decimal("10")}, actor="owner", writes=[{
+            "ConditionCheck": {
+                "TableName": groups_table.name,
+                "Key": {"groupID": group_id},
+                "ConditionExpression": "attribute_exists(groupID)",
+            }
+        }])
+    assert ledger.get_head(group_id) == 1
+
+
+def test_first_append_refuses_a_ledger_with_events():
+    group_id = str(uuid.uuid4())
+    ledger.append(group_id, "group.created", {"name": "grp", "createdBy": "owner"}, first=True)
+    with pytest.raises(ledger.SequenceConflict):
+        ledger.append(group_id, "group.imported", {"balance": Decimal("1")}, first=True)
+
+
+def test_current_state_from_snapshot_matches_full_fold(monkeypatch):
+    monkeypatch.setattr(group_ledger, "LEDGER_SNAPSHOT_EVERY", 3)
+    group_id = str(uuid.uuid4())
+    ledger.append(group_id, "group.created", {"name": "grp", "createdBy": "owner"}, first=True)
+    for amount in ("1", "2", "3", "4"):
+        ledger.append(group_id, "deposit.made", {"amount": Decimal(amount)}, actor="owner")
+
+    state = group_ledger.current_state(group_id)
+    snapshot = ledger.get_snapshot(group_id)
+    assert int(snapshot["snapshotSeq"]) == 5
+    ledger.append(group_id, "deposit.made", {"amount": Decimal("5")}, actor="owner")
+
+    state = group_ledger.current_state(group_id)
+    assert state["balance"] == Decimal("15") == group_ledger.fold(ledger.read_events(group_id))["balance"]
+    assert state["seq"] == 6
+
+
+def test_origin_of_created_legacy_and_imported_groups():
+    created = str(uuid.uuid4())
+    ledger.append(created, "group.created", {"name": "grp", "createdBy": "owner"}, first=True)
+    assert ledger.get_origin(created)["type"] == "group.created"
+
+    legacy = _legacy_group()
+    assert ledger.get_origin(legacy) is None
+    # Events from after the ledger existed, before the import
+    ledger.append(legacy, "member.joined", {"userId": "friend"})
+    assert ledger.get_origin(legacy) is None
+
+    import_group_ledgers(dry_run=False)
+    origin = ledger.get_origin(legacy)
+    assert origin["type"] == "group.imported" and int(origin["seq"]) == 2
+    assert group_ledger.current_state(legacy)["balance"] == Decimal("500")
+
+
+def test_import_runs_once_per_group():
+    group_id = _legacy_group()
+    import_group_ledgers(dry_run=False)
+    import_group_ledgers(dry_run=False)
+    assert [e["type"] for e in ledger.read_events(group_id)] == ["group.imported"]